@@ -13,9 +13,13 @@
 # limitations under the License.
 
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from colcon_sanitizer_reports._sanitizer_section_part import SanitizerSectionPart
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, StackTraceKeyFinder
+)
+from colcon_sanitizer_reports.suppressions import Suppressions
 
 
 # Error name for the sanitizer section is in the header line and matches the following pattern.
@@ -44,7 +48,8 @@ class SanitizerSection:
         SUMMARY: AddressSanitizer: SEGV (/lib/x86_64-linux-gnu/libc.so.6+0x18e5a0)
 
     SanitizerSection is initialized with a tuple of all lines from a sanitizer output section
-    including the header, contents, and summary.
+    including the header, contents, and summary. Optional suppressions and key finder are passed on
+    to each part.
 
     After initialization, SanitizerSection includes two data members.
 
@@ -67,14 +72,12 @@ class SanitizerSection:
         """Sanitizer section parts parsed from lines."""
         return self._parts
 
-    def __init__(self, *, lines: Tuple[str, ...]) -> None:
+    def __init__(
+            self, *, lines: Tuple[str, ...], suppressions: Optional[Suppressions] = None,
+            key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+    ) -> None:
         """Construct the sanitizer section."""
-        # Section error name comes after 'Sanitizer: ', and before any open paren or hex number.
-        match = _FIND_ERROR_NAME_REGEX.match(lines[0])
-        assert match is not None, (
-            'Could not find error name in section header: {lines[0]}'.format(**locals())
-        )
-        self._error_name = match.groupdict()['error_name']
+        self._error_name = find_error_name(lines[0])
 
         # Divide into parts. Subsections begin with a line that is not indented.
         part_lines: List[str] = []
@@ -84,16 +87,28 @@ class SanitizerSection:
             # If so, create the previous part and start collecting for the new part.
             match = _FIND_SECTION_PART_BEGIN_REGEX.match(line)
             if match is not None and part_lines:
-                sub_sections.append(
-                    SanitizerSectionPart(error_name=self.error_name, lines=tuple(part_lines))
-                )
+                sub_sections.append(SanitizerSectionPart(
+                    error_name=self.error_name, lines=tuple(part_lines), suppressions=suppressions,
+                    key_finder=key_finder,
+                ))
                 part_lines = []
 
             part_lines.append(line)
 
         if part_lines:
-            sub_sections.append(
-                SanitizerSectionPart(error_name=self.error_name, lines=tuple(part_lines))
-            )
+            sub_sections.append(SanitizerSectionPart(
+                error_name=self.error_name, lines=tuple(part_lines), suppressions=suppressions,
+                key_finder=key_finder,
+            ))
 
         self._parts = tuple(sub_sections)
+
+
+def find_error_name(header_line: str) -> str:
+    """Return the error name parsed from the header line of a sanitizer section."""
+    # Section error name comes after 'Sanitizer: ', and before any open paren or hex number.
+    match = _FIND_ERROR_NAME_REGEX.match(header_line)
+    assert match is not None, (
+        'Could not find error name in section header: {header_line}'.format(**locals())
+    )
+    return match.groupdict()['error_name']
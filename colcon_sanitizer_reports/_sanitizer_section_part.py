@@ -12,42 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from collections import ChainMap, defaultdict
-import re
-from typing import List, Mapping, Pattern, Tuple
+from typing import Optional, Tuple
 
 from colcon_sanitizer_reports._sanitizer_section_part_stack_trace import (
     SanitizerSectionPartStackTrace
 )
-
-
-_FIND_RELEVANT_STACK_TRACE_BEGIN_REGEXES_BY_ERROR_NAME: Mapping[str, Tuple[Pattern[str], ...]] = (
-    ChainMap({
-        # There are two relevant stack traces involved in a "data race" section part. Their headers
-        # match the following patterns.
-        'data race': (
-            re.compile(r'^\s+(Read|Write) of size \d+ at 0x[\da-f]+ .*$'),
-            re.compile(r'^\s+Previous (read|write) of size \d+ at 0x[\da-f]+ .*$'),
-        ),
-        # There is one relevant stack trace in a "detected memory leaks" section part. Its header
-        # matches the following pattern.
-        'detected memory leaks': (
-            re.compile(r'^Direct leak of \d+ byte\(s\) in \d+ object\(s\) allocated from:$'),
-        ),
-        # There are two relevant stack traces involved in one "lock-order-inversion" error section
-        # part. Both of their headers match the same pattern.
-        'lock-order-inversion': (
-            re.compile(r'^\s+Mutex M\d+ acquired here while holding mutex M\d+ in .*$'),
-            re.compile(r'^\s+Mutex M\d+ acquired here while holding mutex M\d+ in .*$'),
-        ),
-        # Remaining sanitizer errors have the only/most relevant stack trace first in a section
-        # part, so we place no restrictions on the pattern of the header. We just find the first
-        # stack trace.
-    }, defaultdict(lambda: (re.compile(r'^.*$'),)))
+from colcon_sanitizer_reports.stack_trace_extractors import get_stack_trace_extractor
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, StackTraceKeyFinder
 )
-
-# Stack trace lines follow a "stack trace begin" line and match the following pattern.
-_FIND_STACK_TRACE_LINE_REGEX = re.compile(r'^\s+#\d+\s+.*$')
+from colcon_sanitizer_reports.suppressions import Suppression, Suppressions
 
 
 class SanitizerSectionPart:
@@ -90,14 +64,22 @@ class SanitizerSectionPart:
     to report. Part three starts with the non-indented "Indirect leak" line and includes the
     following stack trace that is irrelevant to report. The final part is the summary line.
 
-    See _FIND_RELEVANT_STACK_TRACE_BEGIN_REGEXES_BY_ERROR_NAME for stack trace header search
-    patterns that determine which stack traces are relevant. Different error/warning names have
-    different relevant stack traces.
+    See StackTraceExtractor for the stack trace header patterns that determine which stack traces
+    are relevant. Different error/warning names have different relevant stack traces, and extractors
+    for more error/warning names can be added with entry points.
 
-    After initialization, SanitizerSectionPart includes the following data member.
+    If suppressions are given and one of them matches a frame of any stack trace in the section
+    part, whether relevant or not, all of its relevant stack traces are dropped before a
+    SanitizerSectionPartStackTrace is created for them. The keys of the relevant stack traces of
+    other section parts are found with key_finder.
+
+    After initialization, SanitizerSectionPart includes the following data members.
 
     relevant_stack_traces:
         Stack traces from the section part that are relevant for generating the report.
+
+    matched_suppressions:
+        Suppressions that matched relevant stack traces, one for each dropped stack trace.
     """
 
     @property
@@ -105,45 +87,31 @@ class SanitizerSectionPart:
         """Stack traces from the section part that are relevant for generating the report."""
         return self._relevant_stack_traces
 
-    def __init__(self, *, error_name: str, lines: Tuple[str, ...]) -> None:
+    @property
+    def matched_suppressions(self) -> Tuple[Suppression, ...]:
+        """Suppressions that matched relevant stack traces, one for each dropped stack trace."""
+        return self._matched_suppressions
+
+    def __init__(
+            self, *, error_name: str, lines: Tuple[str, ...],
+            suppressions: Optional[Suppressions] = None,
+            key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+    ) -> None:
         """Gather relevant sanitizer stack traces."""
-        relevant_stack_traces: List[SanitizerSectionPartStackTrace] = []
-        find_relevant_stack_trace_begin_regexes = (
-            _FIND_RELEVANT_STACK_TRACE_BEGIN_REGEXES_BY_ERROR_NAME[error_name]
-        )
-
-        # Iterating through lines with an index and slices is easier than with an iterator in this
-        # case. The line that triggers the stop condition at the end of the following loop may be
-        # the same line that should trigger the start condition at the beginning of the following
-        # iteration. With an iterator, it's difficult to evaluate the same line in both places.
-        line_i = 0
-
-        # Find all the relevant stack traces from given lines.
-        for find_relevant_stack_trace_begin_regex in find_relevant_stack_trace_begin_regexes:
-
-            # Find the line that begins the relevant stack trace.
-            for line_i, line in enumerate(lines[line_i:], start=line_i):
-                match = find_relevant_stack_trace_begin_regex.match(line)
-                if match is not None:
-                    break
-
-            # Starting with the next line, gather lines that match the stack trace pattern until one
-            # doesn't match.
-            relevant_stack_trace_lines: List[str] = []
-            for line_i, line in enumerate(lines[line_i + 1:], start=line_i + 1):
-                match = _FIND_STACK_TRACE_LINE_REGEX.match(line)
-                if match is not None:
-                    relevant_stack_trace_lines.append(line)
-                else:
-                    # Note that if this line happens to be a stack_trace_begin line, we won't miss
-                    # it on the next iteration of the outer loop. It will be checked since line_i
-                    # will still be the index for this line.
-                    break
-
-            # If we gathered any stack trace lines, store the relevant stack trace.
-            if relevant_stack_trace_lines:
-                relevant_stack_traces.append(
-                    SanitizerSectionPartStackTrace(lines=tuple(relevant_stack_trace_lines))
-                )
-
-        self._relevant_stack_traces = tuple(relevant_stack_traces)
+        relevant_stack_trace_lines = get_stack_trace_extractor(error_name).extract(lines)
+
+        # Like the sanitizers, a match in any stack trace of the section part suppresses all of it,
+        # such as the previous write of a data race matching a suppressed library.
+        suppression = None
+        if suppressions is not None and relevant_stack_trace_lines:
+            suppression = suppressions.match(error_name, lines)
+
+        if suppression is not None:
+            self._relevant_stack_traces: Tuple[SanitizerSectionPartStackTrace, ...] = ()
+            self._matched_suppressions = (suppression,) * len(relevant_stack_trace_lines)
+        else:
+            self._relevant_stack_traces = tuple(
+                SanitizerSectionPartStackTrace(lines=stack_trace_lines, key_finder=key_finder)
+                for stack_trace_lines in relevant_stack_trace_lines
+            )
+            self._matched_suppressions = ()
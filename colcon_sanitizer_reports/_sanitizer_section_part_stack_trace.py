@@ -12,16 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
 from typing import Tuple
 
-
-# Key comes from a line of ros2 code and matches the following pattern.
-_FIND_KEY_REGEX = re.compile(r'^\s+#\d+ (0x[\da-f]+ in|)\s*(?P<key>.*/ros2.*)\s*$')
-
-# Parts of a key that are changeable between otherwise identical stack trace can be found and masked
-# with the following pattern.
-_FIND_KEY_SUB_REGEX = re.compile(r'0x[\da-f]+')
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, StackTraceKeyFinder
+)
 
 
 class SanitizerSectionPartStackTrace:
@@ -49,7 +44,8 @@ class SanitizerSectionPartStackTrace:
     key:
         Key parsed from the first line in the stack trace that comes from ros2 code (#1 in the
         example above). Some information is masked or omitted in the key so that keys of multiple
-        stack traces that are reproductions of each other are guaranteed to match.
+        stack traces that are reproductions of each other are guaranteed to match. Which code is own
+        code, and how many of its frames make up the key, is configured with a StackTraceKeyFinder.
 
     lines:
         The lines that make up the stack trace.
@@ -65,16 +61,10 @@ class SanitizerSectionPartStackTrace:
         """Lines that make up the stack trace."""
         return self._lines
 
-    def __init__(self, lines: Tuple[str, ...]) -> None:
+    def __init__(
+            self, lines: Tuple[str, ...],
+            key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+    ) -> None:
         """Find and assign stack trace key."""
-        key = None
-        for line in lines:
-            match = _FIND_KEY_REGEX.match(line)
-            if match is not None:
-                key = _FIND_KEY_SUB_REGEX.sub('0xX', match.groupdict()['key'])
-                break
-
-        assert key is not None, 'Could not find key in given stack trace lines.'
-
-        self._key = key
+        self._key = key_finder.get_key(lines)
         self._lines = lines
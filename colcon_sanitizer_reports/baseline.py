@@ -0,0 +1,158 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import sys
+from typing import FrozenSet, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
+
+# Baseline files are a sorted array of unique unsigned 64-bit little-endian fingerprints with no
+# header, so they can be memory-mapped and binary searched in place.
+_FINGERPRINT_TYPECODE = 'Q'
+_FINGERPRINT_STRUCT = struct.Struct('<' + _FINGERPRINT_TYPECODE)
+_FINGERPRINT_SIZE = _FINGERPRINT_STRUCT.size
+
+
+class BaselineDiff(NamedTuple):
+    """Difference between a baseline and the findings of a run.
+
+    new:
+        Output primary keys found in the run whose fingerprint is not in the baseline.
+
+    disappeared:
+        Fingerprints in the baseline that are not the fingerprint of any output primary key found in
+        the run. Baselines only store fingerprints, so disappeared findings are only known by them.
+    """
+
+    new: Tuple[SanitizerLogParserOutputPrimaryKey, ...]
+    disappeared: FrozenSet[int]
+
+
+def write_baseline(path: str, fingerprints: Iterable[int]) -> None:
+    """Write the fingerprints to a baseline file at path."""
+    fingerprint_array = array(_FINGERPRINT_TYPECODE, sorted(set(fingerprints)))
+    if sys.byteorder != 'little':
+        fingerprint_array.byteswap()
+
+    with open(path, 'wb') as baseline_f_out:
+        fingerprint_array.tofile(baseline_f_out)
+
+
+class Baseline:
+    """Fingerprints of a baseline file, memory-mapped until they are first needed.
+
+    The sorted fingerprints are read from the mapped file into an array in one bulk copy the first
+    time they are iterated or searched, so a baseline of 10^6 fingerprints costs a few megabytes and
+    milliseconds to load. Membership is tested with a binary search of the array.
+
+    The baseline must be closed when it is no longer needed, such as by using it as a context
+    manager.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Memory-map the baseline file at path."""
+        self._mmap: Optional[mmap.mmap] = None
+        self._fingerprints: Optional[array] = None
+        with open(path, 'rb') as baseline_f_in:
+            size = os.fstat(baseline_f_in.fileno()).st_size
+            if size % _FINGERPRINT_SIZE != 0:
+                raise ValueError('Baseline file size is not a multiple of {}: {}'.format(
+                    _FINGERPRINT_SIZE, path
+                ))
+            # Empty files cannot be mapped, and an empty baseline has nothing to map.
+            if size > 0:
+                self._mmap = mmap.mmap(baseline_f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        self._len = size // _FINGERPRINT_SIZE
+
+    def close(self) -> None:
+        """Unmap the baseline file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> 'Baseline':
+        """Return the baseline."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Unmap the baseline file."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of fingerprints in the baseline."""
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the fingerprints in the baseline, in ascending order."""
+        return iter(self._get_fingerprints())
+
+    def __contains__(self, fingerprint: object) -> bool:
+        """Return if the fingerprint is in the baseline."""
+        if not isinstance(fingerprint, int):
+            return False
+
+        fingerprints = self._get_fingerprints()
+        index = bisect_left(fingerprints, fingerprint)
+        return index < len(fingerprints) and fingerprints[index] == fingerprint
+
+    def _get_fingerprints(self) -> array:
+        if self._fingerprints is None:
+            self._fingerprints = array(_FINGERPRINT_TYPECODE)
+            if self._mmap is not None:
+                self._fingerprints.frombytes(self._mmap)
+                if sys.byteorder != 'little':
+                    self._fingerprints.byteswap()
+
+        return self._fingerprints
+
+
+def load_baseline(path: str) -> Baseline:
+    """Return the memory-mapped fingerprints of the baseline file at path.
+
+    A ValueError is raised if the file is not a baseline file.
+    """
+    return Baseline(path)
+
+
+def diff_baseline(
+        baseline: Iterable[int],
+        output_primary_keys: Iterable[SanitizerLogParserOutputPrimaryKey],
+) -> BaselineDiff:
+    """Return findings that are new to and fingerprints that disappeared from the baseline.
+
+    The fingerprints of the baseline and of the findings are each collected into a set once, and
+    the new and disappeared fingerprints are the differences of the two sets. New findings are in
+    the order they are given in.
+    """
+    output_primary_key_by_fingerprint = {
+        output_primary_key.fingerprint: output_primary_key
+        for output_primary_key in output_primary_keys
+    }
+    fingerprints = output_primary_key_by_fingerprint.keys()
+    baseline_fingerprints = frozenset(baseline)
+    new_fingerprints = fingerprints - baseline_fingerprints
+
+    return BaselineDiff(
+        new=tuple(
+            output_primary_key
+            for fingerprint, output_primary_key in output_primary_key_by_fingerprint.items()
+            if fingerprint in new_fingerprints
+        ),
+        disappeared=baseline_fingerprints - fingerprints,
+    )
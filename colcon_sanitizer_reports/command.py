@@ -0,0 +1,423 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Command line tools for working with sanitizer reports outside of colcon."""
+
+import argparse
+import csv
+import os
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from colcon_sanitizer_reports.baseline import diff_baseline, load_baseline, write_baseline
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    REPORT_BY_KEY_CSV_FILENAME, REPORT_CSV_FILENAME, REPORT_NDJSON_FILENAME, REPORT_XML_FILENAME,
+    STACK_TRACES_CSV_FILENAME, SUPPRESSIONS_CSV_FILENAME,
+)
+from colcon_sanitizer_reports.event_log import EVENT_LOG_FILENAME, parse_event_log
+from colcon_sanitizer_reports.findings_store import FindingsStore
+from colcon_sanitizer_reports.parse_budget import ParseBudget
+from colcon_sanitizer_reports.report_selection import ReportSelection, TOP_K_PER_FIELDS
+from colcon_sanitizer_reports.sample_stack_traces import (
+    open_report_output, SampleStackTraceFormat, StackTraceStore
+)
+from colcon_sanitizer_reports.sanitizer_log_files import (
+    add_sanitizer_log_files, find_sanitizer_log_files, SanitizerLogFilePool
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import (
+    SanitizerLogParser, SanitizerLogParserOutputPrimaryKey
+)
+from colcon_sanitizer_reports.stack_trace_keys import DEFAULT_OWN_CODE_ROOTS, StackTraceKeyFinder
+from colcon_sanitizer_reports.suppressions import load_suppressions
+from colcon_sanitizer_reports.symbolization import LlvmSymbolizer, SymbolCache
+from colcon_sanitizer_reports.watch import (
+    LogDirectoryTailer, make_report_server, REPORT_PATHS, ReportSnapshots
+)
+
+# Exit status when diff finds findings that are new to the baseline, or diff-runs finds findings
+# that are new or regressed relative to the base run.
+_NEW_FINDINGS_EXIT_STATUS = 1
+
+# Exit status when diff-runs is given a run that is not in the findings database.
+_UNKNOWN_RUN_EXIT_STATUS = 2
+
+
+def _read_report_csv_output_primary_keys(
+        path: str
+) -> Iterator[SanitizerLogParserOutputPrimaryKey]:
+    # Sample stack traces may be longer than the default csv field size limit.
+    csv.field_size_limit(sys.maxsize)
+    with open(path, 'r', newline='') as report_csv_f_in:
+        for row in csv.DictReader(report_csv_f_in):
+            # Remainder lines summarizing omitted findings have no stack trace key.
+            if not row['stack_trace_key']:
+                continue
+
+            yield SanitizerLogParserOutputPrimaryKey(**{
+                field_name: row[field_name]
+                for field_name in SanitizerLogParserOutputPrimaryKey._fields
+            })
+
+
+def _baseline(args: argparse.Namespace) -> int:
+    write_baseline(args.baseline, (
+        output_primary_key.fingerprint
+        for output_primary_key in _read_report_csv_output_primary_keys(args.report_csv)
+    ))
+    return 0
+
+
+def _diff(args: argparse.Namespace) -> int:
+    with load_baseline(args.baseline) as baseline:
+        diff = diff_baseline(baseline, _read_report_csv_output_primary_keys(args.report_csv))
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(SanitizerLogParserOutputPrimaryKey._fields)
+    writer.writerows(diff.new)
+    print(
+        '{new} new and {disappeared} disappeared findings relative to {args.baseline}'.format(
+            new=len(diff.new), disappeared=len(diff.disappeared), args=args
+        ),
+        file=sys.stderr,
+    )
+
+    return _NEW_FINDINGS_EXIT_STATUS if diff.new else 0
+
+
+def _diff_runs(args: argparse.Namespace) -> int:
+    with FindingsStore(args.database) as findings_store:
+        try:
+            diff = findings_store.diff(args.base_run, args.run)
+        except KeyError as error:
+            print(error.args[0], file=sys.stderr)
+            return _UNKNOWN_RUN_EXIT_STATUS
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('change', *SanitizerLogParserOutputPrimaryKey._fields))
+    for change, output_primary_keys in diff._asdict().items():
+        writer.writerows(
+            (change, *output_primary_key) for output_primary_key in output_primary_keys
+        )
+    print(
+        '{new} new, {fixed} fixed and {regressed} regressed findings in {args.run} relative to '
+        '{args.base_run}'.format(
+            new=len(diff.new), fixed=len(diff.fixed), regressed=len(diff.regressed), args=args
+        ),
+        file=sys.stderr,
+    )
+
+    return _NEW_FINDINGS_EXIT_STATUS if diff.new or diff.regressed else 0
+
+
+def _get_log_parser(
+        args: argparse.Namespace, *, stack_trace_store: Optional[StackTraceStore] = None,
+        defer_unsymbolized: bool = False,
+) -> SanitizerLogParser:
+    report_selection = None
+    if args.top_k is not None or args.min_count is not None:
+        report_selection = ReportSelection(
+            top_k=args.top_k, top_k_per=tuple(args.top_k_per),
+            min_count=args.min_count if args.min_count is not None else 1,
+        )
+
+    parse_budget = None
+    if args.package_time_budget is not None or args.package_memory_budget is not None:
+        parse_budget = ParseBudget(
+            max_seconds=args.package_time_budget,
+            max_bytes=args.package_memory_budget * 1024 * 1024
+            if args.package_memory_budget is not None else None,
+        )
+
+    return SanitizerLogParser(
+        cluster_stack_traces=args.cluster, report_selection=report_selection,
+        suppressions=load_suppressions(args.suppressions) if args.suppressions else None,
+        key_finder=StackTraceKeyFinder(
+            own_code_roots=args.own_code_root or DEFAULT_OWN_CODE_ROOTS,
+            frame_count=args.key_frames,
+        ),
+        sample_stack_trace_format=SampleStackTraceFormat(
+            max_frames=args.max_frames, store=stack_trace_store
+        ),
+        count_only=args.count_only, parse_budget=parse_budget,
+        defer_unsymbolized=defer_unsymbolized,
+    )
+
+
+def _report(args: argparse.Namespace) -> int:
+    stack_trace_store = StackTraceStore() if args.split_stack_traces else None
+    log_parser = _get_log_parser(
+        args, stack_trace_store=stack_trace_store, defer_unsymbolized=bool(args.symbolizer)
+    )
+    parse_event_log(log_parser, os.path.join(args.log_path, EVENT_LOG_FILENAME))
+
+    if args.log_files:
+        # Each package of the invocation has a directory in the log directory.
+        with os.scandir(args.log_path) as entries:
+            packages = sorted(entry.name for entry in entries if entry.is_dir())
+        # One pool of worker processes parses the files of all packages.
+        with SanitizerLogFilePool() as pool:
+            for package in packages:
+                add_sanitizer_log_files(
+                    log_parser, package, find_sanitizer_log_files(args.log_files, package),
+                    pool=pool,
+                )
+
+    if args.symbolizer:
+        # The frames of all packages are symbolized in one batch.
+        symbolizer = LlvmSymbolizer(args.symbolizer)
+        symbol_cache = SymbolCache(args.symbol_cache) if args.symbol_cache else None
+        try:
+            log_parser.symbolize(symbolizer, cache=symbol_cache)
+        finally:
+            symbolizer.close()
+            if symbol_cache is not None:
+                symbol_cache.close()
+
+    with open_report_output(
+            os.path.join(args.output_path, REPORT_CSV_FILENAME), compress=args.compress
+    ) as report_csv_f_out:
+        log_parser.write_csv(report_csv_f_out)
+
+    with open_report_output(
+            os.path.join(args.output_path, REPORT_XML_FILENAME), compress=args.compress
+    ) as report_xml_f_out:
+        report_xml_f_out.write(log_parser.get_xml())
+
+    with open_report_output(
+            os.path.join(args.output_path, REPORT_BY_KEY_CSV_FILENAME), compress=args.compress
+    ) as report_by_key_csv_f_out:
+        log_parser.write_key_csv(report_by_key_csv_f_out)
+
+    # Runs are named after the log directory of the colcon invocation.
+    if args.ndjson:
+        with open_report_output(
+                os.path.join(args.output_path, REPORT_NDJSON_FILENAME), compress=args.compress
+        ) as report_ndjson_f_out:
+            log_parser.write_ndjson(
+                report_ndjson_f_out,
+                run_metadata={'name': os.path.basename(os.path.normpath(args.log_path))},
+            )
+
+    if args.suppressions:
+        with open_report_output(
+                os.path.join(args.output_path, SUPPRESSIONS_CSV_FILENAME), compress=args.compress
+        ) as suppressions_csv_f_out:
+            suppressions_csv_f_out.write(log_parser.get_suppressions_csv())
+
+    if stack_trace_store is not None:
+        with open_report_output(
+                os.path.join(args.output_path, STACK_TRACES_CSV_FILENAME), compress=args.compress
+        ) as stack_traces_csv_f_out:
+            stack_trace_store.write_csv(stack_traces_csv_f_out)
+
+    return 0
+
+
+def _watch(args: argparse.Namespace) -> int:
+    log_parser = _get_log_parser(args)
+    tailer = LogDirectoryTailer(log_parser, args.log_path)
+    report_snapshots = ReportSnapshots(log_parser)
+    server = make_report_server(report_snapshots, (args.host, args.port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(
+        'Serving {paths} at http://{args.host}:{server.server_port}'.format(
+            paths=', '.join(REPORT_PATHS), args=args, server=server
+        ),
+        file=sys.stderr,
+    )
+
+    try:
+        # Requests are served the previous snapshots while appended lines are parsed.
+        while True:
+            tailer.poll()
+            report_snapshots.update()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return 0
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('{value} is not a positive integer'.format(**locals()))
+    return number
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError('{value} is not a positive number'.format(**locals()))
+    return number
+
+
+def _add_log_parser_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--cluster', action='store_true', help='Add cluster ids of similar stack traces'
+    )
+    parser.add_argument(
+        '--top-k', type=_positive_int, metavar='K',
+        help='Only report the stack trace keys with the top k counts',
+    )
+    parser.add_argument(
+        '--top-k-per', action='append', default=[], choices=TOP_K_PER_FIELDS,
+        help='Select the top k stack trace keys per package and/or error name',
+    )
+    parser.add_argument(
+        '--min-count', type=_positive_int, metavar='N',
+        help='Only report the stack trace keys seen at least this often',
+    )
+    parser.add_argument(
+        '--suppressions', help='Path of a file of known issues to leave out of the report'
+    )
+    parser.add_argument(
+        '--own-code-root', action='append', default=[], metavar='PATH',
+        help='Path of own code whose frames are used for stack trace keys, may be given more than '
+             'once (default: {})'.format(', '.join(DEFAULT_OWN_CODE_ROOTS)),
+    )
+    parser.add_argument(
+        '--key-frames', type=_positive_int, default=1, metavar='N',
+        help='Number of own code frames that make up each stack trace key (default: 1)',
+    )
+    parser.add_argument(
+        '--max-frames', type=_positive_int, metavar='N',
+        help='Only embed the first N frames of each sample stack trace in the report',
+    )
+    parser.add_argument(
+        '--count-only', action='store_true',
+        help='Only count the errors of each package by error name, without parsing stack traces',
+    )
+    parser.add_argument(
+        '--package-time-budget', type=_positive_float, metavar='SECONDS',
+        help='Only count the remaining errors of a package after parsing its log lines for this '
+             'long',
+    )
+    parser.add_argument(
+        '--package-memory-budget', type=_positive_int, metavar='MB',
+        help='Only count the remaining errors of a package once this much of its sanitizer '
+             'output is buffered at once',
+    )
+
+
+def _get_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='colcon-sanitizer-reports', description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    baseline_parser = subparsers.add_parser(
+        'baseline', help='Write the fingerprints of the findings in a report to a baseline file'
+    )
+    baseline_parser.add_argument('report_csv', help='Path of a sanitizer_report.csv')
+    baseline_parser.add_argument('baseline', help='Path of the baseline file to write')
+    baseline_parser.set_defaults(function=_baseline)
+
+    diff_parser = subparsers.add_parser(
+        'diff',
+        help='Print findings in a report that are new to a baseline file. Exits with status '
+             '{_NEW_FINDINGS_EXIT_STATUS} if there are any.'.format(**globals()),
+    )
+    diff_parser.add_argument('baseline', help='Path of the baseline file')
+    diff_parser.add_argument('report_csv', help='Path of a sanitizer_report.csv')
+    diff_parser.set_defaults(function=_diff)
+
+    diff_runs_parser = subparsers.add_parser(
+        'diff-runs',
+        help='Print findings that are new, fixed or regressed between two runs in a findings '
+             'database. Exits with status {_NEW_FINDINGS_EXIT_STATUS} if any are new or regressed.'
+             .format(**globals()),
+    )
+    diff_runs_parser.add_argument('database', help='Path of the findings database')
+    diff_runs_parser.add_argument('base_run', help='Name of the run to compare against')
+    diff_runs_parser.add_argument('run', help='Name of the run to compare')
+    diff_runs_parser.set_defaults(function=_diff_runs)
+
+    report_parser = subparsers.add_parser(
+        'report',
+        help='Write the report of a past colcon invocation by replaying its {EVENT_LOG_FILENAME}'
+             .format(**globals()),
+    )
+    report_parser.add_argument(
+        'log_path', help='Path of the log directory of the invocation (e.g. log/latest_test)'
+    )
+    report_parser.add_argument(
+        '--output-path', default=os.curdir, help='Directory to write the report to'
+    )
+    report_parser.add_argument(
+        '--log-files', metavar='PATTERN',
+        help='Also parse the per-process sanitizer log files of each package, given the glob '
+             'pattern of their log_path option where {package} is the package name',
+    )
+    report_parser.add_argument(
+        '--split-stack-traces', action='store_true',
+        help='Store each unique sample stack trace once in {STACK_TRACES_CSV_FILENAME}, referenced '
+             'by hash from the report'.format(**globals()),
+    )
+    report_parser.add_argument(
+        '--compress', action='store_true', help='Compress the report files with gzip'
+    )
+    report_parser.add_argument(
+        '--ndjson', action='store_true',
+        help='Also write the report as newline-delimited json to {REPORT_NDJSON_FILENAME}'.format(
+            **globals()
+        ),
+    )
+    report_parser.add_argument(
+        '--symbolizer', metavar='PATH',
+        help='Symbolize the frames that the sanitizers did not symbolize with this llvm-symbolizer',
+    )
+    report_parser.add_argument(
+        '--symbol-cache', metavar='PATH',
+        help='Path of a SQLite database in which symbols are cached across runs',
+    )
+    _add_log_parser_arguments(report_parser)
+    report_parser.set_defaults(function=_report)
+
+    watch_parser = subparsers.add_parser(
+        'watch',
+        help='Follow the package logs of a running colcon invocation and serve its latest report '
+             'over HTTP',
+    )
+    watch_parser.add_argument(
+        'log_path', help='Path of the log directory of the invocation (e.g. log/latest_test)'
+    )
+    watch_parser.add_argument(
+        '--host', default='127.0.0.1', help='Address to serve the report at (default: %(default)s)'
+    )
+    watch_parser.add_argument(
+        '--port', type=int, default=8000, help='Port to serve the report at (default: %(default)s)'
+    )
+    watch_parser.add_argument(
+        '--interval', type=float, default=1.0,
+        help='Seconds between checks of the package logs for new lines (default: %(default)s)',
+    )
+    _add_log_parser_arguments(watch_parser)
+    watch_parser.set_defaults(function=_watch)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command given by the command line arguments and return the exit status."""
+    args = _get_argument_parser().parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,19 +12,160 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+from pathlib import Path
+import shutil
+from typing import Dict, Optional, TYPE_CHECKING
+
+from colcon_core.environment_variable import EnvironmentVariable
 from colcon_core.event.job import JobEnded
 from colcon_core.event_handler import EventHandlerExtensionPoint
+from colcon_core.event_reactor import EventReactorShutdown
 from colcon_core.location import get_log_path
 from colcon_core.logging import colcon_logger
 from colcon_core.plugin_system import satisfies_version
 from colcon_output.event_handler.log import STDOUT_STDERR_LOG_FILENAME
-from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+
+if TYPE_CHECKING:
+    from colcon_sanitizer_reports.findings_store import FindingsStore  # noqa: F401
+    from colcon_sanitizer_reports.parse_budget import ParseBudget  # noqa: F401
+    from colcon_sanitizer_reports.report_selection import ReportSelection  # noqa: F401
+    from colcon_sanitizer_reports.sample_stack_traces import SampleStackTraceFormat  # noqa: F401
+    from colcon_sanitizer_reports.sanitizer_log_files import SanitizerLogFilePool  # noqa: F401
+    from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser  # noqa: F401
+    from colcon_sanitizer_reports.stack_trace_keys import StackTraceKeyFinder  # noqa: F401
+    from colcon_sanitizer_reports.suppressions import Suppressions  # noqa: F401
 
 logger = colcon_logger.getChild(__name__)
 
+DATABASE_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_DATABASE',
+    'Path of a SQLite database to which the findings of each run are added',
+)
+
+CLUSTER_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_CLUSTER',
+    'Set to 1 to add the cluster id of similar stack traces to the report',
+)
+
+TOP_K_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_TOP_K',
+    'Only report the stack trace keys with the top k counts, summarizing the rest',
+)
+
+TOP_K_PER_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_TOP_K_PER',
+    'Comma separated fields (package, error_name) to select the top k stack trace keys per',
+)
+
+MIN_COUNT_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_MIN_COUNT',
+    'Only report the stack trace keys seen at least this many times, summarizing the rest',
+)
+
+SUPPRESSIONS_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_SUPPRESSIONS',
+    'Path of a file of known issues whose stack traces are left out of the report',
+)
+
+LOG_FILES_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_LOG_FILES',
+    'Glob pattern of the sanitizer log_path option of each package, where {package} is replaced '
+    'by the package name, to also parse the per-process sanitizer log files',
+)
+
+OWN_CODE_ROOTS_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_OWN_CODE_ROOTS',
+    "Paths of own code separated by '{}', whose frames are used for stack trace keys "
+    '(default: /ros2)'.format(os.pathsep),
+)
+
+KEY_FRAMES_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_KEY_FRAMES',
+    'Number of own code frames that make up each stack trace key (default: 1)',
+)
+
+MAX_FRAMES_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_MAX_FRAMES',
+    'Only embed the first frames of each sample stack trace in the report',
+)
+
+SPLIT_STACK_TRACES_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_SPLIT_STACK_TRACES',
+    'Set to 1 to store each unique sample stack trace once in a separate file, referenced by hash '
+    'from the report',
+)
+
+COMPRESS_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_COMPRESS',
+    'Set to 1 to compress the aggregate report files with gzip as they are written',
+)
+
+NDJSON_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_NDJSON',
+    'Set to 1 to also write the aggregate report as newline-delimited json',
+)
+
+COUNT_ONLY_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_COUNT_ONLY',
+    'Set to 1 to only count the sanitizer errors of each package by error name, without parsing '
+    'their stack traces',
+)
+
+PACKAGE_TIME_BUDGET_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_PACKAGE_TIME_BUDGET',
+    'Seconds of parsing the log lines of a package after which its remaining errors are only '
+    'counted',
+)
+
+PACKAGE_MEMORY_BUDGET_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_PACKAGE_MEMORY_BUDGET',
+    'Megabytes of buffered sanitizer output of a package after which its remaining errors are '
+    'only counted',
+)
+
+SYMBOLIZER_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_SYMBOLIZER',
+    'Path of llvm-symbolizer to symbolize the frames that the sanitizers did not symbolize',
+)
+
+SYMBOL_CACHE_ENVIRONMENT_VARIABLE = EnvironmentVariable(
+    'COLCON_SANITIZER_REPORTS_SYMBOL_CACHE',
+    'Path of a SQLite database in which symbols are cached across runs',
+)
+
+# Each package's report shards are written to these files in the package's log directory.
+SHARD_CSV_FILENAME = 'sanitizer_report.csv'
+SHARD_XML_FILENAME = 'sanitizer_report.xml'
+
+# The aggregate report of all packages is assembled from the shards into these files in the current
+# working directory.
+REPORT_CSV_FILENAME = 'sanitizer_report.csv'
+REPORT_XML_FILENAME = 'test_results.xml'
+
+# The report aggregated across packages by error name and stack trace key is written to this file in
+# the current working directory.
+REPORT_BY_KEY_CSV_FILENAME = 'sanitizer_report_by_key.csv'
+
+# If enabled, records of the report in newline-delimited json, for bulk loading into analytics
+# stores, are written to this file in the current working directory.
+REPORT_NDJSON_FILENAME = 'sanitizer_report.ndjson'
+
+# In split mode, the unique sample stack traces referenced by the report are written to this file in
+# the current working directory.
+STACK_TRACES_CSV_FILENAME = 'sanitizer_stack_traces.csv'
+
+# Counts of stack traces dropped by each suppression are written to this file in the current working
+# directory, if suppressions are used.
+SUPPRESSIONS_CSV_FILENAME = 'sanitizer_suppressions.csv'
+
 
 class SanitizerReportEventHandler(EventHandlerExtensionPoint):
-    """Generate a report of all Sanitizer ERRORs and WARNINGs."""
+    """Generate a report of all Sanitizer ERRORs and WARNINGs.
+
+    When a job ends, the report of its package is written as a shard to the package's log directory.
+    When colcon shuts down, the shards are assembled into the aggregate report of all packages.
+    """
 
     ENABLED_BY_DEFAULT: bool = False
 
@@ -33,7 +174,21 @@ class SanitizerReportEventHandler(EventHandlerExtensionPoint):
         super().__init__()
         satisfies_version(EventHandlerExtensionPoint.EXTENSION_POINT_VERSION, '^1.0')
         self.enabled: bool = SanitizerReportEventHandler.ENABLED_BY_DEFAULT
-        self._log_parser: SanitizerLogParser = SanitizerLogParser()
+
+        # colcon loads every event handler on every invocation, even though this one is disabled by
+        # default. The parser, report generators, and their dependencies are only imported once the
+        # handler handles its first event, so loading the handler costs next to nothing.
+        self._log_parser: Optional['SanitizerLogParser'] = None
+
+        # Log directories holding the report shards of each package, in the order they were written.
+        self._shard_path_by_package: Dict[str, Path] = {}
+
+        # Findings database, kept open from the first package until colcon shuts down.
+        self._findings_store: Optional['FindingsStore'] = None
+
+        # Worker processes parsing sanitizer log files, shared by all packages so they are only
+        # started once, and shut down when colcon shuts down.
+        self._log_file_pool: Optional['SanitizerLogFilePool'] = None
 
     def __call__(self, event) -> None:
         """Handle the colcon event appropriately."""
@@ -41,22 +196,348 @@ class SanitizerReportEventHandler(EventHandlerExtensionPoint):
 
         if isinstance(data, JobEnded):
             self._handle(event)
+        elif isinstance(data, EventReactorShutdown):
+            symbolizer_path = os.environ.get(SYMBOLIZER_ENVIRONMENT_VARIABLE.name)
+            if symbolizer_path and self._log_parser is not None:
+                self._symbolize(self._log_parser, symbolizer_path)
+            self._write_report()
+            self._close_findings_store()
+            self._close_log_file_pool()
 
     def _handle(self, event) -> None:
         """Handle JobEnded event and parse the test log file."""
         job: JobEnded = event[1]
-        self._log_parser.set_package(job.identifier)
+        log_parser = self._get_log_parser()
+        log_parser.set_package(job.identifier)
+        shard_path = get_log_path() / job.identifier
 
         try:
-            log_f = get_log_path() / job.identifier / STDOUT_STDERR_LOG_FILENAME
+            log_f = shard_path / STDOUT_STDERR_LOG_FILENAME
             with open(log_f, 'r') as in_file:
                 for line in in_file:
-                    self._log_parser.parse_line(line)
+                    log_parser.parse_line(line)
         except IOError:
             logger.info('Could not open stdout_stderr.log file')
 
-        with open('sanitizer_report.csv', 'w') as report_csv_f_out:
-            report_csv_f_out.write(self._log_parser.get_csv())
+        log_files_pattern = os.environ.get(LOG_FILES_ENVIRONMENT_VARIABLE.name)
+        if log_files_pattern:
+            from colcon_sanitizer_reports.sanitizer_log_files import (
+                add_sanitizer_log_files, find_sanitizer_log_files, SanitizerLogFilePool
+            )
+
+            if self._log_file_pool is None:
+                self._log_file_pool = SanitizerLogFilePool()
+            add_sanitizer_log_files(
+                log_parser, job.identifier,
+                find_sanitizer_log_files(log_files_pattern, job.identifier),
+                pool=self._log_file_pool,
+            )
+
+        self._write_shard(log_parser, job.identifier, shard_path)
+
+    def _write_shard(
+            self, log_parser: 'SanitizerLogParser', package: str, shard_path: Path
+    ) -> None:
+        """Write the report shard of the package and replace its findings in the database."""
+        shard_path.mkdir(parents=True, exist_ok=True)
+        with open(shard_path / SHARD_CSV_FILENAME, 'w') as shard_csv_f_out:
+            shard_csv_f_out.write(log_parser.get_csv(package=package))
+
+        with open(shard_path / SHARD_XML_FILENAME, 'w') as shard_xml_f_out:
+            shard_xml_f_out.write(log_parser.get_xml(package=package))
+
+        self._shard_path_by_package[package] = shard_path
+
+        database_path = os.environ.get(DATABASE_ENVIRONMENT_VARIABLE.name)
+        if database_path:
+            self._add_findings(log_parser, package, database_path)
+
+    def _add_findings(
+            self, log_parser: 'SanitizerLogParser', package: str, database_path: str
+    ) -> None:
+        """Replace the findings of the package in the findings database."""
+        import sqlite3
+
+        from colcon_sanitizer_reports.findings_store import FindingsStore
+
+        # The shards of the package are already written, so the package is still reported if the
+        # database cannot be written to.
+        try:
+            if self._findings_store is None:
+                self._findings_store = FindingsStore(database_path)
+
+            # Runs are named after the log directory of the colcon invocation.
+            self._findings_store.set_package_findings(
+                get_log_path().name, package,
+                log_parser.get_count_by_output_primary_key(package=package),
+            )
+        except sqlite3.Error as error:
+            logger.warning('Could not add findings to database {database_path}: {error}'.format(
+                database_path=database_path, error=error
+            ))
+
+    def _close_findings_store(self) -> None:
+        """Close the findings database."""
+        if self._findings_store is not None:
+            self._findings_store.close()
+            self._findings_store = None
+
+    def _close_log_file_pool(self) -> None:
+        """Shut down the worker processes parsing sanitizer log files, if any were started."""
+        if self._log_file_pool is not None:
+            self._log_file_pool.close()
+            self._log_file_pool = None
+
+    def _get_log_parser(self) -> 'SanitizerLogParser':
+        """Return the log parser, creating it when first needed."""
+        if self._log_parser is None:
+            from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+
+            self._log_parser = SanitizerLogParser(
+                cluster_stack_traces=os.environ.get(CLUSTER_ENVIRONMENT_VARIABLE.name) == '1',
+                report_selection=_get_report_selection(),
+                suppressions=_get_suppressions(),
+                key_finder=_get_key_finder(),
+                sample_stack_trace_format=_get_sample_stack_trace_format(),
+                count_only=os.environ.get(COUNT_ONLY_ENVIRONMENT_VARIABLE.name) == '1',
+                parse_budget=_get_parse_budget(),
+                defer_unsymbolized=bool(os.environ.get(SYMBOLIZER_ENVIRONMENT_VARIABLE.name)),
+            )
+
+        return self._log_parser
+
+    def _symbolize(self, log_parser: 'SanitizerLogParser', symbolizer_path: str) -> None:
+        """Symbolize the sections of all packages that the sanitizers did not symbolize.
+
+        The sections are symbolized in one batch once every package has been parsed, after which
+        the shards of the packages they belong to are rewritten.
+        """
+        packages = log_parser.get_unsymbolized_packages()
+        if not packages:
+            return
+
+        from colcon_sanitizer_reports.symbolization import (
+            LlvmSymbolizer, StaticSymbolizer, SymbolCache
+        )
+
+        symbolizer = LlvmSymbolizer(symbolizer_path)
+        symbol_cache_path = os.environ.get(SYMBOL_CACHE_ENVIRONMENT_VARIABLE.name)
+        symbol_cache = SymbolCache(symbol_cache_path) if symbol_cache_path else None
+        try:
+            log_parser.symbolize(symbolizer, cache=symbol_cache)
+        except OSError as error:
+            logger.warning('Could not run symbolizer {symbolizer_path}: {error}'.format(
+                symbolizer_path=symbolizer_path, error=error
+            ))
+            # The sections are still reported, with the frames the sanitizers wrote.
+            log_parser.symbolize(StaticSymbolizer({}))
+        finally:
+            symbolizer.close()
+            if symbol_cache is not None:
+                symbol_cache.close()
+
+        for package in packages:
+            self._write_shard(log_parser, package, self._shard_path_by_package[package])
+
+    def _write_report(self) -> None:
+        """Assemble the aggregate report from the shards of all packages."""
+        if not self._shard_path_by_package:
+            return
+
+        from colcon_sanitizer_reports.sample_stack_traces import open_report_output
+
+        log_parser = self._get_log_parser()
+        compress = os.environ.get(COMPRESS_ENVIRONMENT_VARIABLE.name) == '1'
+        if os.environ.get(SUPPRESSIONS_ENVIRONMENT_VARIABLE.name):
+            with open_report_output(
+                    SUPPRESSIONS_CSV_FILENAME, compress=compress
+            ) as suppressions_csv_f_out:
+                suppressions_csv_f_out.write(log_parser.get_suppressions_csv())
+
+        with open_report_output(
+                REPORT_BY_KEY_CSV_FILENAME, compress=compress
+        ) as report_by_key_csv_f_out:
+            log_parser.write_key_csv(report_by_key_csv_f_out)
+
+        # Runs are named after the log directory of the colcon invocation.
+        if os.environ.get(NDJSON_ENVIRONMENT_VARIABLE.name) == '1':
+            with open_report_output(
+                    REPORT_NDJSON_FILENAME, compress=compress
+            ) as report_ndjson_f_out:
+                log_parser.write_ndjson(
+                    report_ndjson_f_out, run_metadata={'name': get_log_path().name}
+                )
+
+        self._write_aggregate_report(log_parser, compress)
+
+        # The report and its shards have referenced all the stack traces they embed by now.
+        stack_trace_store = log_parser.sample_stack_trace_format.store
+        if stack_trace_store is not None:
+            with open_report_output(
+                    STACK_TRACES_CSV_FILENAME, compress=compress
+            ) as stack_traces_csv_f_out:
+                stack_trace_store.write_csv(stack_traces_csv_f_out)
+
+    def _write_aggregate_report(self, log_parser: 'SanitizerLogParser', compress: bool) -> None:
+        from colcon_sanitizer_reports.sample_stack_traces import open_report_output
+
+        # When the top k are selected across packages, the shards are not a selection of the
+        # aggregate report, so it is generated from the parser instead. The same goes for clusters,
+        # since packages parsed after a shard was written can merge the clusters in the shard.
+        if log_parser.cluster_stack_traces or (
+                log_parser.report_selection is not None and
+                not log_parser.report_selection.is_per_package
+        ):
+            with open_report_output(REPORT_CSV_FILENAME, compress=compress) as report_csv_f_out:
+                log_parser.write_csv(report_csv_f_out)
+
+            with open_report_output(REPORT_XML_FILENAME, compress=compress) as report_xml_f_out:
+                report_xml_f_out.write(log_parser.get_xml())
+
+            return
+
+        from colcon_sanitizer_reports.xml_output_generator import XmlOutputGenerator
+
+        # Shards all have the same csv header line, so the aggregate is the first shard followed by
+        # the remaining shards without their header lines.
+        with open_report_output(REPORT_CSV_FILENAME, compress=compress) as report_csv_f_out:
+            for i, shard_path in enumerate(self._shard_path_by_package.values()):
+                with open(shard_path / SHARD_CSV_FILENAME, 'r', newline='') as shard_csv_f_in:
+                    if i > 0:
+                        shard_csv_f_in.readline()
+                    shutil.copyfileobj(shard_csv_f_in, report_csv_f_out)
+
+        xml_strings = []
+        for shard_path in self._shard_path_by_package.values():
+            with open(shard_path / SHARD_XML_FILENAME, 'r') as shard_xml_f_in:
+                xml_strings.append(shard_xml_f_in.read())
+
+        with open_report_output(REPORT_XML_FILENAME, compress=compress) as report_xml_f_out:
+            report_xml_f_out.write(XmlOutputGenerator.combine(xml_strings))
+
+
+def _get_int_environment_variable(environment_variable: EnvironmentVariable) -> Optional[int]:
+    value = os.environ.get(environment_variable.name)
+    if not value:
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(
+            'Ignoring non-integer value of {environment_variable.name}: {value}'.format(**locals())
+        )
+        return None
+
+
+def _get_positive_int_environment_variable(
+        environment_variable: EnvironmentVariable
+) -> Optional[int]:
+    value = _get_int_environment_variable(environment_variable)
+    if value is not None and value < 1:
+        logger.warning(
+            'Ignoring non-positive value of {environment_variable.name}: {value}'.format(
+                **locals()
+            )
+        )
+        return None
+
+    return value
+
+
+def _get_report_selection() -> Optional['ReportSelection']:
+    from colcon_sanitizer_reports.report_selection import ReportSelection, TOP_K_PER_FIELDS
+
+    top_k = _get_positive_int_environment_variable(TOP_K_ENVIRONMENT_VARIABLE)
+    min_count = _get_positive_int_environment_variable(MIN_COUNT_ENVIRONMENT_VARIABLE)
+    if top_k is None and min_count is None:
+        return None
+
+    top_k_per = []
+    for field in os.environ.get(TOP_K_PER_ENVIRONMENT_VARIABLE.name, '').split(','):
+        field = field.strip()
+        if field in TOP_K_PER_FIELDS:
+            top_k_per.append(field)
+        elif field:
+            logger.warning('Ignoring unknown field in {name}: {field}'.format(
+                name=TOP_K_PER_ENVIRONMENT_VARIABLE.name, field=field
+            ))
+
+    return ReportSelection(
+        top_k=top_k, top_k_per=tuple(top_k_per),
+        min_count=min_count if min_count is not None else 1,
+    )
+
+
+def _get_suppressions() -> Optional['Suppressions']:
+    suppressions_path = os.environ.get(SUPPRESSIONS_ENVIRONMENT_VARIABLE.name)
+    if not suppressions_path:
+        return None
+
+    from colcon_sanitizer_reports.suppressions import load_suppressions
+
+    try:
+        return load_suppressions(suppressions_path)
+    except IOError:
+        logger.warning(
+            'Could not open suppressions file: {suppressions_path}'.format(**locals())
+        )
+        return None
+    except ValueError as error:
+        logger.warning('Ignoring suppressions file {suppressions_path}: {error}'.format(
+            suppressions_path=suppressions_path, error=error
+        ))
+        return None
+
+
+def _get_key_finder() -> 'StackTraceKeyFinder':
+    from colcon_sanitizer_reports.stack_trace_keys import (
+        DEFAULT_OWN_CODE_ROOTS, DEFAULT_STACK_TRACE_KEY_FINDER, StackTraceKeyFinder
+    )
+
+    own_code_roots = tuple(
+        own_code_root for own_code_root in
+        os.environ.get(OWN_CODE_ROOTS_ENVIRONMENT_VARIABLE.name, '').split(os.pathsep)
+        if own_code_root
+    )
+    frame_count = _get_positive_int_environment_variable(KEY_FRAMES_ENVIRONMENT_VARIABLE)
+
+    if not own_code_roots and frame_count is None:
+        return DEFAULT_STACK_TRACE_KEY_FINDER
+
+    return StackTraceKeyFinder(
+        own_code_roots=own_code_roots or DEFAULT_OWN_CODE_ROOTS,
+        frame_count=frame_count if frame_count is not None else 1,
+    )
+
+
+def _get_sample_stack_trace_format() -> 'SampleStackTraceFormat':
+    from colcon_sanitizer_reports.sample_stack_traces import (
+        DEFAULT_SAMPLE_STACK_TRACE_FORMAT, SampleStackTraceFormat, StackTraceStore
+    )
+
+    max_frames = _get_positive_int_environment_variable(MAX_FRAMES_ENVIRONMENT_VARIABLE)
+
+    split = os.environ.get(SPLIT_STACK_TRACES_ENVIRONMENT_VARIABLE.name) == '1'
+    if max_frames is None and not split:
+        return DEFAULT_SAMPLE_STACK_TRACE_FORMAT
+
+    return SampleStackTraceFormat(
+        max_frames=max_frames, store=StackTraceStore() if split else None
+    )
+
+
+def _get_parse_budget() -> Optional['ParseBudget']:
+    from colcon_sanitizer_reports.parse_budget import ParseBudget
+
+    max_seconds = _get_positive_int_environment_variable(PACKAGE_TIME_BUDGET_ENVIRONMENT_VARIABLE)
+    max_megabytes = _get_positive_int_environment_variable(
+        PACKAGE_MEMORY_BUDGET_ENVIRONMENT_VARIABLE
+    )
+    if max_seconds is None and max_megabytes is None:
+        return None
 
-        with open('test_results.xml', 'w') as report_xml_f_out:
-            report_xml_f_out.write(self._log_parser.get_xml())
+    return ParseBudget(
+        max_seconds=max_seconds,
+        max_bytes=max_megabytes * 1024 * 1024 if max_megabytes is not None else None,
+    )
@@ -0,0 +1,54 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import re
+
+from colcon_output.event_handler.event_log import EventLogEventHandler
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+
+# Name of the events log colcon writes to the log directory of an invocation.
+EVENT_LOG_FILENAME = EventLogEventHandler.FILENAME
+
+# Each event in the events log is one line of "[<time>] (<job identifier>) <event type>: <members>".
+# Output lines of a job are StdoutLine and StderrLine events and match the following pattern, where
+# line is the Python literal of the output line.
+_FIND_OUTPUT_LINE_EVENT_REGEX = re.compile(
+    r"^\[[\d.]+\] \((?P<identifier>.+?)\) (StdoutLine|StderrLine): \{'line': (?P<line>.*)\}$"
+)
+
+# The events log is read sequentially in large chunks, which is much cheaper than reading the logs
+# of each package on network filesystems.
+_READ_BUFFER_SIZE = 1 << 20
+
+
+def parse_event_log(log_parser: SanitizerLogParser, path: str) -> None:
+    """Parse output lines of every job in a colcon events log with the given parser.
+
+    The events log of a colcon invocation holds the output lines of all its jobs interleaved. Lines
+    are demultiplexed by job identifier and parsed as if they were read from the stdout_stderr.log
+    of each package, so the report is the same as parsing each package's log.
+    """
+    with open(path, 'r', buffering=_READ_BUFFER_SIZE, errors='replace') as event_log_f_in:
+        for event_line in event_log_f_in:
+            match = _FIND_OUTPUT_LINE_EVENT_REGEX.match(event_line.rstrip('\n'))
+            if match is None:
+                continue
+
+            line = ast.literal_eval(match.group('line'))
+            if isinstance(line, bytes):
+                line = line.decode(errors='replace')
+
+            log_parser.set_package(match.group('identifier'))
+            log_parser.parse_line(line)
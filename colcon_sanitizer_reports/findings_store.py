@@ -0,0 +1,232 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from itertools import islice
+import sqlite3
+from typing import Iterator, Mapping, NamedTuple, Optional, Tuple
+
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
+
+# Findings are stored per run, one row per output primary key. Every column a cross-run query
+# filters on is indexed together with the run, so that a query touches only the rows it returns.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS finding (
+    run_id INTEGER NOT NULL REFERENCES run (id),
+    package TEXT NOT NULL,
+    error_name TEXT NOT NULL,
+    stack_trace_key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, package, error_name, stack_trace_key)
+);
+CREATE INDEX IF NOT EXISTS finding_by_stack_trace_key ON finding (stack_trace_key, run_id);
+CREATE INDEX IF NOT EXISTS finding_by_package ON finding (package, run_id);
+CREATE INDEX IF NOT EXISTS finding_by_error_name ON finding (error_name, run_id);
+"""
+
+# Matches a finding row "f" against the same output primary key in another run "o".
+_SAME_OUTPUT_PRIMARY_KEY = (
+    'o.package = f.package AND o.error_name = f.error_name '
+    'AND o.stack_trace_key = f.stack_trace_key'
+)
+
+# Findings in run that are not in base run and were never seen before run.
+_SELECT_NEW = """
+SELECT f.package, f.error_name, f.stack_trace_key FROM finding AS f
+WHERE f.run_id = :run_id AND NOT EXISTS (
+    SELECT 1 FROM finding AS o WHERE (o.run_id = :base_run_id OR o.run_id < :run_id) AND {same}
+)
+ORDER BY f.package, f.error_name, f.stack_trace_key
+""".format(same=_SAME_OUTPUT_PRIMARY_KEY)
+
+# Findings in base run that are not in run.
+_SELECT_FIXED = """
+SELECT f.package, f.error_name, f.stack_trace_key FROM finding AS f
+WHERE f.run_id = :base_run_id AND NOT EXISTS (
+    SELECT 1 FROM finding AS o WHERE o.run_id = :run_id AND {same}
+)
+ORDER BY f.package, f.error_name, f.stack_trace_key
+""".format(same=_SAME_OUTPUT_PRIMARY_KEY)
+
+# Findings in run that are not in base run, but were seen in some run before run.
+_SELECT_REGRESSED = """
+SELECT f.package, f.error_name, f.stack_trace_key FROM finding AS f
+WHERE f.run_id = :run_id AND NOT EXISTS (
+    SELECT 1 FROM finding AS o WHERE o.run_id = :base_run_id AND {same}
+) AND EXISTS (
+    SELECT 1 FROM finding AS o WHERE o.run_id < :run_id AND {same}
+)
+ORDER BY f.package, f.error_name, f.stack_trace_key
+""".format(same=_SAME_OUTPUT_PRIMARY_KEY)
+
+
+class FindingsStoreDiff(NamedTuple):
+    """Difference between the findings of two runs in a FindingsStore.
+
+    new:
+        Output primary keys found in the run that were never seen in the base run or any run stored
+        before the run.
+
+    fixed:
+        Output primary keys found in the base run that are not found in the run.
+
+    regressed:
+        Output primary keys found in the run that are not found in the base run, but were seen in
+        some other run stored before the run.
+    """
+
+    new: Tuple[SanitizerLogParserOutputPrimaryKey, ...]
+    fixed: Tuple[SanitizerLogParserOutputPrimaryKey, ...]
+    regressed: Tuple[SanitizerLogParserOutputPrimaryKey, ...]
+
+
+class FindingsStore:
+    """Stores SanitizerLogParser findings of many runs in a local SQLite database.
+
+    Each run is identified by a unique name, for example the name of the colcon log directory of the
+    invocation. Runs are ordered by the time they were first added to the store. Findings are the
+    counts reported by SanitizerLogParser for each SanitizerLogParserOutputPrimaryKey.
+
+    Findings are bulk inserted in batched transactions. Adding the findings of an output primary key
+    that is already stored for the same run replaces its count. Setting the findings of a package
+    replaces all of its findings in the run, so that findings the package no longer has are dropped
+    when its log is parsed again.
+    """
+
+    def __init__(self, path: str, *, batch_size: int = 10000) -> None:
+        """Open or create the database at path."""
+        self._batch_size = batch_size
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def __enter__(self) -> 'FindingsStore':
+        """Use the store as a context manager that closes the database on exit."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the database."""
+        self.close()
+
+    def add_findings(
+            self, run: str,
+            count_by_output_primary_key: Mapping[SanitizerLogParserOutputPrimaryKey, int]
+    ) -> None:
+        """Store counts of findings for the named run, creating the run if it is new."""
+        self._insert_findings(self._add_run(run), count_by_output_primary_key)
+
+    def set_package_findings(
+            self, run: str, package: str,
+            count_by_output_primary_key: Mapping[SanitizerLogParserOutputPrimaryKey, int]
+    ) -> None:
+        """Replace the findings of the package in the named run, creating the run if it is new."""
+        run_id = self._add_run(run)
+        with self._connection:
+            self._connection.execute(
+                'DELETE FROM finding WHERE run_id = ? AND package = ?', (run_id, package)
+            )
+        self._insert_findings(run_id, count_by_output_primary_key)
+
+    def get_runs(self) -> Tuple[str, ...]:
+        """Return names of all stored runs, oldest first."""
+        return tuple(name for name, in self._connection.execute('SELECT name FROM run ORDER BY id'))
+
+    def get_first_seen_run(self, stack_trace_key: str) -> Optional[str]:
+        """Return the name of the oldest run with the stack trace key, or None if never seen."""
+        row = self._connection.execute(
+            'SELECT run.name FROM finding JOIN run ON run.id = finding.run_id '
+            'WHERE finding.stack_trace_key = ? ORDER BY finding.run_id LIMIT 1',
+            (stack_trace_key,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def get_count_by_run(self, stack_trace_key: str) -> Tuple[Tuple[str, int], ...]:
+        """Return (run, total count) of the stack trace key for each run it was seen in."""
+        return tuple(self._connection.execute(
+            'SELECT run.name, SUM(finding.count) FROM finding JOIN run ON run.id = finding.run_id '
+            'WHERE finding.stack_trace_key = ? GROUP BY finding.run_id ORDER BY finding.run_id',
+            (stack_trace_key,),
+        ))
+
+    def get_packages(self, stack_trace_key: str, *, run: Optional[str] = None) -> Tuple[str, ...]:
+        """Return packages that have the stack trace key, in any run or in the named run only."""
+        if run is None:
+            cursor = self._connection.execute(
+                'SELECT DISTINCT package FROM finding WHERE stack_trace_key = ? ORDER BY package',
+                (stack_trace_key,),
+            )
+        else:
+            cursor = self._connection.execute(
+                'SELECT DISTINCT package FROM finding '
+                'WHERE stack_trace_key = ? AND run_id = ? ORDER BY package',
+                (stack_trace_key, self._get_run_id(run)),
+            )
+
+        return tuple(package for package, in cursor)
+
+    def diff(self, base_run: str, run: str) -> FindingsStoreDiff:
+        """Return new, fixed, and regressed findings of run relative to base run."""
+        parameters = {'base_run_id': self._get_run_id(base_run), 'run_id': self._get_run_id(run)}
+        return FindingsStoreDiff(
+            new=self._select_output_primary_keys(_SELECT_NEW, parameters),
+            fixed=self._select_output_primary_keys(_SELECT_FIXED, parameters),
+            regressed=self._select_output_primary_keys(_SELECT_REGRESSED, parameters),
+        )
+
+    def _add_run(self, run: str) -> int:
+        with self._connection:
+            self._connection.execute('INSERT OR IGNORE INTO run (name) VALUES (?)', (run,))
+        return self._get_run_id(run)
+
+    def _insert_findings(
+            self, run_id: int,
+            count_by_output_primary_key: Mapping[SanitizerLogParserOutputPrimaryKey, int]
+    ) -> None:
+        rows: Iterator[Tuple[int, str, str, str, int]] = (
+            (run_id, *output_primary_key, count)
+            for output_primary_key, count in count_by_output_primary_key.items()
+        )
+        while True:
+            batch = list(islice(rows, self._batch_size))
+            if not batch:
+                break
+
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO finding '
+                    '(run_id, package, error_name, stack_trace_key, count) VALUES (?, ?, ?, ?, ?)',
+                    batch,
+                )
+
+    def _get_run_id(self, run: str) -> int:
+        row = self._connection.execute('SELECT id FROM run WHERE name = ?', (run,)).fetchone()
+        if row is None:
+            raise KeyError('Unknown run: {run}'.format(**locals()))
+
+        return row[0]
+
+    def _select_output_primary_keys(
+            self, query: str, parameters: Mapping[str, int]
+    ) -> Tuple[SanitizerLogParserOutputPrimaryKey, ...]:
+        return tuple(
+            SanitizerLogParserOutputPrimaryKey(*row)
+            for row in self._connection.execute(query, parameters)
+        )
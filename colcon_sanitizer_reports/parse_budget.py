@@ -0,0 +1,69 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import NamedTuple, Optional
+
+# Reasons that sections of a package are counted without parsing their stack traces.
+COUNT_ONLY_REASON = 'counting-only mode'
+TIME_BUDGET_REASON = 'time budget exceeded'
+MEMORY_BUDGET_REASON = 'memory budget exceeded'
+
+
+class ParseBudget(NamedTuple):
+    """Limits on the resources spent on fully parsing the sanitizer output of each package.
+
+    Once a package exceeds a limit, its remaining sanitizer sections are counted by error name
+    instead of being parsed into stack traces. See CountedSections.
+
+    max_seconds:
+        If not None, the maximum time spent parsing the log lines of a package, from matching them
+        to sanitizer sections to building the stack traces of the sections.
+
+    max_bytes:
+        If not None, the maximum size of the lines of sanitizer sections of a package that are
+        buffered at once. Lines are held until their section ends and then released, so this
+        bounds the memory that the sections of the package take while they are gathered.
+    """
+
+    max_seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+
+class CountedSections(NamedTuple):
+    """Count of the sanitizer sections of an error name that were counted without parsing them.
+
+    package:
+        Package of the counted sections.
+
+    error_name:
+        Error name parsed from the headers of the counted sections.
+
+    section_count:
+        Number of counted sections. Unlike the counts of output primary keys, this counts sections
+        and not their relevant stack traces.
+
+    reason:
+        Why the sections were counted without parsing them, such as COUNT_ONLY_REASON.
+    """
+
+    package: str
+    error_name: str
+    section_count: int
+    reason: str
+
+    @property
+    def description(self) -> str:
+        """Human readable description of the counted sections."""
+        return '{self.section_count} sections counted without parsing stack traces ' \
+            '({self.reason})'.format(self=self)
@@ -0,0 +1,163 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import defaultdict
+import heapq
+from typing import (
+    Collection, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING
+)
+
+if TYPE_CHECKING:
+    from colcon_sanitizer_reports.sanitizer_log_parser import (  # noqa: F401
+        SanitizerLogParserOutputPrimaryKey
+    )
+
+# Fields of SanitizerLogParserOutputPrimaryKey that top k selection can be grouped by.
+TOP_K_PER_FIELDS = ('package', 'error_name')
+
+
+class ReportSelection(NamedTuple):
+    """Limits which output primary keys are included in a report.
+
+    top_k:
+        If not None, only the top_k output primary keys with the highest counts of each group are
+        included. Ties are broken in favor of the output primary key that was seen first.
+
+    top_k_per:
+        Fields of SanitizerLogParserOutputPrimaryKey ("package" and/or "error_name") that group
+        output primary keys for top k selection. If empty, the top k are selected from all output
+        primary keys of the report.
+
+    min_count:
+        Output primary keys with a count less than min_count are not included.
+    """
+
+    top_k: Optional[int] = None
+    top_k_per: Tuple[str, ...] = ()
+    min_count: int = 1
+
+    @property
+    def is_per_package(self) -> bool:
+        """Whether the selection of each package's output primary keys is independent of others."""
+        return self.top_k is None or 'package' in self.top_k_per
+
+
+class ReportRemainder(NamedTuple):
+    """Summary of the output primary keys of a package that were omitted from a report.
+
+    package:
+        Package of the omitted output primary keys.
+
+    error_name:
+        Error name of the omitted output primary keys, or an empty string if they have different
+        error names.
+
+    key_count:
+        Number of omitted output primary keys.
+
+    total_count:
+        Sum of the counts of the omitted output primary keys.
+    """
+
+    package: str
+    error_name: str
+    key_count: int
+    total_count: int
+
+    @property
+    def description(self) -> str:
+        """Human readable description of the omitted output primary keys."""
+        return '{self.key_count} more stack trace keys with a total count of ' \
+               '{self.total_count} were omitted from the report'.format(self=self)
+
+
+class ReportSelectionResult(NamedTuple):
+    """Output primary keys selected for a report, in the order they were given, and remainders."""
+
+    output_primary_keys: Collection['SanitizerLogParserOutputPrimaryKey']
+    remainders: Sequence[ReportRemainder]
+
+
+def select_report(
+        count_by_output_primary_key: Iterable[Tuple['SanitizerLogParserOutputPrimaryKey', int]],
+        report_selection: ReportSelection,
+) -> ReportSelectionResult:
+    """Select output primary keys for a report and summarize the omitted ones.
+
+    Each group keeps a min-heap of at most top_k entries, so the output primary keys are visited
+    once and never sorted as a whole. Only the selected output primary keys are sorted back into
+    their original order.
+
+    A ValueError is raised if top_k_per has a field that is not in TOP_K_PER_FIELDS.
+    """
+    for field in report_selection.top_k_per:
+        if field not in TOP_K_PER_FIELDS:
+            raise ValueError('Cannot select top k per {field}'.format(field=field))
+
+    # Heap entries are (count, -order, output_primary_key), so the root of each heap is the entry
+    # with the lowest count that was seen last, which is the first to be omitted.
+    heap_by_group: Dict[
+        Tuple[str, ...], List[Tuple[int, int, 'SanitizerLogParserOutputPrimaryKey']]
+    ] = defaultdict(list)
+    selected: List[Tuple[int, int, 'SanitizerLogParserOutputPrimaryKey']] = []
+
+    # Omitted output primary keys are summarized per package and group, in the order of omission.
+    remainder_by_group: Dict[Tuple[str, ...], ReportRemainder] = {}
+
+    def omit(output_primary_key: 'SanitizerLogParserOutputPrimaryKey', count: int) -> None:
+        group = (output_primary_key.package, output_primary_key.error_name) \
+            if 'error_name' in report_selection.top_k_per else (output_primary_key.package,)
+        remainder = remainder_by_group.get(group)
+        if remainder is None:
+            remainder_by_group[group] = ReportRemainder(
+                output_primary_key.package, output_primary_key.error_name, 1, count
+            )
+        else:
+            remainder_by_group[group] = ReportRemainder(
+                remainder.package,
+                remainder.error_name if remainder.error_name == output_primary_key.error_name
+                else '',
+                remainder.key_count + 1,
+                remainder.total_count + count,
+            )
+
+    for order, (output_primary_key, count) in enumerate(count_by_output_primary_key):
+        if count < report_selection.min_count:
+            omit(output_primary_key, count)
+            continue
+
+        entry = (count, -order, output_primary_key)
+        if report_selection.top_k is None:
+            selected.append(entry)
+            continue
+
+        heap = heap_by_group[tuple(
+            getattr(output_primary_key, field) for field in report_selection.top_k_per
+        )]
+        if len(heap) < report_selection.top_k:
+            heapq.heappush(heap, entry)
+        else:
+            omitted_count, _, omitted_output_primary_key = heapq.heappushpop(heap, entry)
+            omit(omitted_output_primary_key, omitted_count)
+
+    if report_selection.top_k is not None:
+        selected = sorted(
+            (entry for heap in heap_by_group.values() for entry in heap),
+            key=lambda entry: -entry[1],
+        )
+
+    return ReportSelectionResult(
+        output_primary_keys=[output_primary_key for _, _, output_primary_key in selected],
+        remainders=list(remainder_by_group.values()),
+    )
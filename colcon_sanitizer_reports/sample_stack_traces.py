@@ -0,0 +1,122 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import gzip
+import hashlib
+from io import StringIO
+from typing import Dict, IO, Optional, Sequence
+
+# Suffix of report files that are compressed as they are written.
+COMPRESSED_SUFFIX = '.gz'
+
+# Sample stack traces in split mode are replaced by this prefix followed by the hash of the full
+# stack trace in the StackTraceStore.
+STACK_TRACE_REFERENCE_PREFIX = 'stack_trace:'
+
+
+class StackTraceStore:
+    """Stores each unique sample stack trace once, addressed by the hash of its text.
+
+    CSV output columns are "stack_trace_hash,stack_trace", with one line for each unique stack
+    trace in the order they were first added. Reports reference a stack trace by its hash, so a
+    stack trace that is the sample of many packages or output formats is stored once.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty store."""
+        self._stack_trace_by_hash: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        """Return the number of unique stack traces."""
+        return len(self._stack_trace_by_hash)
+
+    def add(self, stack_trace: str) -> str:
+        """Add a stack trace unless it is already stored, and return its hash."""
+        stack_trace_hash = hashlib.blake2b(stack_trace.encode(), digest_size=16).hexdigest()
+        self._stack_trace_by_hash.setdefault(stack_trace_hash, stack_trace)
+        return stack_trace_hash
+
+    def get(self, stack_trace_hash: str) -> Optional[str]:
+        """Return the stack trace with the given hash, if it is stored."""
+        return self._stack_trace_by_hash.get(stack_trace_hash)
+
+    def get_csv(self) -> str:
+        """Return a csv representation of the stored stack traces."""
+        csv_f_out = StringIO()
+        self.write_csv(csv_f_out)
+        return csv_f_out.getvalue()
+
+    def write_csv(self, csv_f_out: IO[str]) -> None:
+        """Write a csv representation of the stored stack traces to a file."""
+        writer = csv.writer(csv_f_out)
+        writer.writerow(['stack_trace_hash', 'stack_trace'])
+        writer.writerows(self._stack_trace_by_hash.items())
+
+
+class SampleStackTraceFormat:
+    """Formats the sample stack traces that are embedded in reports.
+
+    If max_frames is given, only the first max_frames frames of a sample stack trace are embedded,
+    followed by a line with the number of omitted frames. If a store is given (split mode), the full
+    sample stack trace is added to the store instead, and the report embeds a reference to it, which
+    is STACK_TRACE_REFERENCE_PREFIX followed by its hash.
+    """
+
+    @property
+    def max_frames(self) -> Optional[int]:
+        """Maximum number of frames of an embedded sample stack trace, if any."""
+        return self._max_frames
+
+    @property
+    def store(self) -> Optional[StackTraceStore]:
+        """Store of the full sample stack traces in split mode."""
+        return self._store
+
+    def __init__(
+            self, *, max_frames: Optional[int] = None, store: Optional[StackTraceStore] = None
+    ) -> None:
+        """Initialize the format."""
+        assert max_frames is None or max_frames > 0, 'Stack traces need at least one frame'
+        self._max_frames = max_frames
+        self._store = store
+
+    def get_text(self, lines: Sequence[str]) -> str:
+        """Return the text embedded in reports for a sample stack trace with the given lines."""
+        if self._store is not None:
+            return STACK_TRACE_REFERENCE_PREFIX + self._store.add('\n'.join(lines))
+
+        if self._max_frames is not None and len(lines) > self._max_frames:
+            return '\n'.join((
+                *lines[:self._max_frames],
+                '    ... {} more frames'.format(len(lines) - self._max_frames),
+            ))
+
+        return '\n'.join(lines)
+
+
+# Format of sample stack traces when no other is given, which embeds them in full.
+DEFAULT_SAMPLE_STACK_TRACE_FORMAT = SampleStackTraceFormat()
+
+
+def open_report_output(path: str, *, compress: bool = False) -> IO[str]:
+    """Open a report file for writing, compressing it with gzip as it is written if compress.
+
+    Compressed files get COMPRESSED_SUFFIX appended to path. Newlines are written as is, so csv line
+    endings are kept.
+    """
+    if compress:
+        return gzip.open(path + COMPRESSED_SUFFIX, 'wt', newline='')
+
+    return open(path, 'w', newline='')
@@ -0,0 +1,215 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import glob
+import multiprocessing
+import os
+import re
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from colcon_sanitizer_reports._sanitizer_section import find_error_name, SanitizerSection
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, StackTraceKeyFinder
+)
+from colcon_sanitizer_reports.suppressions import Suppressions
+from colcon_sanitizer_reports.symbolization import has_unsymbolized_frames
+
+# Placeholder for the package name in patterns of sanitizer log files.
+PACKAGE_PLACEHOLDER = '{package}'
+
+# Sanitizers given a log_path option write the output of each process to "<log_path>.<pid>".
+_FIND_PID_SUFFIX_REGEX = re.compile(r'\.\d+$')
+
+# Sanitizer log files only hold sanitizer output, so sections start and end at the beginning of a
+# line, with no logging prefix.
+_FIND_SECTION_START_LINE_REGEX = re.compile(r'^(==\d+==|)(WARNING|ERROR):.*Sanitizer:')
+_FIND_SECTION_END_LINE_REGEX = re.compile(r'^SUMMARY: .*Sanitizer: ')
+
+# Files of a package holding fewer bytes than this in total are parsed serially, since handing
+# them to worker processes costs more than parsing them.
+_MIN_PARALLEL_SIZE = 16 * 1024 * 1024
+
+_Result = TypeVar('_Result')
+
+
+def find_sanitizer_log_files(pattern: str, package: str) -> List[str]:
+    """Return the sorted paths of the per-process sanitizer log files of a package.
+
+    Pattern is a glob pattern of sanitizer log_path options, where PACKAGE_PLACEHOLDER is replaced
+    by the package name and "**" matches any number of directories, such as
+    "build/{package}/**/asan". Files matching the pattern followed by a ".<pid>" suffix are found.
+    """
+    return sorted(
+        path for path in glob.iglob(
+            pattern.replace(PACKAGE_PLACEHOLDER, glob.escape(package)) + '.*', recursive=True
+        )
+        if _FIND_PID_SUFFIX_REGEX.search(path) is not None
+    )
+
+
+def parse_sanitizer_log_file(
+        path: str, suppressions: Optional[Suppressions] = None,
+        key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+) -> Tuple[SanitizerSection, ...]:
+    """Return the sanitizer sections in a sanitizer log file.
+
+    Unlike SanitizerLogParser.parse_line(), lines are not matched against prefixes of sections and
+    sections are not interleaved, so each line that is not in a section costs one substring search.
+    """
+    return tuple(
+        SanitizerSection(lines=lines, suppressions=suppressions, key_finder=key_finder)
+        for lines in _get_sanitizer_log_file_sections(path, header_only=False)
+    )
+
+
+def _parse_sanitizer_log_file_deferring_unsymbolized(
+        path: str, suppressions: Optional[Suppressions] = None,
+        key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+) -> Tuple[Union[SanitizerSection, Tuple[str, ...]], ...]:
+    # Sections with unsymbolized frames are returned as their lines, to be set aside by the parser.
+    return tuple(
+        lines if has_unsymbolized_frames(lines) else
+        SanitizerSection(lines=lines, suppressions=suppressions, key_finder=key_finder)
+        for lines in _get_sanitizer_log_file_sections(path, header_only=False)
+    )
+
+
+def count_sanitizer_log_file(path: str) -> Tuple[str, ...]:
+    """Return the error name of each sanitizer section in a sanitizer log file.
+
+    Only the header line of each section is kept, and sections are not parsed, as when the sections
+    of a package are only counted.
+    """
+    return tuple(
+        find_error_name(lines[0])
+        for lines in _get_sanitizer_log_file_sections(path, header_only=True)
+    )
+
+
+def _get_sanitizer_log_file_sections(
+        path: str, *, header_only: bool
+) -> Iterator[Tuple[str, ...]]:
+    lines: Optional[List[str]] = None
+    with open(path, 'r', errors='replace') as log_f_in:
+        for line in log_f_in:
+            line = line.rstrip()
+            if 'Sanitizer:' in line and _FIND_SECTION_START_LINE_REGEX.match(line) is not None:
+                # A section that did not end was cut short, such as by the process being killed.
+                lines = [line]
+                continue
+
+            if lines is None:
+                continue
+
+            if not header_only:
+                lines.append(line)
+            if line.startswith('SUMMARY: ') and \
+                    _FIND_SECTION_END_LINE_REGEX.match(line) is not None:
+                yield tuple(lines)
+                lines = None
+
+
+class SanitizerLogFilePool:
+    """Pool of processes that parse the sanitizer log files of any number of packages.
+
+    The processes are started when the files of a package are first parsed in parallel and live
+    until the pool is closed, so an invocation with many packages pays their startup (including
+    the imports of each worker) once. They are started with the forkserver (or spawn) method
+    rather than forked, since the parser may be used from a multithreaded process such as colcon.
+    Files of a package are parsed serially if there is only one, max_workers is 1, or they hold
+    fewer than min_parallel_size bytes in total, since parsing them is then cheaper than handing
+    them to the workers.
+    """
+
+    def __init__(
+            self, *, max_workers: Optional[int] = None,
+            min_parallel_size: int = _MIN_PARALLEL_SIZE,
+    ) -> None:
+        """Initialize the pool without starting any processes."""
+        self._max_workers = max_workers
+        self._min_parallel_size = min_parallel_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> 'SanitizerLogFilePool':
+        """Use the pool as a context manager that shuts down its processes on exit."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Shut down the processes of the pool."""
+        self.close()
+
+    def map_paths(self, function: Callable[[str], _Result], paths: Sequence[str]) -> List[_Result]:
+        """Apply function to each path, in parallel processes if worthwhile."""
+        if len(paths) <= 1 or self._max_workers == 1 or \
+                sum(os.path.getsize(path) for path in paths) < self._min_parallel_size:
+            return _map_serially(function, paths)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers, mp_context=multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                    else 'spawn'
+                ),
+            )
+        return list(self._executor.map(function, paths))
+
+    def close(self) -> None:
+        """Shut down the processes of the pool, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def add_sanitizer_log_files(
+        log_parser: SanitizerLogParser, package: str, paths: Sequence[str], *,
+        pool: Optional[SanitizerLogFilePool] = None,
+) -> None:
+    """Parse sanitizer log files of a package and add their sections to the parser.
+
+    Files are parsed in the processes of pool if given, which is meant to be shared by all packages
+    of an invocation, and serially otherwise. Sections are added in the order of paths, so the
+    report does not depend on which file is parsed first. If the sections of the package are only
+    counted, workers only return the error name of each section. If the parser defers sections
+    with unsymbolized frames, such sections are set aside in the parser unparsed.
+    """
+    map_paths = pool.map_paths if pool is not None else _map_serially
+    log_parser.set_package(package)
+    if log_parser.counting_only:
+        error_names_by_path = map_paths(count_sanitizer_log_file, paths)
+        for error_names in error_names_by_path:
+            for error_name in error_names:
+                log_parser.count_section(error_name)
+        return
+
+    sections_by_path = map_paths(
+        functools.partial(
+            _parse_sanitizer_log_file_deferring_unsymbolized
+            if log_parser.defer_unsymbolized else parse_sanitizer_log_file,
+            suppressions=log_parser.suppressions, key_finder=log_parser.key_finder,
+        ),
+        paths,
+    )
+    for sections in sections_by_path:
+        for section in sections:
+            if isinstance(section, SanitizerSection):
+                log_parser.add_section(section)
+            else:
+                log_parser.defer_section(section)
+
+
+def _map_serially(function: Callable[[str], _Result], paths: Sequence[str]) -> List[_Result]:
+    return [function(path) for path in paths]
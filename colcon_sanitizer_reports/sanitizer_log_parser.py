@@ -14,14 +14,36 @@
 
 from collections import defaultdict
 import csv
+import hashlib
 from io import StringIO
+import json
 import re
-from typing import Dict, List, NamedTuple, Pattern
+import time
+from typing import (
+    Collection, Dict, IO, Iterator, List, Mapping, NamedTuple, Optional, Pattern, Sequence, Tuple
+)
 
-from colcon_sanitizer_reports._sanitizer_section import SanitizerSection
+from colcon_sanitizer_reports._sanitizer_section import find_error_name, SanitizerSection
 from colcon_sanitizer_reports._sanitizer_section_part_stack_trace import (
     SanitizerSectionPartStackTrace
 )
+from colcon_sanitizer_reports.parse_budget import (
+    COUNT_ONLY_REASON, CountedSections, MEMORY_BUDGET_REASON, ParseBudget, TIME_BUDGET_REASON
+)
+from colcon_sanitizer_reports.report_selection import (
+    ReportSelection, ReportSelectionResult, select_report
+)
+from colcon_sanitizer_reports.sample_stack_traces import (
+    DEFAULT_SAMPLE_STACK_TRACE_FORMAT, SampleStackTraceFormat
+)
+from colcon_sanitizer_reports.stack_trace_clustering import StackTraceClusters
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, parse_stack_trace_frame, StackTraceFrame, StackTraceKeyFinder
+)
+from colcon_sanitizer_reports.suppressions import Suppression, Suppressions
+from colcon_sanitizer_reports.symbolization import (
+    has_unsymbolized_frames, SymbolCache, symbolize_stack_traces, Symbolizer
+)
 
 # The start line of a section can be found with the following regex. Additionally, any prefix that
 # is prepended by the logging system can be extracted and be used to lstrip following section lines.
@@ -33,6 +55,9 @@ _FIND_SECTION_START_LINE_REGEX = \
 # section to which the end line belongs.
 _FIND_SECTION_END_LINE_REGEX = re.compile(r'^(?P<prefix>.*)(SUMMARY: .*Sanitizer: .*)$')
 
+# Newline-delimited json records are buffered and written in chunks of about this many characters.
+_NDJSON_BUFFER_SIZE = 1 << 20
+
 
 class SanitizerLogParserOutputPrimaryKey(NamedTuple):
     """SanitizerLogParser report output is keyed on these fields.
@@ -54,12 +79,23 @@ class SanitizerLogParserOutputPrimaryKey(NamedTuple):
         have multiple significant stack traces, resulting in multiple keys and thus, multiple
         SanitizerLogParserOutputPrimaryKeys. See SanitizerSectionPart and
         SanitizerSectionPartStackTrace for more details.
+
+    The fingerprint property is a stable 64-bit hash of the fields. It is the same across runs,
+    processes, and platforms, so fingerprints can be stored and compared instead of the long stack
+    trace keys.
     """
 
     package: str
     error_name: str
     stack_trace_key: str
 
+    @property
+    def fingerprint(self) -> int:
+        """Stable 64-bit fingerprint of the output primary key fields."""
+        return int.from_bytes(
+            hashlib.blake2b('\0'.join(self).encode(), digest_size=8).digest(), 'little'
+        )
+
 
 class SanitizerLogParser:
     """Parses sanitizer error and warning sections from a log and generates a summary report.
@@ -83,16 +119,72 @@ class SanitizerLogParser:
         The count of times the fields from the primary key occur while parsing the log.
 
     sample_stack_trace:
-        The full output of one of the stack traces that matched the primary key.
+        The full output of one of the stack traces that matched the primary key, as formatted by
+        the sample_stack_trace_format the parser is initialized with. See SampleStackTraceFormat
+        for capping the frames of sample stack traces, or replacing them with references to a
+        StackTraceStore.
+
+    cluster_id:
+        Only if the parser is initialized with cluster_stack_traces. Output primary keys with
+        similar stack traces share a cluster id, even if their stack trace keys differ. See
+        StackTraceClusters for more details.
+
+    If the parser is initialized with a report_selection, only the selected output primary keys are
+    included in the CSV and XML output. The omitted output primary keys of each package are
+    summarized in a remainder line with an empty stack_trace_key, whose count is the total count of
+    the omitted output primary keys. See ReportSelection for more details.
+
+    If the parser is initialized with suppressions, stack traces that match a suppression are
+    dropped while sections are parsed and are not part of the CSV or XML output. The number of
+    stack traces each suppression dropped in each package is reported by get_suppressions_csv(),
+    with columns "package,error_name,pattern,count".
+
+    The packages that hit a stack trace key or an error name, and how many times each package hit
+    it, are indexed as stack traces are added, so get_count_by_package_of_stack_trace_key() and
+    get_count_by_package_of_error_name() do not visit the rest of the report. get_key_csv() returns
+    a view of the report aggregated across packages, with columns
+    "error_name,stack_trace_key,count,package_count,packages,sample_stack_trace" and one line for
+    each error name and stack trace key, most frequent first. Packages are separated by ";".
+
+    Stack trace keys are found with the key_finder the parser is initialized with. By default, the
+    key of a stack trace is its first frame in code under /ros2. See StackTraceKeyFinder for more
+    details.
+
+    If the parser is initialized with count_only, sanitizer sections are counted by package and
+    error name from their header lines, and their parts and stack traces are not built. If it is
+    initialized with a parse_budget, a package that exceeds the budget falls back to counting its
+    remaining sections. Counted sections are reported in a line with an empty stack_trace_key for
+    each package and error name, whose count is the number of sections and whose sample_stack_trace
+    is a description of why they were counted. See CountedSections for more details.
+
+    If the parser is initialized with defer_unsymbolized, sections with frames that the sanitizer
+    did not symbolize, such as "#0 0x7f2a (/opt/lib/libfoo.so+0x1234)", are set aside instead of
+    being parsed, since their stack trace keys would be meaningless. symbolize() resolves the frames
+    of all the set aside sections in one batch and adds them to the report of their packages, so it
+    must be called before the output is generated.
+
+    JSON output is an object with a "findings" list holding an object with the CSV columns of each
+    output primary key, where sample_stack_trace is a list of lines, a "remainders" list holding
+    the fields of each ReportRemainder, and a "counted_sections" list holding the fields of each
+    CountedSections.
 
     XML output is a xUnit-style Jenkins compatible string. Packages present in
     SanitizerLogParserOutputPrimaryKey are `testcases` in the xml string, and each sanitizer
-    warning and error is an `error`. Stack trace key and error count are attributes of the error.
+    warning and error is an `error`. Stack trace key, error count, and cluster id (if any) are
+    attributes of the error. Omitted output primary keys of a package are summarized in a `skipped`
+    element of its testcase. Counted sections are errors with a `counted_only` attribute.
     """
 
-    from colcon_sanitizer_reports.xml_output_generator import XmlOutputGenerator
-
-    def __init__(self) -> None:
+    def __init__(
+            self, *, cluster_stack_traces: bool = False,
+            report_selection: Optional[ReportSelection] = None,
+            suppressions: Optional[Suppressions] = None,
+            key_finder: StackTraceKeyFinder = DEFAULT_STACK_TRACE_KEY_FINDER,
+            sample_stack_trace_format: SampleStackTraceFormat = DEFAULT_SAMPLE_STACK_TRACE_FORMAT,
+            count_only: bool = False,
+            parse_budget: Optional[ParseBudget] = None,
+            defer_unsymbolized: bool = False,
+    ) -> None:
         """Initialize sanitizer report sections."""
         # Holds count of errors seen for each output key.
         self._count_by_output_primary_key: Dict[SanitizerLogParserOutputPrimaryKey, int] = (
@@ -103,37 +195,497 @@ class SanitizerLogParser:
             Dict[SanitizerLogParserOutputPrimaryKey, SanitizerSectionPartStackTrace]
         ) = {}
 
+        # Holds output keys of each package in the order they were first seen, so that the report of
+        # a single package can be generated without visiting the output keys of other packages.
+        self._output_primary_keys_by_package: (
+            Dict[str, List[SanitizerLogParserOutputPrimaryKey]]
+        ) = defaultdict(list)
+
+        # Secondary indexes of the count of errors seen in each package for each stack trace key and
+        # for each error name, and the output keys of each stack trace key in the order they were
+        # first seen, so that a key can be followed across packages without visiting the report.
+        self._count_by_package_by_stack_trace_key: Dict[str, Dict[str, int]] = (
+            defaultdict(lambda: defaultdict(int))
+        )
+        self._count_by_package_by_error_name: Dict[str, Dict[str, int]] = (
+            defaultdict(lambda: defaultdict(int))
+        )
+        self._output_primary_keys_by_stack_trace_key: (
+            Dict[str, List[SanitizerLogParserOutputPrimaryKey]]
+        ) = defaultdict(list)
+
+        # Clusters of similar stack traces of output keys, if clustering is enabled.
+        self._stack_trace_clusters: (
+            Optional[StackTraceClusters[SanitizerLogParserOutputPrimaryKey]]
+        ) = StackTraceClusters() if cluster_stack_traces else None
+
+        # Limits on the output primary keys included in the csv and xml output, if any.
+        self._report_selection = report_selection
+
+        # Known issues whose stack traces are dropped, if any, and the count of stack traces each
+        # one dropped in each package.
+        self._suppressions = suppressions
+        self._count_by_package_and_suppression: Dict[Tuple[str, Suppression], int] = (
+            defaultdict(int)
+        )
+
+        # Finds the stack trace key of each relevant stack trace.
+        self._key_finder = key_finder
+
+        # Formats the sample stack traces embedded in the output.
+        self._sample_stack_trace_format = sample_stack_trace_format
+
+        # Count of the sections of each package and error name that were counted without parsing
+        # them, why each package's sections are counted, the time spent on parsing the lines of
+        # each package so far, and the size of the lines of each package that are buffered until
+        # their section ends.
+        self._count_only = count_only
+        self._parse_budget = parse_budget
+        self._counted_section_count_by_error_name_by_package: Dict[str, Dict[str, int]] = (
+            defaultdict(lambda: defaultdict(int))
+        )
+        self._counting_only_reason_by_package: Dict[str, str] = {}
+        self._seconds_by_package: Dict[str, float] = defaultdict(float)
+        self._buffered_bytes_by_package: Dict[str, int] = defaultdict(int)
+
+        # Package and lines of each section with unsymbolized frames that is set aside until it is
+        # symbolized, if deferring them.
+        self._defer_unsymbolized = defer_unsymbolized
+        self._unsymbolized_sections: List[Tuple[str, Tuple[str, ...]]] = []
+
+        # Incremented whenever a stack trace is added or suppressed, so that output generated from
+        # the parser can be cached until the parser changes.
+        self._generation: int = 0
+
         # Current package output that is being parsed.
         self._package: str = ''
 
-        # We keep lines for partially-gathered sanitizer sections here. Incoming lines that match
-        # one of the find_line_regexes is appended to the associated list of lines.
-        self._lines_by_find_line_regex: Dict[Pattern, List[str]] = {}
+        # We keep lines for partially-gathered sanitizer sections of each package here. Incoming
+        # lines that match one of the find_line_regexes of the current package are appended to the
+        # associated list of lines. Keeping them per package allows output of many packages to be
+        # parsed interleaved, switching between packages with set_package().
+        self._lines_by_find_line_regex_by_package: Dict[str, Dict[Pattern, List[str]]] = (
+            defaultdict(dict)
+        )
+        self._lines_by_find_line_regex: Dict[Pattern, List[str]] = (
+            self._lines_by_find_line_regex_by_package[self._package]
+        )
+        self._counting_only_reason: Optional[str] = self._get_counting_only_reason(self._package)
+
+    @property
+    def report_selection(self) -> Optional[ReportSelection]:
+        """Return the limits on the output primary keys included in the csv and xml output."""
+        return self._report_selection
+
+    @property
+    def cluster_stack_traces(self) -> bool:
+        """Return if output primary keys are clustered by the similarity of their stack traces."""
+        return self._stack_trace_clusters is not None
+
+    @property
+    def suppressions(self) -> Optional[Suppressions]:
+        """Return the known issues whose stack traces are dropped, if any."""
+        return self._suppressions
+
+    @property
+    def key_finder(self) -> StackTraceKeyFinder:
+        """Return the finder of the key of each relevant stack trace."""
+        return self._key_finder
+
+    @property
+    def sample_stack_trace_format(self) -> SampleStackTraceFormat:
+        """Return the format of the sample stack traces embedded in the output."""
+        return self._sample_stack_trace_format
+
+    @property
+    def parse_budget(self) -> Optional[ParseBudget]:
+        """Return the limits on the resources spent on fully parsing each package, if any."""
+        return self._parse_budget
+
+    @property
+    def defer_unsymbolized(self) -> bool:
+        """Return if sections with unsymbolized frames are set aside until they are symbolized."""
+        return self._defer_unsymbolized
+
+    @property
+    def counting_only(self) -> bool:
+        """Return if the sections of the current package are only counted, not parsed."""
+        return self._counting_only_reason is not None
+
+    @property
+    def generation(self) -> int:
+        """Return a number that changes whenever the parsed errors/warnings change."""
+        return self._generation
+
+    def get_count_by_output_primary_key(
+            self, *, package: Optional[str] = None
+    ) -> Mapping[SanitizerLogParserOutputPrimaryKey, int]:
+        """Return count of errors seen for each output primary key, optionally of one package."""
+        if package is None:
+            return self._count_by_output_primary_key
+
+        return {
+            output_primary_key: self._count_by_output_primary_key[output_primary_key]
+            for output_primary_key in self._get_output_primary_keys(package)
+        }
+
+    def get_counted_sections(
+            self, *, package: Optional[str] = None
+    ) -> Tuple[CountedSections, ...]:
+        """Return the sections that were counted without parsing them, optionally of a package."""
+        return tuple(
+            CountedSections(
+                package=counted_package, error_name=error_name, section_count=count,
+                reason=self._get_counting_only_reason(counted_package) or '',
+            )
+            for counted_package, count_by_error_name in
+            self._counted_section_count_by_error_name_by_package.items()
+            if package is None or counted_package == package
+            for error_name, count in count_by_error_name.items()
+        )
+
+    def get_unsymbolized_packages(self) -> Tuple[str, ...]:
+        """Return the packages with sections set aside until they are symbolized, in order."""
+        return tuple(dict.fromkeys(package for package, _ in self._unsymbolized_sections))
 
-    def get_csv(self) -> str:
-        """Return a csv representation of reported error/warnings."""
+    def get_count_by_package_of_stack_trace_key(self, stack_trace_key: str) -> Mapping[str, int]:
+        """Return count of errors seen in each package that hit a stack trace key."""
+        return self._count_by_package_by_stack_trace_key.get(stack_trace_key, {})
+
+    def get_count_by_package_of_error_name(self, error_name: str) -> Mapping[str, int]:
+        """Return count of errors seen in each package that hit an error name."""
+        return self._count_by_package_by_error_name.get(error_name, {})
+
+    def get_csv(self, *, package: Optional[str] = None) -> str:
+        """Return a csv representation of reported error/warnings, optionally of one package."""
         csv_f_out = StringIO()
+        self.write_csv(csv_f_out, package=package)
+        return csv_f_out.getvalue()
+
+    def write_csv(self, csv_f_out: IO[str], *, package: Optional[str] = None) -> None:
+        """Write a csv representation of reported error/warnings to a file, row by row."""
         writer = csv.writer(csv_f_out)
         writer.writerow([
-            *SanitizerLogParserOutputPrimaryKey._fields, 'count', 'sample_stack_trace'
+            *SanitizerLogParserOutputPrimaryKey._fields, 'count', 'sample_stack_trace',
+            *(('cluster_id',) if self._stack_trace_clusters is not None else ()),
         ])
-        for output_primary_key, count in self._count_by_output_primary_key.items():
+        report = self._get_report(package)
+        for output_primary_key in report.output_primary_keys:
+            count = self._count_by_output_primary_key[output_primary_key]
             sample_stack_trace = self._sample_stack_trace_by_output_primary_key[output_primary_key]
-            writer.writerow([*output_primary_key, count, '\n'.join(sample_stack_trace.lines)])
+            writer.writerow([
+                *output_primary_key, count,
+                self._sample_stack_trace_format.get_text(sample_stack_trace.lines),
+                *((self._get_cluster_id(output_primary_key),)
+                  if self._stack_trace_clusters is not None else ()),
+            ])
+        for remainder in report.remainders:
+            writer.writerow([
+                remainder.package, remainder.error_name, '', remainder.total_count,
+                remainder.description,
+                *(('',) if self._stack_trace_clusters is not None else ()),
+            ])
+        for counted_sections in self.get_counted_sections(package=package):
+            writer.writerow([
+                counted_sections.package, counted_sections.error_name, '',
+                counted_sections.section_count, counted_sections.description,
+                *(('',) if self._stack_trace_clusters is not None else ()),
+            ])
+
+    def get_json(self, *, package: Optional[str] = None) -> str:
+        """Return a json representation of reported errors/warnings, optionally of one package."""
+        report = self._get_report(package)
+        findings = []
+        for output_primary_key in report.output_primary_keys:
+            finding = output_primary_key._asdict()
+            finding['count'] = self._count_by_output_primary_key[output_primary_key]
+            finding['sample_stack_trace'] = self._sample_stack_trace_format.get_text(
+                self._sample_stack_trace_by_output_primary_key[output_primary_key].lines
+            ).split('\n')
+            if self._stack_trace_clusters is not None:
+                finding['cluster_id'] = self._get_cluster_id(output_primary_key)
+            findings.append(finding)
+
+        return json.dumps({
+            'findings': findings,
+            'remainders': [remainder._asdict() for remainder in report.remainders],
+            'counted_sections': [
+                counted_sections._asdict()
+                for counted_sections in self.get_counted_sections(package=package)
+            ],
+        })
+
+    def get_ndjson(
+            self, *, package: Optional[str] = None, run_metadata: Optional[Mapping[str, str]] = None
+    ) -> str:
+        """Return a newline-delimited json representation of reported errors/warnings."""
+        ndjson_f_out = StringIO()
+        self.write_ndjson(ndjson_f_out, package=package, run_metadata=run_metadata)
+        return ndjson_f_out.getvalue()
+
+    def write_ndjson(
+            self, ndjson_f_out: IO[str], *, package: Optional[str] = None,
+            run_metadata: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """Write a newline-delimited json representation of reported errors/warnings to a file.
+
+        Each line is a self-contained json record, so the output can be split on line boundaries and
+        loaded in parallel. There is a record of kind "finding" for each output primary key, with
+        its count, the fingerprint of the output primary key, and the frames of its sample stack
+        trace (the first max_frames frames, if the sample stack trace format has a maximum, out of
+        frame_count) as objects with the number of each frame as "index" and its other parts.
+        Remainders and counted sections are records of kind "remainder" and "counted" with a
+        description and no frames. Each record holds run_metadata, if given, as "run".
+
+        Records are buffered and written in chunks of about _NDJSON_BUFFER_SIZE characters.
+        """
+        encoder = json.JSONEncoder(separators=(',', ':'))
+        buffer: List[str] = []
+        buffer_size = 0
+        for record in self._get_ndjson_records(package, run_metadata):
+            line = encoder.encode(record) + '\n'
+            buffer.append(line)
+            buffer_size += len(line)
+            if buffer_size >= _NDJSON_BUFFER_SIZE:
+                ndjson_f_out.write(''.join(buffer))
+                buffer.clear()
+                buffer_size = 0
+
+        if buffer:
+            ndjson_f_out.write(''.join(buffer))
+
+    def get_key_csv(self) -> str:
+        """Return a csv representation of reported errors/warnings aggregated across packages."""
+        csv_f_out = StringIO()
+        self.write_key_csv(csv_f_out)
+        return csv_f_out.getvalue()
+
+    def write_key_csv(self, csv_f_out: IO[str]) -> None:
+        """Write a csv representation of errors/warnings aggregated across packages to a file."""
+        # Output keys of each error name and stack trace key, in the order they were first seen.
+        output_primary_keys_by_error_name_and_stack_trace_key: (
+            Dict[Tuple[str, str], List[SanitizerLogParserOutputPrimaryKey]]
+        ) = defaultdict(list)
+        for output_primary_keys in self._output_primary_keys_by_stack_trace_key.values():
+            for output_primary_key in output_primary_keys:
+                output_primary_keys_by_error_name_and_stack_trace_key[
+                    (output_primary_key.error_name, output_primary_key.stack_trace_key)
+                ].append(output_primary_key)
+
+        rows = []
+        for (error_name, stack_trace_key), output_primary_keys in \
+                output_primary_keys_by_error_name_and_stack_trace_key.items():
+            rows.append((
+                error_name, stack_trace_key,
+                sum(
+                    self._count_by_output_primary_key[output_primary_key]
+                    for output_primary_key in output_primary_keys
+                ),
+                len(output_primary_keys),
+                ';'.join(output_primary_key.package for output_primary_key in output_primary_keys),
+                self._sample_stack_trace_format.get_text(
+                    self._sample_stack_trace_by_output_primary_key[output_primary_keys[0]].lines
+                ),
+            ))
+        rows.sort(key=lambda row: (-row[2], row[0], row[1]))
+
+        writer = csv.writer(csv_f_out)
+        writer.writerow([
+            'error_name', 'stack_trace_key', 'count', 'package_count', 'packages',
+            'sample_stack_trace',
+        ])
+        writer.writerows(rows)
+
+    def get_suppressions_csv(self, *, package: Optional[str] = None) -> str:
+        """Return a csv representation of suppressed stack trace counts, optionally of a package."""
+        csv_f_out = StringIO()
+        writer = csv.writer(csv_f_out)
+        writer.writerow(['package', *Suppression._fields, 'count'])
+        for (suppression_package, suppression), count in \
+                self._count_by_package_and_suppression.items():
+            if package is None or suppression_package == package:
+                writer.writerow([suppression_package, *suppression, count])
 
         return csv_f_out.getvalue()
 
-    def get_xml(self) -> str:
-        """Return a xml representation of reported errors/warnings."""
-        return self.XmlOutputGenerator(self._count_by_output_primary_key,
-                                       self._sample_stack_trace_by_output_primary_key).xml_string
+    def get_xml(self, *, package: Optional[str] = None) -> str:
+        """Return a xml representation of reported errors/warnings, optionally of one package."""
+        # XmlOutputGenerator and its xml dependencies are only imported when xml output is needed.
+        from colcon_sanitizer_reports.xml_output_generator import XmlOutputGenerator
+
+        report = self._get_report(package)
+        cluster_id_by_output_primary_key = None
+        if self._stack_trace_clusters is not None:
+            cluster_id_by_output_primary_key = {
+                output_primary_key: self._get_cluster_id(output_primary_key)
+                for output_primary_key in report.output_primary_keys
+            }
+
+        if package is None and self._report_selection is None:
+            return XmlOutputGenerator(
+                self._count_by_output_primary_key, self._sample_stack_trace_by_output_primary_key,
+                cluster_id_by_output_primary_key,
+                format_stack_trace=self._sample_stack_trace_format.get_text,
+                counted_sections=self.get_counted_sections(),
+            ).xml_string
+
+        return XmlOutputGenerator(
+            {
+                output_primary_key: self._count_by_output_primary_key[output_primary_key]
+                for output_primary_key in report.output_primary_keys
+            }, {
+                output_primary_key: self._sample_stack_trace_by_output_primary_key[
+                    output_primary_key
+                ]
+                for output_primary_key in report.output_primary_keys
+            },
+            cluster_id_by_output_primary_key,
+            report.remainders,
+            format_stack_trace=self._sample_stack_trace_format.get_text,
+            counted_sections=self.get_counted_sections(package=package),
+        ).xml_string
+
+    def _get_ndjson_records(
+            self, package: Optional[str], run_metadata: Optional[Mapping[str, str]]
+    ) -> Iterator[Dict[str, object]]:
+        max_frames = self._sample_stack_trace_format.max_frames
+        report = self._get_report(package)
+        for output_primary_key in report.output_primary_keys:
+            lines = self._sample_stack_trace_by_output_primary_key[output_primary_key].lines
+            frames = [
+                frame for frame in map(parse_stack_trace_frame, lines[:max_frames])
+                if frame is not None
+            ]
+            record = _get_ndjson_record(
+                'finding', output_primary_key,
+                self._count_by_output_primary_key[output_primary_key], frames,
+                frame_count=len(lines), run_metadata=run_metadata,
+            )
+            if self._stack_trace_clusters is not None:
+                record['cluster_id'] = self._get_cluster_id(output_primary_key)
+            yield record
+
+        # Remainders and counted sections have no stack trace key, like their csv lines.
+        for remainder in report.remainders:
+            yield _get_ndjson_record(
+                'remainder',
+                SanitizerLogParserOutputPrimaryKey(
+                    package=remainder.package, error_name=remainder.error_name, stack_trace_key='',
+                ),
+                remainder.total_count, (), description=remainder.description,
+                run_metadata=run_metadata,
+            )
+        for counted_sections in self.get_counted_sections(package=package):
+            yield _get_ndjson_record(
+                'counted',
+                SanitizerLogParserOutputPrimaryKey(
+                    package=counted_sections.package, error_name=counted_sections.error_name,
+                    stack_trace_key='',
+                ),
+                counted_sections.section_count, (), description=counted_sections.description,
+                run_metadata=run_metadata,
+            )
+
+    def _get_cluster_id(self, output_primary_key: SanitizerLogParserOutputPrimaryKey) -> str:
+        assert self._stack_trace_clusters is not None
+        # Clusters are identified by the fingerprint of their representative output primary key.
+        return '{:016x}'.format(
+            self._stack_trace_clusters.get_cluster_id(output_primary_key).fingerprint
+        )
+
+    def _get_output_primary_keys(
+            self, package: Optional[str]
+    ) -> Collection[SanitizerLogParserOutputPrimaryKey]:
+        if package is None:
+            return self._count_by_output_primary_key.keys()
+
+        return self._output_primary_keys_by_package.get(package, ())
+
+    def _get_report(self, package: Optional[str]) -> ReportSelectionResult:
+        output_primary_keys = self._get_output_primary_keys(package)
+        if self._report_selection is None:
+            return ReportSelectionResult(output_primary_keys=output_primary_keys, remainders=())
+
+        return select_report(
+            (
+                (output_primary_key, self._count_by_output_primary_key[output_primary_key])
+                for output_primary_key in output_primary_keys
+            ),
+            self._report_selection,
+        )
 
     def set_package(self, package: str) -> None:
         """Set the package name to which each sanitizer error/warning belongs."""
         self._package = package
+        self._lines_by_find_line_regex = self._lines_by_find_line_regex_by_package[package]
+        self._counting_only_reason = self._get_counting_only_reason(package)
+
+    def reset_package(self, package: str) -> None:
+        """Forget the errors/warnings of a package, such as before parsing its rewritten log.
+
+        The counts, sample stack traces, suppression counts and counted sections of the package are
+        dropped, along with its partially-gathered sections, the sections set aside for
+        symbolization and the resources spent on parsing it. The stack traces of the package stay
+        in the clusters, if clustering is enabled, so clusters they merged stay merged.
+        """
+        for output_primary_key in self._output_primary_keys_by_package.pop(package, ()):
+            del self._count_by_output_primary_key[output_primary_key]
+            del self._sample_stack_trace_by_output_primary_key[output_primary_key]
+
+            stack_trace_key = output_primary_key.stack_trace_key
+            output_primary_keys = self._output_primary_keys_by_stack_trace_key[stack_trace_key]
+            output_primary_keys.remove(output_primary_key)
+            if not output_primary_keys:
+                del self._output_primary_keys_by_stack_trace_key[stack_trace_key]
+
+            count_by_package = self._count_by_package_by_stack_trace_key.get(stack_trace_key, {})
+            count_by_package.pop(package, None)
+            if not count_by_package:
+                self._count_by_package_by_stack_trace_key.pop(stack_trace_key, None)
+
+        for error_name, count_by_package in list(self._count_by_package_by_error_name.items()):
+            count_by_package.pop(package, None)
+            if not count_by_package:
+                del self._count_by_package_by_error_name[error_name]
+
+        for suppression_package, suppression in list(self._count_by_package_and_suppression):
+            if suppression_package == package:
+                del self._count_by_package_and_suppression[(suppression_package, suppression)]
+
+        self._counted_section_count_by_error_name_by_package.pop(package, None)
+        self._counting_only_reason_by_package.pop(package, None)
+        self._seconds_by_package.pop(package, None)
+        self._buffered_bytes_by_package.pop(package, None)
+        self._unsymbolized_sections = [
+            (section_package, lines) for section_package, lines in self._unsymbolized_sections
+            if section_package != package
+        ]
+
+        # The lines of the current package are referenced by _lines_by_find_line_regex, so they are
+        # cleared in place.
+        self._lines_by_find_line_regex_by_package[package].clear()
+        if package == self._package:
+            self._counting_only_reason = self._get_counting_only_reason(package)
+
+        self._generation += 1
 
     def parse_line(self, line: str) -> None:
         """Parse colcon test log file line by line and generate report of errors/warnings."""
+        if self._counting_only_reason is not None or self._parse_budget is None or \
+                self._parse_budget.max_seconds is None:
+            self._parse_line(line)
+            return
+
+        # The time budget covers all of the parsing of the package's lines, from matching them to
+        # sections to building the stack traces of the sections.
+        start_time = time.perf_counter()
+        self._parse_line(line)
+        self._seconds_by_package[self._package] += time.perf_counter() - start_time
+        if self._counting_only_reason is None and \
+                self._seconds_by_package[self._package] > self._parse_budget.max_seconds:
+            self._fall_back_to_counting_only(TIME_BUDGET_REASON)
+
+    def _parse_line(self, line: str) -> None:
         line = line.rstrip()
 
         # If we have a sanitizer section starting line, start gathering lines for it.
@@ -151,24 +703,142 @@ class SanitizerLogParser:
         for find_line_regex, lines in self._lines_by_find_line_regex.items():
             match = find_line_regex.match(line)
             if match is not None:
-                lines.append(match.groupdict()['line'])
-
-                # If this is the last line of a section, create the section and stop gathering lines
-                # for it.
+                # Sections that are only counted need nothing but their header line.
+                if self._counting_only_reason is None or not lines:
+                    section_line = match.groupdict()['line']
+                    lines.append(section_line)
+                    self._buffered_bytes_by_package[self._package] += len(section_line)
+                    if self._parse_budget is not None and \
+                            self._parse_budget.max_bytes is not None and \
+                            self._buffered_bytes_by_package[self._package] > \
+                            self._parse_budget.max_bytes:
+                        self._fall_back_to_counting_only(MEMORY_BUDGET_REASON)
+
+                # If this is the last line of a section, create or count the section and stop
+                # gathering lines for it.
                 match = _FIND_SECTION_END_LINE_REGEX.match(line)
                 if match is not None:
-                    section = SanitizerSection(lines=tuple(lines))
-                    for part in section.parts:
-                        for relevant_stack_trace in part.relevant_stack_traces:
-                            output_primary_key = SanitizerLogParserOutputPrimaryKey(
-                                package=self._package,
-                                error_name=section.error_name,
-                                stack_trace_key=relevant_stack_trace.key,
-                            )
-                            self._count_by_output_primary_key[output_primary_key] += 1
-                            self._sample_stack_trace_by_output_primary_key[output_primary_key] = (
-                                relevant_stack_trace
-                            )
+                    if self._defer_unsymbolized and self._counting_only_reason is None and \
+                            has_unsymbolized_frames(lines):
+                        self.defer_section(lines)
+                    elif self._counting_only_reason is None:
+                        self.add_section(SanitizerSection(
+                            lines=tuple(lines), suppressions=self._suppressions,
+                            key_finder=self._key_finder,
+                        ))
+                    else:
+                        self.count_section(find_error_name(lines[0]))
+                    self._buffered_bytes_by_package[self._package] -= sum(map(len, lines))
                     del self._lines_by_find_line_regex[find_line_regex]
 
                 break
+
+    def defer_section(self, lines: Sequence[str]) -> None:
+        """Set aside a sanitizer section of the current package until it is symbolized.
+
+        Sections with unsymbolized frames that are parsed from other sources than log lines, such
+        as the per-process log files of the sanitizers, are set aside with this method.
+        """
+        self._unsymbolized_sections.append((self._package, tuple(lines)))
+
+    def symbolize(self, symbolizer: Symbolizer, *, cache: Optional[SymbolCache] = None) -> None:
+        """Symbolize the sections that were set aside and add them to the report of their packages.
+
+        The frames of all the set aside sections are symbolized in one batch, using the cache of
+        symbols from earlier runs if given. See symbolize_stack_traces() for more details. If the
+        symbolizer fails, the error is raised and the sections stay set aside, so they can still be
+        added by symbolizing them with another symbolizer.
+        """
+        if not self._unsymbolized_sections:
+            return
+
+        unsymbolized_sections = self._unsymbolized_sections
+        symbolized_lines_of_sections = symbolize_stack_traces(
+            [lines for _, lines in unsymbolized_sections], symbolizer, cache=cache
+        )
+        self._unsymbolized_sections = []
+
+        package = self._package
+        for (section_package, _), lines in zip(unsymbolized_sections, symbolized_lines_of_sections):
+            self.set_package(section_package)
+            self.add_section(SanitizerSection(
+                lines=lines, suppressions=self._suppressions, key_finder=self._key_finder
+            ))
+        self.set_package(package)
+
+    def add_section(self, section: SanitizerSection) -> None:
+        """Add the errors/warnings of a sanitizer section that was parsed elsewhere.
+
+        Sections that are parsed from other sources than log lines, such as the per-process log
+        files of the sanitizers, are added to the report of the current package with this method.
+        If the sections of the current package are only counted, the section is counted.
+        """
+        if self._counting_only_reason is not None:
+            self.count_section(section.error_name)
+            return
+
+        for part in section.parts:
+            for relevant_stack_trace in part.relevant_stack_traces:
+                self._add_stack_trace(section.error_name, relevant_stack_trace)
+            for suppression in part.matched_suppressions:
+                self._count_by_package_and_suppression[(self._package, suppression)] += 1
+                self._generation += 1
+
+    def count_section(self, error_name: str) -> None:
+        """Count a sanitizer section of an error name of the current package without parsing it."""
+        self._counted_section_count_by_error_name_by_package[self._package][error_name] += 1
+        self._generation += 1
+
+    def _fall_back_to_counting_only(self, reason: str) -> None:
+        self._counting_only_reason_by_package[self._package] = reason
+        self._counting_only_reason = reason
+
+    def _get_counting_only_reason(self, package: str) -> Optional[str]:
+        if self._count_only:
+            return COUNT_ONLY_REASON
+
+        return self._counting_only_reason_by_package.get(package)
+
+    def _add_stack_trace(
+            self, error_name: str, stack_trace: SanitizerSectionPartStackTrace
+    ) -> None:
+        output_primary_key = SanitizerLogParserOutputPrimaryKey(
+            package=self._package, error_name=error_name, stack_trace_key=stack_trace.key,
+        )
+        if output_primary_key not in self._count_by_output_primary_key:
+            self._output_primary_keys_by_package[self._package].append(output_primary_key)
+            self._output_primary_keys_by_stack_trace_key[stack_trace.key].append(
+                output_primary_key
+            )
+            if self._stack_trace_clusters is not None:
+                self._stack_trace_clusters.add(output_primary_key, stack_trace.lines)
+
+        self._count_by_output_primary_key[output_primary_key] += 1
+        self._count_by_package_by_stack_trace_key[stack_trace.key][self._package] += 1
+        self._count_by_package_by_error_name[error_name][self._package] += 1
+        self._sample_stack_trace_by_output_primary_key[output_primary_key] = stack_trace
+        self._generation += 1
+
+
+def _get_ndjson_record(
+        kind: str, output_primary_key: SanitizerLogParserOutputPrimaryKey, count: int,
+        frames: Sequence[StackTraceFrame], *, frame_count: int = 0, description: str = '',
+        run_metadata: Optional[Mapping[str, str]] = None,
+) -> Dict[str, object]:
+    record: Dict[str, object] = {}
+    if run_metadata is not None:
+        record['run'] = dict(run_metadata)
+    record['kind'] = kind
+    record.update(output_primary_key._asdict())
+    record['fingerprint'] = '{:016x}'.format(output_primary_key.fingerprint)
+    record['count'] = count
+    record['frame_count'] = frame_count
+    record['frames'] = [
+        {
+            'index': frame.number, 'address': frame.address, 'function': frame.function,
+            'location': frame.location, 'module': frame.module, 'offset': frame.offset,
+        }
+        for frame in frames
+    ]
+    record['description'] = description
+    return record
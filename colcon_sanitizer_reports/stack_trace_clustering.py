@@ -0,0 +1,133 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import re
+from typing import Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+# Parts of a stack trace line that change between reproductions of the same call path, such as the
+# frame number, addresses, offsets and line numbers, can be found with the following pattern and are
+# removed to normalize frames.
+_FIND_FRAME_SUB_REGEX = re.compile(
+    r'^\s*#\d+\s+(0x[\da-f]+ in\s+|0x[\da-f]+\s+)?|0x[\da-f]+|:\d+', re.MULTILINE
+)
+
+_HASH_VALUE_SIZE = 8
+
+_Item = TypeVar('_Item', bound=Hashable)
+
+
+class StackTraceClusters(Generic[_Item]):
+    """Groups similar stack traces into clusters with MinHash and locality-sensitive hashing.
+
+    Stack traces of one bug reached through slightly different call paths have different keys, but
+    share most of their frames. Each stack trace added to the clusters is reduced to the set of its
+    normalized frames, and the set is summarized in a MinHash signature of bands * rows values.
+    Stack traces whose signatures are identical in any one band are put in the same cluster, so the
+    probability that two stack traces are clustered together rises steeply with the Jaccard
+    similarity of their frame sets, around a threshold of roughly (1 / bands) ** (1 / rows).
+
+    Stack traces are clustered incrementally as they are added, without comparing pairs of stack
+    traces, so adding a stack trace costs the same no matter how many were added before.
+
+    Items are identified by any hashable id, such as a SanitizerLogParserOutputPrimaryKey. The
+    cluster id of an item is the id of its cluster's representative item, which is the first item
+    added to the cluster. When two clusters are merged by a later item, the representative of the
+    older cluster is kept.
+    """
+
+    def __init__(self, *, bands: int = 8, rows: int = 4) -> None:
+        """Initialize empty clusters with the given LSH band configuration."""
+        self._bands = bands
+        self._rows = rows
+
+        # Each item's parent in a union-find forest of clusters. Roots are cluster representatives.
+        self._parent_by_item: Dict[_Item, _Item] = {}
+
+        # Order in which items were added, so that merged clusters keep the oldest representative.
+        self._order_by_item: Dict[_Item, int] = {}
+
+        # First item seen with each band of signature values.
+        self._item_by_band: Dict[Tuple[int, Tuple[Tuple[int, int], ...]], _Item] = {}
+
+    def add(self, item: _Item, stack_trace_lines: Iterable[str]) -> None:
+        """Add the stack trace of an item to the clusters."""
+        if item in self._parent_by_item:
+            return
+
+        self._parent_by_item[item] = item
+        self._order_by_item[item] = len(self._order_by_item)
+
+        signature = self._get_signature(stack_trace_lines)
+        for band_i in range(self._bands):
+            band = (band_i, signature[band_i * self._rows:(band_i + 1) * self._rows])
+            other_item = self._item_by_band.setdefault(band, item)
+            if other_item != item:
+                self._union(item, other_item)
+
+    def get_cluster_id(self, item: _Item) -> _Item:
+        """Return the id of the representative item of the item's cluster."""
+        root = item
+        while self._parent_by_item[root] != root:
+            root = self._parent_by_item[root]
+
+        # Compress the path so later lookups are shorter.
+        while self._parent_by_item[item] != root:
+            self._parent_by_item[item], item = root, self._parent_by_item[item]
+
+        return root
+
+    def _union(self, item: _Item, other_item: _Item) -> None:
+        root = self.get_cluster_id(item)
+        other_root = self.get_cluster_id(other_item)
+        if root == other_root:
+            return
+
+        if self._order_by_item[root] < self._order_by_item[other_root]:
+            self._parent_by_item[other_root] = root
+        else:
+            self._parent_by_item[root] = other_root
+
+    def _get_signature(self, stack_trace_lines: Iterable[str]) -> Tuple[Tuple[int, int], ...]:
+        frames = set(_FIND_FRAME_SUB_REGEX.sub('', '\n'.join(stack_trace_lines)).split('\n'))
+
+        # One permutation hashing: each frame is hashed once, the hash value selects one of the
+        # signature positions (bins) and the rest of the hash value competes for the minimum of that
+        # bin. This gives a MinHash signature at the cost of one hash per frame instead of one hash
+        # per frame and signature position.
+        bin_count = self._bands * self._rows
+        bins: List[Optional[int]] = [None] * bin_count
+        for frame in frames:
+            hash_value = int.from_bytes(
+                hashlib.blake2b(frame.encode(), digest_size=_HASH_VALUE_SIZE).digest(), 'little'
+            )
+            bin_i, value = hash_value % bin_count, hash_value // bin_count
+            bin_value = bins[bin_i]
+            if bin_value is None or value < bin_value:
+                bins[bin_i] = value
+
+        # Stack traces have fewer frames than bins, so empty bins are densified by borrowing the
+        # value of the nearest non-empty bin to their right, together with the distance to it.
+        signature: List[Tuple[int, int]] = [(0, 0)] * bin_count
+        next_value, distance = 0, 0
+        for i in reversed(range(2 * bin_count)):
+            bin_value = bins[i % bin_count]
+            if bin_value is not None:
+                next_value, distance = bin_value, 0
+            else:
+                distance += 1
+            if i < bin_count:
+                signature[i] = (next_value, distance)
+
+        return tuple(signature)
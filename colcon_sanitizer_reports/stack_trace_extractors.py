@@ -0,0 +1,180 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from colcon_core.logging import colcon_logger
+
+try:
+    from colcon_core.extension_point import load_extension_points
+except ImportError:
+    # colcon-core before 0.12 only has the deprecated entry point API.
+    from colcon_core.entry_point import load_entry_points as load_extension_points
+
+logger = colcon_logger.getChild(__name__)
+
+# Entry point group of StackTraceExtractors for additional error names.
+STACK_TRACE_EXTRACTOR_GROUP_NAME = 'colcon_sanitizer_reports.stack_trace_extractor'
+
+_FIND_STACK_TRACE_LINE_REGEX = re.compile(r'^\s+#\d+\s+.*$')
+
+
+class StackTraceExtractor:
+    """Extracts the relevant stack traces of a sanitizer section part of one error name.
+
+    Relevant stack traces are the stack traces that directly follow a line matching one of the
+    header patterns. See SanitizerSectionPart for examples. A section part has at most as many
+    relevant stack traces as there are header patterns, so a header pattern is listed once for each
+    relevant stack trace it introduces.
+
+    The header patterns are compiled into a single regex, so each line of a section part is matched
+    once no matter how many header patterns there are, and each section part is scanned once.
+
+    Extractors for error names that are not built in can be added by other packages with an entry
+    point in the STACK_TRACE_EXTRACTOR_GROUP_NAME group whose value is a StackTraceExtractor.
+    """
+
+    @property
+    def error_name(self) -> str:
+        """Error name of the sections that the extractor applies to."""
+        return self._error_name
+
+    @property
+    def header_patterns(self) -> Tuple[str, ...]:
+        """Patterns of the lines that precede relevant stack traces."""
+        return self._header_patterns
+
+    def __init__(self, error_name: str, header_patterns: Sequence[str]) -> None:
+        """Compile the header patterns of an error name's relevant stack traces."""
+        self._error_name = error_name
+        self._header_patterns = tuple(header_patterns)
+        self._find_header_regex = re.compile('|'.join(
+            '(?:{header_pattern})'.format(**locals())
+            for header_pattern in sorted(set(self._header_patterns))
+        ))
+
+    def extract(self, lines: Sequence[str]) -> List[Tuple[str, ...]]:
+        """Return the lines of each relevant stack trace in the lines of a section part."""
+        stack_traces: List[Tuple[str, ...]] = []
+        header_count = 0
+        stack_trace_lines: Optional[List[str]] = None
+        for line in lines:
+            if stack_trace_lines is not None:
+                if _FIND_STACK_TRACE_LINE_REGEX.match(line) is not None:
+                    stack_trace_lines.append(line)
+                    continue
+
+                # This line ends the stack trace. It may be the header of the next stack trace.
+                if stack_trace_lines:
+                    stack_traces.append(tuple(stack_trace_lines))
+                stack_trace_lines = None
+                if header_count == len(self._header_patterns):
+                    break
+
+            if self._find_header_regex.match(line) is not None:
+                header_count += 1
+                stack_trace_lines = []
+
+        if stack_trace_lines:
+            stack_traces.append(tuple(stack_trace_lines))
+
+        return stack_traces
+
+
+# Access and free of ASan memory errors are headed by lines like "READ of size 4 at 0x602 thread T0"
+# and "freed by thread T0 here:".
+_ACCESS_HEADER_PATTERN = r'^(READ|WRITE) of size \d+ at 0x[\da-f]+ thread .*$'
+_FREE_HEADER_PATTERN = r'^freed by thread .* here:$'
+
+_BUILTIN_STACK_TRACE_EXTRACTORS = (
+    # There are two relevant stack traces involved in a "data race" section part. Their headers
+    # match the following patterns.
+    StackTraceExtractor('data race', (
+        r'^\s+(Read|Write) of size \d+ at 0x[\da-f]+ .*$',
+        r'^\s+Previous (read|write) of size \d+ at 0x[\da-f]+ .*$',
+    )),
+    # There is one relevant stack trace in a "detected memory leaks" section part. Its header
+    # matches the following pattern.
+    StackTraceExtractor('detected memory leaks', (
+        r'^Direct leak of \d+ byte\(s\) in \d+ object\(s\) allocated from:$',
+    )),
+    # There are two relevant stack traces involved in one "lock-order-inversion" error section
+    # part. Both of their headers match the same pattern.
+    StackTraceExtractor('lock-order-inversion', (
+        r'^\s+Mutex M\d+ acquired here while holding mutex M\d+ in .*$',
+        r'^\s+Mutex M\d+ acquired here while holding mutex M\d+ in .*$',
+    )),
+    # The invalid access and the free are relevant in a "heap-use-after-free" section. They are in
+    # separate section parts, and the stack trace of the allocation is not relevant.
+    StackTraceExtractor('heap-use-after-free on address', (
+        _ACCESS_HEADER_PATTERN, _FREE_HEADER_PATTERN,
+    )),
+    # Only the invalid access is relevant in overflow and use after scope sections, not the stack
+    # traces of the allocation or of the creation of the thread.
+    *(
+        StackTraceExtractor(error_name, (_ACCESS_HEADER_PATTERN,))
+        for error_name in (
+            'global-buffer-overflow on address',
+            'heap-buffer-overflow on address',
+            'stack-buffer-overflow on address',
+            'stack-use-after-scope on address',
+        )
+    ),
+    # The stack trace of the signal handler directly follows the section header.
+    *(
+        StackTraceExtractor(error_name, (r'^.*ThreadSanitizer: .*$',))
+        for error_name in ('signal handler spoils errno', 'signal-unsafe call inside of a signal')
+    ),
+)
+
+# Remaining sanitizer errors have the only/most relevant stack trace first in a section part, so we
+# place no restrictions on the pattern of the header. We just find the first stack trace.
+_DEFAULT_STACK_TRACE_EXTRACTOR = StackTraceExtractor('', (r'^.*$',))
+
+# Extractors of each error name, loaded on first use.
+_stack_trace_extractor_by_error_name: Optional[Dict[str, StackTraceExtractor]] = None
+
+
+def get_stack_trace_extractor(error_name: str) -> StackTraceExtractor:
+    """Return the extractor of relevant stack traces of an error name."""
+    global _stack_trace_extractor_by_error_name
+    if _stack_trace_extractor_by_error_name is None:
+        _stack_trace_extractor_by_error_name = _load_stack_trace_extractors()
+
+    return _stack_trace_extractor_by_error_name.get(error_name, _DEFAULT_STACK_TRACE_EXTRACTOR)
+
+
+def _load_stack_trace_extractors() -> Dict[str, StackTraceExtractor]:
+    stack_trace_extractor_by_error_name = {
+        stack_trace_extractor.error_name: stack_trace_extractor
+        for stack_trace_extractor in _BUILTIN_STACK_TRACE_EXTRACTORS
+    }
+
+    # Extractors added by other packages take precedence over the built in extractors.
+    for name, stack_trace_extractor in sorted(
+            load_extension_points(STACK_TRACE_EXTRACTOR_GROUP_NAME).items()
+    ):
+        if not isinstance(stack_trace_extractor, StackTraceExtractor):
+            logger.warning(
+                "Ignoring entry point '{name}' which is not a StackTraceExtractor".format(
+                    **locals()
+                )
+            )
+            continue
+        stack_trace_extractor_by_error_name[stack_trace_extractor.error_name] = (
+            stack_trace_extractor
+        )
+
+    return stack_trace_extractor_by_error_name
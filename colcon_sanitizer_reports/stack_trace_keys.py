@@ -0,0 +1,144 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# Frames of code under these roots are own code, and are used for stack trace keys by default.
+DEFAULT_OWN_CODE_ROOTS = ('/ros2',)
+
+# Frames of multi-frame keys are joined with this separator.
+KEY_FRAME_SEPARATOR = ' | '
+
+# The text of a frame follows the frame number and the address (if it is followed by "in").
+_FIND_FRAME_REGEX = re.compile(
+    r'^\s+#(?P<number>\d+) ((?P<address>0x[\da-f]+) in|)\s*(?P<frame>.*?)\s*$'
+)
+
+# The text of a frame is the function, the source location and the module offset, any of which may
+# be missing or "<null>". Frames that the sanitizer did not symbolize are the address and the module
+# offset.
+_FIND_FRAME_PARTS_REGEX = re.compile(
+    r'^((?P<address>0x[\da-f]+)\s+(?=\())?(?P<function>.*?)\s*'
+    r'((?<!\S)(?P<location>\S+:\d+(:\d+)?|/\S+|<null>))?\s*'
+    r'(\((?P<module>[^()]+)\+(?P<offset>0x[\da-f]+)\))?( \(BuildId: [\da-f]+\))?$'
+)
+
+_FIND_KEY_SUB_REGEX = re.compile(r'0x[\da-f]+')
+
+
+class StackTraceKeyFinder:
+    """Finds the key of a stack trace from its frames in own code.
+
+    Frames are in own code if the text of the frame (the function, source file and module) includes
+    one of the own code roots, such as "/ros2". The roots are compiled into a single regex, so each
+    frame is matched once no matter how many roots there are.
+
+    The key is the text of the first frame_count frames in own code, joined by KEY_FRAME_SEPARATOR.
+    A larger frame_count tells apart stack traces that reach the same own code frame through
+    different own code, at the cost of longer keys and more of them. Stack traces without frames in
+    own code, such as those entirely in third-party libraries, are keyed by their top frame.
+
+    Addresses are masked in keys, so that keys of stack traces that are reproductions of each other
+    are guaranteed to match.
+    """
+
+    @property
+    def own_code_roots(self) -> Tuple[str, ...]:
+        """Roots of own code in the text of frames."""
+        return self._own_code_roots
+
+    @property
+    def frame_count(self) -> int:
+        """Maximum number of frames in a key."""
+        return self._frame_count
+
+    def __init__(
+            self, *, own_code_roots: Sequence[str] = DEFAULT_OWN_CODE_ROOTS, frame_count: int = 1
+    ) -> None:
+        """Compile the own code roots.
+
+        A ValueError is raised if there are no own code roots, one of them is empty, or frame_count
+        is not positive.
+        """
+        if not own_code_roots or not all(own_code_roots):
+            raise ValueError('At least one own code root is needed, and none may be empty')
+        if frame_count < 1:
+            raise ValueError('Keys need at least one frame, not {frame_count}'.format(
+                frame_count=frame_count
+            ))
+        self._own_code_roots = tuple(own_code_roots)
+        self._frame_count = frame_count
+        self._find_own_code_regex = re.compile(
+            '|'.join(re.escape(own_code_root) for own_code_root in self._own_code_roots)
+        )
+
+    def get_key(self, lines: Sequence[str]) -> str:
+        """Return the key of the stack trace with the given lines."""
+        key_frames: List[str] = []
+        top_frame = None
+        for line in lines:
+            match = _FIND_FRAME_REGEX.match(line)
+            if match is None:
+                continue
+
+            frame = match.group('frame')
+            if top_frame is None:
+                top_frame = frame
+
+            if self._find_own_code_regex.search(frame) is not None:
+                key_frames.append(frame)
+                if len(key_frames) == self._frame_count:
+                    break
+
+        if not key_frames:
+            key_frames.append(top_frame if top_frame is not None else '')
+
+        return _FIND_KEY_SUB_REGEX.sub('0xX', KEY_FRAME_SEPARATOR.join(key_frames))
+
+
+class StackTraceFrame(NamedTuple):
+    """Parts of a frame of a stack trace. Parts missing from the frame are None."""
+
+    number: int
+    address: Optional[str]
+    function: Optional[str]
+    location: Optional[str]
+    module: Optional[str]
+    offset: Optional[str]
+
+
+def parse_stack_trace_frame(line: str) -> Optional[StackTraceFrame]:
+    """Return the parts of the frame of a stack trace line, or None if it is not a frame."""
+    match = _FIND_FRAME_REGEX.match(line)
+    if match is None:
+        return None
+
+    # The lazy function leaves the location and module offset to the end of the frame, so the parts
+    # regex matches every frame text.
+    parts_match = _FIND_FRAME_PARTS_REGEX.match(match.group('frame'))
+    assert parts_match is not None
+    parts = {
+        name: value if value not in ('', '<null>') else None
+        for name, value in parts_match.groupdict().items()
+    }
+    return StackTraceFrame(
+        number=int(match.group('number')), address=match.group('address') or parts['address'],
+        function=parts['function'], location=parts['location'], module=parts['module'],
+        offset=parts['offset'],
+    )
+
+
+# Finder of the keys of stack traces when no other is given.
+DEFAULT_STACK_TRACE_KEY_FINDER = StackTraceKeyFinder()
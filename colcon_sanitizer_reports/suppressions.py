@@ -0,0 +1,177 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+# Suppression types of the sanitizers' own suppression files are aliases of the error names we parse
+# from section headers. Any other type is taken to be an error name itself.
+_ERROR_NAMES_BY_SUPPRESSION_TYPE = {
+    'deadlock': ('lock-order-inversion',),
+    'leak': ('detected memory leaks',),
+    'race': ('data race',),
+    'signal': ('signal handler spoils errno', 'signal-unsafe call inside of a signal'),
+    'thread': ('thread leak',),
+}
+
+# Suppressions with this type apply to every error name.
+ANY_ERROR_NAME = '*'
+
+# Types written like the sanitizers' own suppression types (such as "race_top" or "called_from_lib")
+# match this pattern. Error names as they appear in reports never do, so such types are rejected
+# unless they are one of the aliases above.
+_FIND_SANITIZER_SUPPRESSION_TYPE_REGEX = re.compile(r'^[a-z_]+$')
+
+# The frame number and address at the beginning of a stack trace line can be found with the
+# following pattern. Only frame lines are matched against suppressions, and the prefix is removed
+# so that patterns anchored with "^" match the frame text.
+_FIND_FRAME_PREFIX_REGEX = re.compile(r'^\s*#\d+\s+(0x[\da-f]+ in\s+|0x[\da-f]+\s+)?')
+
+
+class Suppression(NamedTuple):
+    """A single known issue from a suppressions file.
+
+    error_name:
+        Error name of the stack traces the suppression applies to, or ANY_ERROR_NAME.
+
+    pattern:
+        Pattern matched against each frame of a stack trace, as written in the suppressions file.
+    """
+
+    error_name: str
+    pattern: str
+
+
+class Suppressions:
+    """Matches stack traces against known issues so they can be dropped before they are parsed.
+
+    Suppressions are written one per line as "<type>:<pattern>", in the spirit of the sanitizers'
+    own suppression files. Type is either a sanitizer suppression type (race, deadlock, leak,
+    signal, thread), an error name as it appears in reports (such as "heap-use-after-free"), or "*"
+    for any error name. Other sanitizer suppression types, such as race_top or called_from_lib, are
+    not supported. A suppression matches if the pattern is found in the text of any frame. "*" in a
+    pattern matches any text, and a leading "^" or trailing "$" anchors the pattern at the start or
+    end of the frame text. Empty lines and lines starting with "#" are ignored.
+
+    The patterns that apply to an error name are compiled into a single regular expression with
+    one group per pattern, so the frames are matched against all of them in one search. The group
+    of the match identifies the suppression.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        """Parse suppressions from the lines of a suppressions file.
+
+        A ValueError is raised if a line is not a valid suppression.
+        """
+        suppressions: List[Suppression] = []
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            suppression_type, separator, pattern = line.partition(':')
+            suppression_type = suppression_type.strip()
+            if not separator or not pattern.strip():
+                raise ValueError(
+                    'Invalid suppression on line {line_number}: {line}'.format(**locals())
+                )
+            if not suppression_type or (
+                    _FIND_SANITIZER_SUPPRESSION_TYPE_REGEX.match(suppression_type) is not None and
+                    suppression_type not in _ERROR_NAMES_BY_SUPPRESSION_TYPE
+            ):
+                raise ValueError(
+                    'Unsupported suppression type on line {line_number}: {line}'.format(**locals())
+                )
+            suppressions.extend(
+                Suppression(error_name=error_name, pattern=pattern.strip())
+                for error_name in _ERROR_NAMES_BY_SUPPRESSION_TYPE.get(
+                    suppression_type, (suppression_type,)
+                )
+            )
+
+        self._suppressions: Tuple[Suppression, ...] = tuple(suppressions)
+
+        # Combined regex and the suppression of each of its groups for each error name, compiled
+        # the first time a stack trace of that error name is matched.
+        self._compiled_by_error_name: (
+            Dict[str, Tuple[Optional[Pattern[str]], Tuple[Suppression, ...]]]
+        ) = {}
+
+    def __len__(self) -> int:
+        """Return the number of suppressions, counting each error name of a type separately."""
+        return len(self._suppressions)
+
+    def match(self, error_name: str, lines: Iterable[str]) -> Optional[Suppression]:
+        """Return the first suppression that matches a frame of the lines, if any.
+
+        The lines may be those of a stack trace or of a whole section part. Lines that are not
+        frames are skipped.
+        """
+        compiled = self._compiled_by_error_name.get(error_name)
+        if compiled is None:
+            compiled = self._compiled_by_error_name[error_name] = self._compile(error_name)
+
+        find_regex, suppressions = compiled
+        if find_regex is None:
+            return None
+
+        frame_texts = []
+        for line in lines:
+            prefix_match = _FIND_FRAME_PREFIX_REGEX.match(line)
+            if prefix_match is not None:
+                frame_texts.append(line[prefix_match.end():])
+        match = find_regex.search('\n'.join(frame_texts))
+        if match is None:
+            return None
+
+        # Patterns have no groups of their own, so the group index is the suppression index + 1.
+        assert match.lastindex is not None
+        return suppressions[match.lastindex - 1]
+
+    def _compile(
+            self, error_name: str
+    ) -> Tuple[Optional[Pattern[str]], Tuple[Suppression, ...]]:
+        suppressions = tuple(
+            suppression for suppression in self._suppressions
+            if suppression.error_name in (error_name, ANY_ERROR_NAME)
+        )
+        if not suppressions:
+            return None, ()
+
+        return re.compile(
+            '|'.join(
+                '({})'.format(_get_pattern_regex(suppression.pattern))
+                for suppression in suppressions
+            ),
+            re.MULTILINE,
+        ), suppressions
+
+
+def _get_pattern_regex(pattern: str) -> str:
+    prefix, suffix = '', ''
+    if pattern.startswith('^'):
+        prefix, pattern = '^', pattern[1:]
+    if pattern.endswith('$'):
+        suffix, pattern = '$', pattern[:-1]
+
+    return prefix + '[^\\n]*'.join(re.escape(part) for part in pattern.split('*')) + suffix
+
+
+def load_suppressions(path: str) -> Suppressions:
+    """Return the suppressions in the suppressions file at path.
+
+    A ValueError is raised if a line of the file is not a valid suppression.
+    """
+    with open(path, 'r') as suppressions_f_in:
+        return Suppressions(suppressions_f_in)
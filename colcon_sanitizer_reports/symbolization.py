@@ -0,0 +1,388 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import re
+import sqlite3
+import struct
+import subprocess
+import threading
+from typing import Dict, IO, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+# Frames that were not symbolized by the sanitizer only have the module and the offset in it, such
+# as "#0 0x7f2a (/opt/lib/libfoo.so+0x1234)" from ASan or "#0 <null> <null> (libfoo.so+0x1234)"
+# from TSan, optionally followed by the build id of the module.
+_FIND_UNSYMBOLIZED_FRAME_REGEX = re.compile(
+    r'^(?P<prefix>\s*#\d+(?P<address> 0x[\da-f]+)?)\s+(<null> <null> )?'
+    r'(?P<module_offset>\((?P<module>[^()]+)\+(?P<offset>0x[\da-f]+)\)'
+    r'( \(BuildId: (?P<build_id>[\da-f]+)\))?)\s*$'
+)
+
+# Cached symbols are stored per module build id and offset. Offsets that could not be symbolized are
+# stored with a NULL symbol, so they are not looked up again either.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbol (
+    build_id TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    symbol TEXT,
+    PRIMARY KEY (build_id, offset)
+) WITHOUT ROWID;
+"""
+
+# Maximum number of offsets looked up in the cache with one query, below SQLite's variable limit.
+_CACHE_QUERY_SIZE = 500
+
+# ELF program header type of notes, and note type of the GNU build id.
+_PT_NOTE = 4
+_NT_GNU_BUILD_ID = 3
+
+
+class ModuleOffset(NamedTuple):
+    """Offset of an unsymbolized frame in its module (executable or shared library)."""
+
+    module: str
+    offset: int
+
+
+class Symbolizer(ABC):
+    """Resolves module offsets to symbols, many at a time.
+
+    A symbol is the function and source location of a module offset, such as
+    "rclcpp::spin() /ros2/rclcpp/src/executor.cpp:20:3", as it is shown in symbolized frames. The
+    source location is left out if it is unknown.
+    """
+
+    @abstractmethod
+    def symbolize(self, module_offsets: Sequence[ModuleOffset]) -> List[Optional[str]]:
+        """Return the symbol of each module offset, or None if it cannot be symbolized."""
+
+    def close(self) -> None:
+        """Release the resources of the symbolizer."""
+
+
+class StaticSymbolizer(Symbolizer):
+    """Resolves module offsets from a fixed mapping, standing in for a symbolizer in tests.
+
+    The module offsets of each batch are recorded in batches.
+    """
+
+    def __init__(self, symbol_by_module_offset: Mapping[ModuleOffset, str]) -> None:
+        """Initialize the symbolizer with the symbol of each known module offset."""
+        self._symbol_by_module_offset = symbol_by_module_offset
+        self.batches: List[Tuple[ModuleOffset, ...]] = []
+
+    def symbolize(self, module_offsets: Sequence[ModuleOffset]) -> List[Optional[str]]:
+        """Return the known symbol of each module offset."""
+        self.batches.append(tuple(module_offsets))
+        return [
+            self._symbol_by_module_offset.get(module_offset) for module_offset in module_offsets
+        ]
+
+
+class LlvmSymbolizer(Symbolizer):
+    """Resolves module offsets with a long-lived llvm-symbolizer process.
+
+    The process is started on first use and serves every batch until the symbolizer is closed. The
+    queries of a batch are written by a separate thread while the answers are read, so that neither
+    process blocks on a full pipe no matter how large the batch is.
+    """
+
+    def __init__(self, executable: str = 'llvm-symbolizer') -> None:
+        """Initialize the symbolizer with the path of the llvm-symbolizer executable."""
+        self._executable = executable
+        self._process: Optional[subprocess.Popen] = None
+
+    def symbolize(self, module_offsets: Sequence[ModuleOffset]) -> List[Optional[str]]:
+        """Return the symbol of each module offset, or None if it cannot be symbolized.
+
+        OSError is raised if the process cannot be started or exits before answering every module
+        offset.
+        """
+        if self._process is None:
+            self._process = subprocess.Popen(
+                [self._executable, '--no-inlines'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True, bufsize=1,
+            )
+        assert self._process.stdin is not None and self._process.stdout is not None
+
+        writer = threading.Thread(
+            target=_write_queries, args=(self._process.stdin, module_offsets), daemon=True
+        )
+        writer.start()
+        symbols = [
+            _read_symbol(self._process.stdout, module_offset) for module_offset in module_offsets
+        ]
+        writer.join()
+
+        return symbols
+
+    def close(self) -> None:
+        """Stop the llvm-symbolizer process."""
+        if self._process is None:
+            return
+
+        assert self._process.stdin is not None and self._process.stdout is not None
+        try:
+            self._process.stdin.close()
+        except OSError:
+            # The process already exited, leaving queries unwritten.
+            pass
+        self._process.wait()
+        self._process.stdout.close()
+        self._process = None
+
+
+def _write_queries(stdin: IO[str], module_offsets: Iterable[ModuleOffset]) -> None:
+    try:
+        for module_offset in module_offsets:
+            stdin.write('{module_offset.module} 0x{module_offset.offset:x}\n'.format(**locals()))
+        stdin.flush()
+    except OSError:
+        # The process exited, which the reader of the answers finds at the end of the output.
+        return
+
+
+def _read_symbol(stdout: IO[str], module_offset: ModuleOffset) -> Optional[str]:
+    # Each answer is a function line and a source location line, followed by an empty line.
+    lines = []
+    for line in stdout:
+        line = line.rstrip('\n')
+        if not line:
+            break
+        lines.append(line)
+    else:
+        # Nothing is known about offsets the process did not answer, so they must not be taken to
+        # have no symbol (and be cached as such).
+        raise OSError(
+            'llvm-symbolizer exited before symbolizing {module_offset.module}+0x'
+            '{module_offset.offset:x}'.format(**locals())
+        )
+
+    # Offsets that cannot be symbolized are answered with "??" as the function.
+    if len(lines) < 2 or lines[0] == '??':
+        return None
+
+    function, location = lines[0], lines[1]
+    if location.startswith('??'):
+        return function
+
+    return '{function} {location}'.format(**locals())
+
+
+class SymbolCache:
+    """Stores the symbols of module offsets in a local SQLite database across runs.
+
+    Symbols are keyed by the build id of their module, so they stay valid for as long as the module
+    is not rebuilt, wherever it is installed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open or create the database at path."""
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def __enter__(self) -> 'SymbolCache':
+        """Use the cache as a context manager that closes the database on exit."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the database."""
+        self.close()
+
+    def get_symbols(self, build_id: str, offsets: Sequence[int]) -> Dict[int, Optional[str]]:
+        """Return the cached symbol of each cached offset in the module with the build id."""
+        symbol_by_offset: Dict[int, Optional[str]] = {}
+        for i in range(0, len(offsets), _CACHE_QUERY_SIZE):
+            batch = offsets[i:i + _CACHE_QUERY_SIZE]
+            symbol_by_offset.update(self._connection.execute(
+                'SELECT offset, symbol FROM symbol WHERE build_id = ? AND offset IN ({})'.format(
+                    ', '.join('?' * len(batch))
+                ),
+                (build_id, *batch),
+            ))
+
+        return symbol_by_offset
+
+    def add_symbols(self, build_id: str, symbol_by_offset: Mapping[int, Optional[str]]) -> None:
+        """Store the symbol of each offset in the module with the build id."""
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO symbol (build_id, offset, symbol) VALUES (?, ?, ?)',
+                ((build_id, offset, symbol) for offset, symbol in symbol_by_offset.items()),
+            )
+
+
+def has_unsymbolized_frames(lines: Iterable[str]) -> bool:
+    """Return whether any of the lines is a frame that was not symbolized by the sanitizer."""
+    return any(
+        '+0x' in line and _FIND_UNSYMBOLIZED_FRAME_REGEX.match(line) is not None
+        for line in lines
+    )
+
+
+def get_build_id(path: str) -> Optional[str]:
+    """Return the GNU build id of the ELF module at path, or None if it has none."""
+    try:
+        with open(path, 'rb') as module_f_in:
+            ident = module_f_in.read(16)
+            if ident[:4] != b'\x7fELF':
+                return None
+
+            is_64_bit = ident[4] == 2
+            endianness = '<' if ident[5] == 1 else '>'
+            if is_64_bit:
+                program_header_offset, = struct.unpack(endianness + '16xQ', module_f_in.read(24))
+                module_f_in.seek(54)
+            else:
+                program_header_offset, = struct.unpack(endianness + '12xI', module_f_in.read(16))
+                module_f_in.seek(42)
+            program_header_size, program_header_count = struct.unpack(
+                endianness + 'HH', module_f_in.read(4)
+            )
+
+            for i in range(program_header_count):
+                module_f_in.seek(program_header_offset + i * program_header_size)
+                if is_64_bit:
+                    segment_type, segment_offset, segment_size = struct.unpack(
+                        endianness + 'I4xQ16xQ', module_f_in.read(40)
+                    )
+                else:
+                    segment_type, segment_offset, segment_size = struct.unpack(
+                        endianness + 'II8xI', module_f_in.read(20)
+                    )
+                if segment_type != _PT_NOTE:
+                    continue
+
+                module_f_in.seek(segment_offset)
+                build_id = _find_build_id_note(module_f_in.read(segment_size), endianness)
+                if build_id is not None:
+                    return build_id
+    except (OSError, struct.error):
+        pass
+
+    return None
+
+
+def _find_build_id_note(notes: bytes, endianness: str) -> Optional[str]:
+    # Notes are a name size, description size and type, followed by the name and the description,
+    # each padded to 4 bytes.
+    position = 0
+    while position + 12 <= len(notes):
+        name_size, description_size, note_type = struct.unpack(
+            endianness + 'III', notes[position:position + 12]
+        )
+        description_position = position + 12 + (name_size + 3) // 4 * 4
+        if note_type == _NT_GNU_BUILD_ID and \
+                notes[position + 12:position + 12 + name_size] == b'GNU\0':
+            return notes[description_position:description_position + description_size].hex()
+        position = description_position + (description_size + 3) // 4 * 4
+
+    return None
+
+
+def symbolize_stack_traces(
+        lines_of_sections: Sequence[Sequence[str]], symbolizer: Symbolizer, *,
+        cache: Optional[SymbolCache] = None,
+) -> List[Tuple[str, ...]]:
+    """Return the lines of each section with unsymbolized frames replaced by symbolized frames.
+
+    The unique module offsets of the unsymbolized frames of all sections are looked up in the cache
+    once for each module, and those that are not cached are resolved with a single batch of the
+    symbolizer. Resolved symbols are added to the cache for modules with a build id. Symbolized
+    frames keep their module offset after the symbol, and frames that cannot be symbolized are left
+    as they are.
+    """
+    # Unique module offsets of all unsymbolized frames, and the build id of each module.
+    module_offsets: Dict[ModuleOffset, None] = {}
+    build_id_by_module: Dict[str, Optional[str]] = {}
+    for lines in lines_of_sections:
+        for line in lines:
+            match = _FIND_UNSYMBOLIZED_FRAME_REGEX.match(line) if '+0x' in line else None
+            if match is None:
+                continue
+
+            module_offset = ModuleOffset(match.group('module'), int(match.group('offset'), 16))
+            module_offsets[module_offset] = None
+            if match.group('build_id') is not None:
+                build_id_by_module[module_offset.module] = match.group('build_id')
+            elif module_offset.module not in build_id_by_module:
+                build_id_by_module[module_offset.module] = get_build_id(module_offset.module)
+
+    module_offsets_by_build_id: Dict[str, List[ModuleOffset]] = defaultdict(list)
+    for module_offset in module_offsets:
+        build_id = build_id_by_module[module_offset.module]
+        if build_id is not None:
+            module_offsets_by_build_id[build_id].append(module_offset)
+
+    symbol_by_module_offset: Dict[ModuleOffset, Optional[str]] = {}
+    if cache is not None:
+        for build_id, build_id_module_offsets in module_offsets_by_build_id.items():
+            symbol_by_offset = cache.get_symbols(
+                build_id, [module_offset.offset for module_offset in build_id_module_offsets]
+            )
+            for module_offset in build_id_module_offsets:
+                if module_offset.offset in symbol_by_offset:
+                    symbol_by_module_offset[module_offset] = symbol_by_offset[module_offset.offset]
+
+    missing_module_offsets = [
+        module_offset for module_offset in module_offsets
+        if module_offset not in symbol_by_module_offset
+    ]
+    if missing_module_offsets:
+        symbol_by_module_offset.update(
+            zip(missing_module_offsets, symbolizer.symbolize(missing_module_offsets))
+        )
+        if cache is not None:
+            missing_symbol_by_offset_by_build_id: Dict[str, Dict[int, Optional[str]]] = (
+                defaultdict(dict)
+            )
+            for module_offset in missing_module_offsets:
+                build_id = build_id_by_module[module_offset.module]
+                if build_id is not None:
+                    missing_symbol_by_offset_by_build_id[build_id][module_offset.offset] = \
+                        symbol_by_module_offset[module_offset]
+            for build_id, symbol_by_offset in missing_symbol_by_offset_by_build_id.items():
+                cache.add_symbols(build_id, symbol_by_offset)
+
+    return [
+        tuple(_symbolize_line(line, symbol_by_module_offset) for line in lines)
+        for lines in lines_of_sections
+    ]
+
+
+def _symbolize_line(
+        line: str, symbol_by_module_offset: Mapping[ModuleOffset, Optional[str]]
+) -> str:
+    match = _FIND_UNSYMBOLIZED_FRAME_REGEX.match(line) if '+0x' in line else None
+    if match is None:
+        return line
+
+    symbol = symbol_by_module_offset.get(
+        ModuleOffset(match.group('module'), int(match.group('offset'), 16))
+    )
+    if symbol is None:
+        return line
+
+    # Symbolized ASan frames have "in" between the address and the symbol, TSan frames have neither.
+    # Both keep the module offset after the symbol, as the sanitizers write it.
+    return '{prefix}{in_} {symbol} {module_offset}'.format(
+        prefix=match.group('prefix'), in_=' in' if match.group('address') is not None else '',
+        symbol=symbol, module_offset=match.group('module_offset'),
+    )
@@ -0,0 +1,188 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+from socketserver import ThreadingMixIn
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from colcon_output.event_handler.log import STDOUT_STDERR_LOG_FILENAME
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+
+# Paths the report server serves each report format at, and the content type of each format.
+REPORT_PATHS = ('/report.csv', '/report.json', '/report.xml')
+_CONTENT_TYPE_BY_FORMAT = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+    'xml': 'application/xml',
+}
+
+# Appended lines of a log are read in chunks of at most this many bytes.
+_READ_SIZE = 1 << 20
+
+
+class LogDirectoryTailer:
+    """Incrementally parses the growing stdout_stderr.log of each package in a colcon log directory.
+
+    Each call to poll() parses the lines that were appended to the logs since the previous call. The
+    byte offset up to which each log was parsed is remembered, so no part of a log is read twice. A
+    line is only parsed once its terminating newline has been written. A log that shrank was
+    rewritten, so the package's findings are reset and the log is parsed from its start.
+    """
+
+    def __init__(self, log_parser: SanitizerLogParser, log_path: str) -> None:
+        """Initialize the tailer of the package logs in log_path."""
+        self._log_parser = log_parser
+        self._log_path = log_path
+
+        # Byte offset of the end of the last parsed line of each log.
+        self._offset_by_path: Dict[str, int] = {}
+
+    def poll(self) -> bool:
+        """Parse lines appended to the package logs since the last poll and return if there were."""
+        parsed_lines = False
+        with os.scandir(self._log_path) as entries:
+            package_entries = sorted(
+                (entry for entry in entries if entry.is_dir()), key=lambda entry: entry.name
+            )
+
+        for entry in package_entries:
+            path = os.path.join(entry.path, STDOUT_STDERR_LOG_FILENAME)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+
+            offset = self._offset_by_path.get(path, 0)
+            if size < offset:
+                # The log was rewritten, such as by running the package's tests again. The package's
+                # findings so far are from the previous log, so they are replaced by those of the
+                # rewritten log.
+                self._log_parser.reset_package(entry.name)
+                offset = 0
+            if size == offset:
+                continue
+
+            self._log_parser.set_package(entry.name)
+            if self._parse_lines(path, offset, size):
+                parsed_lines = True
+
+        return parsed_lines
+
+    def _parse_lines(self, path: str, offset: int, size: int) -> bool:
+        """Parse the complete lines of a log between offset and size, reading in bounded chunks."""
+        parsed_lines = False
+        partial_line = b''
+        with open(path, 'rb') as log_f_in:
+            log_f_in.seek(offset)
+            while offset + len(partial_line) < size:
+                chunk = log_f_in.read(min(_READ_SIZE, size - offset - len(partial_line)))
+                if not chunk:
+                    break
+
+                # Leave a trailing partial line for the next chunk or poll.
+                data = partial_line + chunk
+                end = data.rfind(b'\n') + 1
+                partial_line = data[end:]
+                if end == 0:
+                    continue
+
+                for line in data[:end - 1].decode(errors='replace').split('\n'):
+                    self._log_parser.parse_line(line)
+                offset += end
+                self._offset_by_path[path] = offset
+                parsed_lines = True
+
+        return parsed_lines
+
+
+class ReportSnapshots:
+    """Holds the latest csv, json and xml output of a parser, served without waiting for parsing.
+
+    update() regenerates the snapshots when the generation of the parser has changed since they were
+    last generated. It must be called by the thread that changes the parser, between changes, so
+    that the snapshots are generated from a consistent state. The new snapshots are swapped in at
+    once under a lock that is only held for the swap, so get() returns the latest snapshot from any
+    thread without waiting for lines to be parsed or reports to be generated.
+    """
+
+    def __init__(self, log_parser: SanitizerLogParser) -> None:
+        """Generate the first snapshots of the parser's output."""
+        self._get_output_by_format: Dict[str, Callable[[], str]] = {
+            'csv': log_parser.get_csv,
+            'json': log_parser.get_json,
+            'xml': log_parser.get_xml,
+        }
+        self._log_parser = log_parser
+        self._lock = threading.Lock()
+
+        # Parser generation of the snapshots, and the encoded output of each format.
+        self._generation: Optional[int] = None
+        self._snapshot_by_format: Dict[str, bytes] = {}
+        self.update()
+
+    def update(self) -> None:
+        """Regenerate the snapshots if the parser has changed since they were generated."""
+        generation = self._log_parser.generation
+        if generation == self._generation:
+            return
+
+        snapshot_by_format = {
+            report_format: get_output().encode()
+            for report_format, get_output in self._get_output_by_format.items()
+        }
+        with self._lock:
+            self._generation = generation
+            self._snapshot_by_format = snapshot_by_format
+
+    def get(self, report_format: str) -> bytes:
+        """Return the encoded output of the parser in the given format (csv, json or xml)."""
+        with self._lock:
+            return self._snapshot_by_format[report_format]
+
+
+class _ReportServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    report_snapshots: ReportSnapshots
+
+
+class _ReportRequestHandler(BaseHTTPRequestHandler):
+
+    server: _ReportServer
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Respond with the latest snapshot of the requested report."""
+        if self.path not in REPORT_PATHS:
+            self.send_error(404)
+            return
+
+        report_format = os.path.splitext(self.path)[1][1:]
+        body = self.server.report_snapshots.get(report_format)
+        self.send_response(200)
+        self.send_header('Content-Type', _CONTENT_TYPE_BY_FORMAT[report_format])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        """Do not log requests, since dashboards poll the server frequently."""
+
+
+def make_report_server(report_snapshots: ReportSnapshots, address: Tuple[str, int]) -> HTTPServer:
+    """Return an HTTP server of the report snapshots at REPORT_PATHS, bound to address."""
+    server = _ReportServer(address, _ReportRequestHandler)
+    server.report_snapshots = report_snapshots
+    return server
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from collections import defaultdict
-from typing import Dict, Set
+from typing import Callable, Dict, Iterable, Mapping, Optional, Sequence, Set
 import xml.dom.minidom
 import xml.etree.cElementTree as eTree
 
@@ -21,32 +21,48 @@ import xml.etree.cElementTree as eTree
 from colcon_sanitizer_reports._sanitizer_section_part_stack_trace import (
     SanitizerSectionPartStackTrace
 )
+from colcon_sanitizer_reports.parse_budget import CountedSections
+from colcon_sanitizer_reports.report_selection import ReportRemainder
 from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
 
 
 class XmlOutputGenerator:
     """Converts the sanitizer error report into a xUnit compatible xml test report."""
 
-    _count_by_error: Dict[SanitizerLogParserOutputPrimaryKey, int]
-    _stack_trace_by_error: Dict[SanitizerLogParserOutputPrimaryKey,
-                                SanitizerSectionPartStackTrace]
+    _count_by_error: Mapping[SanitizerLogParserOutputPrimaryKey, int]
+    _stack_trace_by_error: Mapping[SanitizerLogParserOutputPrimaryKey,
+                                   SanitizerSectionPartStackTrace]
+    _cluster_id_by_error: Optional[Mapping[SanitizerLogParserOutputPrimaryKey, str]]
+    _remainders: Sequence[ReportRemainder]
+    _format_stack_trace: Callable[[Sequence[str]], str]
+    _counted_sections: Sequence[CountedSections]
     _packages: Set[str]
     _xml_tree: eTree.ElementTree
     _xml_string: str
 
     def __init__(self,
-                 error_map: Dict[SanitizerLogParserOutputPrimaryKey, int],
-                 stack_trace_map: Dict[SanitizerLogParserOutputPrimaryKey,
-                                       SanitizerSectionPartStackTrace]):
+                 error_map: Mapping[SanitizerLogParserOutputPrimaryKey, int],
+                 stack_trace_map: Mapping[SanitizerLogParserOutputPrimaryKey,
+                                          SanitizerSectionPartStackTrace],
+                 cluster_id_map: Optional[Mapping[SanitizerLogParserOutputPrimaryKey, str]] = None,
+                 remainders: Sequence[ReportRemainder] = (),
+                 format_stack_trace: Callable[[Sequence[str]], str] = '\n'.join,
+                 counted_sections: Sequence[CountedSections] = ()):
         """Convert sanitizer error into xml representation."""
         self._count_by_error = error_map
         self._stack_trace_by_error = stack_trace_map
+        self._cluster_id_by_error = cluster_id_map
+        self._remainders = remainders
+        self._format_stack_trace = format_stack_trace
+        self._counted_sections = counted_sections
         self._packages: Set[str] = self._get_unique_packages()
         testsuite: eTree.Element = self._create_error_report(self._create_results_base())
         self._xml_string = self.encode_and_pretty_print(testsuite)
 
     def _get_unique_packages(self) -> Set[str]:
-        return {str(key[0]) for key in self._count_by_error.keys()}
+        return {str(key[0]) for key in self._count_by_error.keys()} | \
+            {remainder.package for remainder in self._remainders} | \
+            {counted_sections.package for counted_sections in self._counted_sections}
 
     def _create_results_base(self) -> eTree.Element:
         testsuite = eTree.Element('testsuite', {'tests': str(len(self._packages))})
@@ -70,14 +86,55 @@ class XmlOutputGenerator:
             error.set('message', str(key[1].replace(' ', '-')))
             error.set('key', str(key[2]))
             error.set('count', str(count))
-            error.text = '\n'.join(self._stack_trace_by_error[key].lines)
+            if self._cluster_id_by_error is not None:
+                error.set('cluster', self._cluster_id_by_error[key])
+            error.text = self._format_stack_trace(self._stack_trace_by_error[key].lines)
             error_count_by_package[key[0]] += 1
 
+        # Sections that were counted without parsing them are errors without a stack trace key.
+        for counted_sections in self._counted_sections:
+            error = eTree.SubElement(testcases[counted_sections.package], 'error')
+            error.set('message', counted_sections.error_name.replace(' ', '-'))
+            error.set('key', '')
+            error.set('count', str(counted_sections.section_count))
+            error.set('counted_only', counted_sections.reason)
+            error.text = counted_sections.description
+            error_count_by_package[counted_sections.package] += 1
+
         for package in self._packages:
             testcases[package].set('errors', str(error_count_by_package[package]))
 
+        # Omitted errors of each package are summarized in a single skipped element.
+        key_count_by_package: Dict[str, int] = defaultdict(int)
+        omitted_count_by_package: Dict[str, int] = defaultdict(int)
+        for remainder in self._remainders:
+            key_count_by_package[remainder.package] += remainder.key_count
+            omitted_count_by_package[remainder.package] += remainder.total_count
+        for package, key_count in key_count_by_package.items():
+            eTree.SubElement(testcases[package], 'skipped', {
+                'message': ReportRemainder(
+                    package, '', key_count, omitted_count_by_package[package]
+                ).description,
+            })
+
         return base_element
 
+    @staticmethod
+    def combine(xml_strings: Iterable[str]) -> str:
+        """Return a single report with the testcases of all the given xml reports."""
+        testsuite = eTree.Element('testsuite')
+        for xml_string in xml_strings:
+            for case in eTree.fromstring(xml_string).findall('testcase'):
+                # Drop whitespace left by pretty printing so the combined report is pretty printed
+                # uniformly.
+                case.text = None
+                for element in case.iter():
+                    element.tail = None
+                testsuite.append(case)
+        testsuite.set('tests', str(len(testsuite)))
+
+        return XmlOutputGenerator.encode_and_pretty_print(testsuite)
+
     @staticmethod
     def encode_and_pretty_print(element: eTree.Element) -> str:
         """Return encoded and pretty-printed string representation of xml tree."""
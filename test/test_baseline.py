@@ -0,0 +1,126 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import time
+
+from colcon_sanitizer_reports.baseline import diff_baseline, load_baseline, write_baseline
+from colcon_sanitizer_reports.command import main
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
+import pytest
+
+_KEY1 = SanitizerLogParserOutputPrimaryKey('package1', 'data race', 'key1')
+_KEY2 = SanitizerLogParserOutputPrimaryKey('package2', 'data race', 'key1')
+_KEY3 = SanitizerLogParserOutputPrimaryKey('package1', 'lock-order-inversion', 'key3')
+
+
+def _write_report_csv(path, *output_primary_keys: SanitizerLogParserOutputPrimaryKey) -> None:
+    with open(str(path), 'w', newline='') as report_csv_f_out:
+        writer = csv.writer(report_csv_f_out)
+        writer.writerow([
+            *SanitizerLogParserOutputPrimaryKey._fields, 'count', 'sample_stack_trace'
+        ])
+        for output_primary_key in output_primary_keys:
+            writer.writerow([*output_primary_key, 1, '    #0 0x7f in key /ros2'])
+
+
+def test_fingerprint_is_stable() -> None:
+    assert _KEY1.fingerprint == SanitizerLogParserOutputPrimaryKey(*_KEY1).fingerprint
+    assert _KEY1.fingerprint != _KEY2.fingerprint
+    assert 0 <= _KEY1.fingerprint < 2 ** 64
+    assert SanitizerLogParserOutputPrimaryKey('a', 'b', 'c').fingerprint == 0x0d1a2009066c0ba0
+
+
+def test_write_and_load_baseline(tmp_path) -> None:
+    baseline_path = str(tmp_path / 'baseline')
+    fingerprints = {_KEY1.fingerprint, _KEY2.fingerprint, 0, 2 ** 64 - 1}
+    write_baseline(baseline_path, [*fingerprints, _KEY1.fingerprint])
+    assert (tmp_path / 'baseline').stat().st_size == 8 * len(fingerprints)
+    with load_baseline(baseline_path) as baseline:
+        assert len(baseline) == len(fingerprints)
+        assert list(baseline) == sorted(fingerprints)
+        for fingerprint in fingerprints:
+            assert fingerprint in baseline
+        assert _KEY3.fingerprint not in baseline
+        assert 1 not in baseline
+        assert 'key1' not in baseline
+
+    write_baseline(baseline_path, [])
+    with load_baseline(baseline_path) as baseline:
+        assert len(baseline) == 0
+        assert list(baseline) == []
+        assert _KEY1.fingerprint not in baseline
+
+
+def test_load_baseline_rejects_corrupt_file(tmp_path) -> None:
+    (tmp_path / 'baseline').write_bytes(b'\0' * 12)
+    with pytest.raises(ValueError):
+        load_baseline(str(tmp_path / 'baseline'))
+
+
+def test_diff_baseline() -> None:
+    diff = diff_baseline(frozenset({_KEY1.fingerprint, _KEY2.fingerprint}), [_KEY3, _KEY1])
+    assert diff.new == (_KEY3,)
+    assert diff.disappeared == {_KEY2.fingerprint}
+
+
+def test_diff_memory_mapped_baseline(tmp_path) -> None:
+    baseline_path = str(tmp_path / 'baseline')
+    write_baseline(baseline_path, [_KEY1.fingerprint, _KEY2.fingerprint])
+    with load_baseline(baseline_path) as baseline:
+        diff = diff_baseline(baseline, [_KEY3, _KEY1])
+    assert diff.new == (_KEY3,)
+    assert diff.disappeared == {_KEY2.fingerprint}
+
+
+def test_diff_baseline_of_a_million_findings(tmp_path) -> None:
+    output_primary_keys = [
+        SanitizerLogParserOutputPrimaryKey('package', 'data race', 'key{}'.format(i))
+        for i in range(10 ** 6)
+    ]
+
+    start = time.perf_counter()
+    fingerprints = [output_primary_key.fingerprint for output_primary_key in output_primary_keys]
+    fingerprint_seconds = time.perf_counter() - start
+
+    # The first thousand findings are new, and a thousand other fingerprints disappeared.
+    baseline_path = str(tmp_path / 'baseline')
+    write_baseline(baseline_path, [*range(1000), *fingerprints[1000:]])
+    assert (tmp_path / 'baseline').stat().st_size == 8 * 10 ** 6
+
+    start = time.perf_counter()
+    with load_baseline(baseline_path) as baseline:
+        diff = diff_baseline(baseline, output_primary_keys)
+    diff_seconds = time.perf_counter() - start
+
+    assert diff.new == tuple(output_primary_keys[:1000])
+    assert diff.disappeared == frozenset(range(1000))
+    # Fingerprinting the findings takes most of the time. The set operations add a fraction of a
+    # second, where searching the baseline for each finding took many seconds.
+    assert diff_seconds - fingerprint_seconds < 2.0
+
+
+def test_command_diff_exit_status(tmp_path, capsys) -> None:
+    _write_report_csv(tmp_path / 'main.csv', _KEY1, _KEY2)
+    _write_report_csv(tmp_path / 'same.csv', _KEY2)
+    _write_report_csv(tmp_path / 'new.csv', _KEY1, _KEY3)
+    baseline_path = str(tmp_path / 'main.baseline')
+
+    assert main(['baseline', str(tmp_path / 'main.csv'), baseline_path]) == 0
+    assert main(['diff', baseline_path, str(tmp_path / 'same.csv')]) == 0
+    capsys.readouterr()
+
+    assert main(['diff', baseline_path, str(tmp_path / 'new.csv')]) == 1
+    rows = list(csv.reader(capsys.readouterr().out.splitlines()))
+    assert rows == [list(SanitizerLogParserOutputPrimaryKey._fields), list(_KEY3)]
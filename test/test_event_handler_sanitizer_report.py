@@ -12,10 +12,32 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from csv import DictReader
+import gzip
+import json
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import xml.etree.cElementTree as eTree
 
 from colcon_core.event.job import JobEnded
-from colcon_sanitizer_reports.event_handlers.sanitizer_report import SanitizerReportEventHandler
+from colcon_core.event_reactor import EventReactorShutdown
+from colcon_output.event_handler.log import STDOUT_STDERR_LOG_FILENAME
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    CLUSTER_ENVIRONMENT_VARIABLE, COMPRESS_ENVIRONMENT_VARIABLE, DATABASE_ENVIRONMENT_VARIABLE,
+    NDJSON_ENVIRONMENT_VARIABLE, REPORT_BY_KEY_CSV_FILENAME, REPORT_CSV_FILENAME,
+    REPORT_NDJSON_FILENAME, REPORT_XML_FILENAME, SanitizerReportEventHandler, SHARD_CSV_FILENAME,
+    SHARD_XML_FILENAME, SPLIT_STACK_TRACES_ENVIRONMENT_VARIABLE, STACK_TRACES_CSV_FILENAME,
+    TOP_K_ENVIRONMENT_VARIABLE,
+)
+from colcon_sanitizer_reports.findings_store import FindingsStore
+from colcon_sanitizer_reports.sample_stack_traces import STACK_TRACE_REFERENCE_PREFIX
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
 from mock import patch
+import pytest
+
+_PACKAGES = ('data_race_different_keys', 'no_errors', 'segv')
 
 
 def test_event_handler_asan_report():
@@ -37,3 +59,184 @@ def test_event_handler_asan_report():
         handler.reset_mock()
         extension(('unknown', None))
         assert handler.call_count == 0
+
+
+@pytest.fixture
+def run_event_handler(tmp_path, monkeypatch):
+    """Return a function that passes the jobs of all packages and shutdown to a new handler.
+
+    The logs of the packages are copied to a log directory in tmp_path, which is also the current
+    working directory. The function calls its argument, if given, with each package once its job has
+    ended, and returns the handler.
+    """
+    resources_path = Path(__file__).parent / 'resources'
+    for package in _PACKAGES:
+        (tmp_path / 'log' / package).mkdir(parents=True)
+        shutil.copy(
+            str(resources_path / package / 'input.log'),
+            str(tmp_path / 'log' / package / STDOUT_STDERR_LOG_FILENAME),
+        )
+    monkeypatch.chdir(tmp_path)
+
+    def run_event_handler(job_ended=None):
+        extension = SanitizerReportEventHandler()
+        for package in _PACKAGES:
+            event = JobEnded(package, 0)
+            extension((event, event))
+            if job_ended is not None:
+                job_ended(package)
+        extension((EventReactorShutdown(), None))
+        return extension
+
+    with patch(
+        'colcon_sanitizer_reports.event_handlers.sanitizer_report.get_log_path',
+        return_value=tmp_path / 'log',
+    ):
+        yield run_event_handler
+
+
+def test_event_handler_writes_shards_and_report(run_event_handler, tmp_path, monkeypatch):
+    monkeypatch.setenv(NDJSON_ENVIRONMENT_VARIABLE.name, '1')
+
+    def job_ended(package):
+        # Each package's shard is written when its job ends.
+        with open(str(tmp_path / 'log' / package / SHARD_CSV_FILENAME)) as shard_csv_f_in:
+            assert {row['package'] for row in DictReader(shard_csv_f_in)} <= {package}
+        assert (tmp_path / 'log' / package / SHARD_XML_FILENAME).exists()
+        assert not (tmp_path / REPORT_CSV_FILENAME).exists()
+
+    run_event_handler(job_ended)
+
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    assert [row['package'] for row in rows] == \
+        ['data_race_different_keys', 'data_race_different_keys', 'segv']
+
+    with open(str(tmp_path / REPORT_BY_KEY_CSV_FILENAME)) as report_by_key_csv_f_in:
+        assert {row['packages'] for row in DictReader(report_by_key_csv_f_in)} == \
+            {'data_race_different_keys', 'segv'}
+
+    with open(str(tmp_path / REPORT_NDJSON_FILENAME)) as report_ndjson_f_in:
+        records = [json.loads(line) for line in report_ndjson_f_in]
+    assert [(record['run']['name'], record['package']) for record in records] == \
+        [('log', row['package']) for row in rows]
+
+    testsuite = eTree.parse(str(tmp_path / REPORT_XML_FILENAME)).getroot()
+    assert testsuite.get('tests') == '2'
+    assert [case.get('name') for case in testsuite.findall('testcase')] == \
+        ['data_race_different_keys', 'segv']
+
+
+def test_event_handler_writes_top_k_report(run_event_handler, tmp_path, monkeypatch):
+    monkeypatch.setenv(TOP_K_ENVIRONMENT_VARIABLE.name, '1')
+
+    run_event_handler()
+
+    # The top k are selected across all packages, not from each package's shard.
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    assert [(row['package'], bool(row['stack_trace_key'])) for row in rows] == [
+        ('data_race_different_keys', True), ('data_race_different_keys', False), ('segv', False)
+    ]
+
+    testsuite = eTree.parse(str(tmp_path / REPORT_XML_FILENAME)).getroot()
+    assert [len(case.findall('skipped')) for case in testsuite.findall('testcase')] == [1, 1]
+
+    # The newline-delimited json report is only written if enabled.
+    assert not (tmp_path / REPORT_NDJSON_FILENAME).exists()
+
+
+def test_event_handler_writes_clustered_report_from_parser(
+        run_event_handler, tmp_path, monkeypatch
+):
+    monkeypatch.setenv(CLUSTER_ENVIRONMENT_VARIABLE.name, '1')
+
+    extension = run_event_handler()
+
+    # Cluster ids of the aggregate report are those of all findings, not of the shards.
+    with open(str(tmp_path / REPORT_CSV_FILENAME), newline='') as report_csv_f_in:
+        assert report_csv_f_in.read() == extension._log_parser.get_csv()
+
+
+def test_event_handler_writes_compressed_split_report(run_event_handler, tmp_path, monkeypatch):
+    monkeypatch.setenv(COMPRESS_ENVIRONMENT_VARIABLE.name, '1')
+    monkeypatch.setenv(SPLIT_STACK_TRACES_ENVIRONMENT_VARIABLE.name, '1')
+
+    run_event_handler()
+
+    assert not (tmp_path / REPORT_CSV_FILENAME).exists()
+    with gzip.open(str(tmp_path / (REPORT_CSV_FILENAME + '.gz')), 'rt') as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    with gzip.open(str(tmp_path / (STACK_TRACES_CSV_FILENAME + '.gz')), 'rt') as stack_traces_f_in:
+        stack_trace_hashes = {row['stack_trace_hash'] for row in DictReader(stack_traces_f_in)}
+
+    # Each sample stack trace in the report references a stored stack trace.
+    assert len(rows) == 3
+    assert {
+        row['sample_stack_trace'][len(STACK_TRACE_REFERENCE_PREFIX):] for row in rows
+    } == stack_trace_hashes
+
+    with gzip.open(str(tmp_path / (REPORT_XML_FILENAME + '.gz')), 'rt') as report_xml_f_in:
+        assert len(eTree.parse(report_xml_f_in).getroot().findall('testcase')) == 2
+
+
+def test_event_handler_writes_shards_if_database_fails(run_event_handler, tmp_path, monkeypatch):
+    # A directory cannot be opened as a database.
+    monkeypatch.setenv(DATABASE_ENVIRONMENT_VARIABLE.name, str(tmp_path))
+
+    def job_ended(package):
+        assert (tmp_path / 'log' / package / SHARD_CSV_FILENAME).exists()
+
+    run_event_handler(job_ended)
+
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        assert len(list(DictReader(report_csv_f_in))) == 3
+
+
+def test_event_handler_replaces_findings_in_database(run_event_handler, tmp_path, monkeypatch):
+    database_path = str(tmp_path / 'findings.db')
+    monkeypatch.setenv(DATABASE_ENVIRONMENT_VARIABLE.name, database_path)
+    with FindingsStore(database_path) as findings_store:
+        findings_store.add_findings(
+            'log', {SanitizerLogParserOutputPrimaryKey('segv', 'data race', 'gone'): 1}
+        )
+
+    extension = run_event_handler()
+    assert extension._findings_store is None
+
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    with FindingsStore(database_path) as findings_store:
+        assert findings_store.get_runs() == ('log',)
+        assert findings_store.get_packages('gone') == ()
+        for row in rows:
+            assert findings_store.get_packages(row['stack_trace_key'], run='log') == \
+                (row['package'],)
+
+
+def test_event_handler_import_is_lazy():
+    # Loading the handler must not import the parser, report generators or their dependencies,
+    # since colcon loads every event handler on every invocation whether it is enabled or not.
+    completed_process = subprocess.run(
+        [
+            sys.executable, '-X', 'importtime', '-c',
+            'from colcon_sanitizer_reports.event_handlers.sanitizer_report import '
+            'SanitizerReportEventHandler; SanitizerReportEventHandler()',
+        ],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+    )
+    imported_modules = {
+        line.rsplit('|', 1)[1].strip()
+        for line in completed_process.stderr.splitlines()
+        if line.startswith('import time:') and line.count('|') == 2
+    }
+    assert 'colcon_sanitizer_reports.event_handlers.sanitizer_report' in imported_modules
+    assert imported_modules.isdisjoint({
+        'colcon_sanitizer_reports.findings_store',
+        'colcon_sanitizer_reports.sanitizer_log_parser',
+        'colcon_sanitizer_reports.stack_trace_clustering',
+        'colcon_sanitizer_reports.xml_output_generator',
+        'sqlite3',
+        'xml.dom.minidom',
+        'xml.etree.ElementTree',
+    })
@@ -0,0 +1,87 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+from itertools import zip_longest
+import json
+import os
+from typing import List
+
+from colcon_sanitizer_reports.command import main
+from colcon_sanitizer_reports.event_log import EVENT_LOG_FILENAME, parse_event_log
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+
+_RESOURCE_NAMES = (
+    'data_race_and_lock_order_inversion_interleaved_output',
+    'detected_memory_leaks_multiple_subsections_direct_and_indirect_leaks',
+    'segv',
+)
+
+
+def _read_input_log_lines(resource_name: str) -> List[str]:
+    input_log_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', resource_name, 'input.log'
+    )
+    with open(input_log_path, 'r') as input_log_f_in:
+        return input_log_f_in.readlines()
+
+
+def _write_event_log(path) -> None:
+    # Output lines of all packages are interleaved line by line, as colcon does for parallel jobs.
+    with open(str(path), 'w') as event_log_f_out:
+        event_log_f_out.write('[0.000000] (-) TimerEvent: {}\n')
+        lines_by_resource_name = [
+            [(resource_name, line) for line in _read_input_log_lines(resource_name)]
+            for resource_name in _RESOURCE_NAMES
+        ]
+        for i, lines in enumerate(zip_longest(*lines_by_resource_name)):
+            for resource_name, line in filter(None, lines):
+                event_type = 'StderrLine' if i % 2 else 'StdoutLine'
+                event_log_f_out.write('[%f] (%s) %s: %s\n' % (
+                    i / 10, resource_name, event_type, {'line': line.encode()}
+                ))
+        event_log_f_out.write(
+            "[9.000000] (segv) JobEnded: {'identifier': 'segv', 'rc': 0}\n"
+        )
+
+
+def test_parse_event_log_matches_package_logs(tmp_path) -> None:
+    _write_event_log(tmp_path / EVENT_LOG_FILENAME)
+    event_log_parser = SanitizerLogParser()
+    parse_event_log(event_log_parser, str(tmp_path / EVENT_LOG_FILENAME))
+
+    for resource_name in _RESOURCE_NAMES:
+        package_log_parser = SanitizerLogParser()
+        package_log_parser.set_package(resource_name)
+        for line in _read_input_log_lines(resource_name):
+            package_log_parser.parse_line(line)
+
+        assert event_log_parser.get_count_by_output_primary_key(package=resource_name) == \
+            package_log_parser.get_count_by_output_primary_key()
+        assert package_log_parser.get_count_by_output_primary_key()
+
+
+def test_command_report(tmp_path) -> None:
+    _write_event_log(tmp_path / EVENT_LOG_FILENAME)
+    assert main(['report', str(tmp_path), '--output-path', str(tmp_path)]) == 0
+
+    with open(str(tmp_path / 'sanitizer_report.csv'), 'r') as report_csv_f_in:
+        packages = {row['package'] for row in DictReader(report_csv_f_in)}
+    assert packages == set(_RESOURCE_NAMES)
+    assert (tmp_path / 'test_results.xml').exists()
+    assert not (tmp_path / 'sanitizer_report.ndjson').exists()
+
+    assert main(['report', str(tmp_path), '--output-path', str(tmp_path), '--ndjson']) == 0
+    with open(str(tmp_path / 'sanitizer_report.ndjson'), 'r') as report_ndjson_f_in:
+        assert {json.loads(line)['package'] for line in report_ndjson_f_in} == packages
@@ -0,0 +1,98 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Iterator
+
+from colcon_sanitizer_reports.command import main
+from colcon_sanitizer_reports.findings_store import FindingsStore
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
+import pytest
+
+_KEY1 = SanitizerLogParserOutputPrimaryKey('package1', 'data race', 'key1')
+_KEY2 = SanitizerLogParserOutputPrimaryKey('package2', 'data race', 'key1')
+_KEY3 = SanitizerLogParserOutputPrimaryKey('package1', 'lock-order-inversion', 'key3')
+_KEY4 = SanitizerLogParserOutputPrimaryKey('package3', 'detected memory leaks', 'key4')
+
+
+@pytest.fixture
+def findings_store(tmp_path) -> Iterator[FindingsStore]:
+    with FindingsStore(str(tmp_path / 'findings.db'), batch_size=2) as findings_store:
+        findings_store.add_findings('run1', {_KEY1: 1, _KEY3: 2})
+        findings_store.add_findings('run2', {_KEY1: 2, _KEY2: 1, _KEY4: 1})
+        findings_store.add_findings('run3', {_KEY1: 3, _KEY3: 1})
+        yield findings_store
+
+
+def test_get_runs(findings_store: FindingsStore) -> None:
+    assert findings_store.get_runs() == ('run1', 'run2', 'run3')
+
+
+def test_add_findings_replaces_count(findings_store: FindingsStore) -> None:
+    findings_store.add_findings('run3', {_KEY1: 5})
+    assert findings_store.get_runs() == ('run1', 'run2', 'run3')
+    assert findings_store.get_count_by_run('key1') == (('run1', 1), ('run2', 3), ('run3', 5))
+
+
+def test_set_package_findings_drops_findings_that_are_gone(
+        findings_store: FindingsStore
+) -> None:
+    findings_store.set_package_findings('run3', 'package1', {_KEY3: 4})
+    assert findings_store.get_count_by_run('key1') == (('run1', 1), ('run2', 3))
+    assert findings_store.get_count_by_run('key3') == (('run1', 2), ('run3', 4))
+
+    findings_store.set_package_findings('run4', 'package2', {})
+    assert findings_store.get_runs() == ('run1', 'run2', 'run3', 'run4')
+
+
+def test_get_first_seen_run(findings_store: FindingsStore) -> None:
+    assert findings_store.get_first_seen_run('key1') == 'run1'
+    assert findings_store.get_first_seen_run('key4') == 'run2'
+    assert findings_store.get_first_seen_run('unknown') is None
+
+
+def test_get_packages(findings_store: FindingsStore) -> None:
+    assert findings_store.get_packages('key1') == ('package1', 'package2')
+    assert findings_store.get_packages('key1', run='run3') == ('package1',)
+
+
+def test_diff(findings_store: FindingsStore) -> None:
+    diff = findings_store.diff('run1', 'run2')
+    assert diff.new == (_KEY2, _KEY4)
+    assert diff.fixed == (_KEY3,)
+    assert diff.regressed == ()
+
+    diff = findings_store.diff('run2', 'run3')
+    assert diff.new == ()
+    assert diff.fixed == (_KEY2, _KEY4)
+    assert diff.regressed == (_KEY3,)
+
+
+def test_diff_unknown_run(findings_store: FindingsStore) -> None:
+    with pytest.raises(KeyError):
+        findings_store.diff('run1', 'unknown')
+
+
+def test_command_diff_runs(findings_store: FindingsStore, tmp_path, capsys) -> None:
+    database_path = str(tmp_path / 'findings.db')
+    assert main(['diff-runs', database_path, 'run2', 'run3']) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        'change,package,error_name,stack_trace_key',
+        'fixed,package2,data race,key1',
+        'fixed,package3,detected memory leaks,key4',
+        'regressed,package1,lock-order-inversion,key3',
+    ]
+
+    assert main(['diff-runs', database_path, 'run1', 'run1']) == 0
+    assert main(['diff-runs', database_path, 'run1', 'unknown']) == 2
+    assert 'unknown' in capsys.readouterr().err
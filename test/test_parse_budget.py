@@ -0,0 +1,182 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+from io import StringIO
+import itertools
+import os
+from types import SimpleNamespace
+from typing import List
+import xml.etree.cElementTree as eTree
+
+from colcon_sanitizer_reports import sanitizer_log_parser
+from colcon_sanitizer_reports._sanitizer_section import SanitizerSection
+from colcon_sanitizer_reports.command import main
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    _get_parse_budget, PACKAGE_MEMORY_BUDGET_ENVIRONMENT_VARIABLE,
+    PACKAGE_TIME_BUDGET_ENVIRONMENT_VARIABLE
+)
+from colcon_sanitizer_reports.parse_budget import (
+    COUNT_ONLY_REASON, CountedSections, MEMORY_BUDGET_REASON, ParseBudget, TIME_BUDGET_REASON
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+import pytest
+
+_LEAKS_RESOURCE_NAME = 'detected_memory_leaks_multiple_subsections_direct_and_indirect_leaks'
+_INTERLEAVED_RESOURCE_NAME = 'data_race_and_lock_order_inversion_interleaved_output'
+
+
+def _read_input_log_lines(resource_name: str) -> List[str]:
+    with open(
+            os.path.join(os.path.dirname(__file__), 'resources', resource_name, 'input.log'), 'r'
+    ) as input_log_f_in:
+        return input_log_f_in.readlines()
+
+
+def _parse(log_parser: SanitizerLogParser, resource_name: str) -> SanitizerLogParser:
+    log_parser.set_package(resource_name)
+    for line in _read_input_log_lines(resource_name):
+        log_parser.parse_line(line)
+    return log_parser
+
+
+def test_count_only_counts_sections_by_error_name() -> None:
+    log_parser = _parse(SanitizerLogParser(count_only=True), _INTERLEAVED_RESOURCE_NAME)
+
+    assert log_parser.get_count_by_output_primary_key() == {}
+    assert set(log_parser.get_counted_sections()) == {
+        CountedSections(_INTERLEAVED_RESOURCE_NAME, 'data race', 1, COUNT_ONLY_REASON),
+        CountedSections(
+            _INTERLEAVED_RESOURCE_NAME, 'lock-order-inversion', 1, COUNT_ONLY_REASON
+        ),
+    }
+
+    # Sections are counted in the order they end.
+    rows = list(DictReader(StringIO(log_parser.get_csv(), newline='')))
+    assert [(row['error_name'], row['stack_trace_key'], row['count']) for row in rows] == [
+        ('lock-order-inversion', '', '1'), ('data race', '', '1')
+    ]
+    assert rows[0]['sample_stack_trace'] == \
+        '1 sections counted without parsing stack traces (counting-only mode)'
+
+    testcase = eTree.fromstring(log_parser.get_xml()).find('testcase')
+    assert testcase is not None
+    errors = testcase.findall('error')
+    assert [error.get('counted_only') for error in errors] == [COUNT_ONLY_REASON] * 2
+
+
+def test_count_only_counts_added_sections() -> None:
+    log_parser = SanitizerLogParser(count_only=True)
+    log_parser.set_package('package')
+    log_parser.add_section(SanitizerSection(lines=(
+        '==5054==ERROR: AddressSanitizer: SEGV on unknown address 0x60304d80008f',
+        '    #0 0x55d in main /ros2/test/test.cpp:10',
+        'SUMMARY: AddressSanitizer: SEGV (/lib/x86_64-linux-gnu/libc.so.6+0x18e5a0)',
+    )))
+
+    assert log_parser.get_counted_sections(package='package') == (
+        CountedSections('package', 'SEGV on unknown address', 1, COUNT_ONLY_REASON),
+    )
+    assert log_parser.get_counted_sections(package='other') == ()
+
+
+def test_time_budget_falls_back_to_counting_only() -> None:
+    log_parser = _parse(
+        SanitizerLogParser(parse_budget=ParseBudget(max_seconds=0)), _LEAKS_RESOURCE_NAME
+    )
+
+    # The first line exceeds the budget, so all seven sections are counted.
+    assert log_parser.get_count_by_output_primary_key() == {}
+    assert log_parser.get_counted_sections() == (
+        CountedSections(_LEAKS_RESOURCE_NAME, 'detected memory leaks', 7, TIME_BUDGET_REASON),
+    )
+
+
+def test_time_budget_includes_matching_log_lines(monkeypatch) -> None:
+    # Each log line takes a second to parse.
+    clock = itertools.count()
+    monkeypatch.setattr(
+        sanitizer_log_parser, 'time', SimpleNamespace(perf_counter=lambda: next(clock))
+    )
+
+    # The budget runs out either before or after the last line of the section, after the lines
+    # before the section and the rest of the section have taken their time.
+    segv_lines = _read_input_log_lines('segv')
+    summary_line_index = next(
+        i for i, line in enumerate(segv_lines) if 'SUMMARY: AddressSanitizer' in line
+    )
+    for max_seconds, counted_sections in (
+            (summary_line_index - 1, (
+                CountedSections('package', 'SEGV on unknown address', 1, TIME_BUDGET_REASON),
+            )),
+            (summary_line_index, ()),
+    ):
+        log_parser = SanitizerLogParser(parse_budget=ParseBudget(max_seconds=max_seconds))
+        log_parser.set_package('package')
+        for line in segv_lines:
+            log_parser.parse_line(line)
+        assert log_parser.get_counted_sections() == counted_sections
+
+
+def test_memory_budget_is_per_package() -> None:
+    log_parser = SanitizerLogParser(parse_budget=ParseBudget(max_bytes=1))
+    _parse(log_parser, _LEAKS_RESOURCE_NAME)
+    _parse(log_parser, 'segv')
+
+    assert log_parser.get_count_by_output_primary_key() == {}
+    assert log_parser.get_counted_sections() == (
+        CountedSections(_LEAKS_RESOURCE_NAME, 'detected memory leaks', 7, MEMORY_BUDGET_REASON),
+        CountedSections('segv', 'SEGV on unknown address', 1, MEMORY_BUDGET_REASON),
+    )
+
+    log_parser = _parse(
+        SanitizerLogParser(parse_budget=ParseBudget(max_bytes=1024 * 1024)), 'segv'
+    )
+    assert log_parser.get_counted_sections() == ()
+    assert log_parser.get_count_by_output_primary_key()
+
+
+def test_memory_budget_releases_ended_sections() -> None:
+    # The budget holds the lines of one segv section at a time, but not of two.
+    segv_lines = [line.rstrip() for line in _read_input_log_lines('segv')]
+    header_line_index = next(
+        i for i, line in enumerate(segv_lines) if 'ERROR: AddressSanitizer' in line
+    )
+    summary_line_index = next(
+        i for i, line in enumerate(segv_lines) if 'SUMMARY: AddressSanitizer' in line
+    )
+    log_parser = SanitizerLogParser(parse_budget=ParseBudget(
+        max_bytes=sum(map(len, segv_lines[header_line_index:summary_line_index + 1]))
+    ))
+    _parse(log_parser, 'segv')
+    _parse(log_parser, 'segv')
+
+    assert log_parser.get_counted_sections() == ()
+    assert log_parser.get_count_by_package_of_error_name('SEGV on unknown address') == \
+        {'segv': 2}
+
+
+@pytest.mark.parametrize('option', ('--package-time-budget', '--package-memory-budget'))
+def test_command_rejects_non_positive_budget(tmp_path, option) -> None:
+    with pytest.raises(SystemExit):
+        main(['report', str(tmp_path), option, '0'])
+
+
+def test_environment_variables_ignore_non_positive_budget(monkeypatch) -> None:
+    monkeypatch.setenv(PACKAGE_TIME_BUDGET_ENVIRONMENT_VARIABLE.name, '0')
+    monkeypatch.setenv(PACKAGE_MEMORY_BUDGET_ENVIRONMENT_VARIABLE.name, '-1')
+    assert _get_parse_budget() is None
+
+    monkeypatch.setenv(PACKAGE_MEMORY_BUDGET_ENVIRONMENT_VARIABLE.name, '2')
+    assert _get_parse_budget() == ParseBudget(max_bytes=2 * 1024 * 1024)
@@ -0,0 +1,123 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+import os
+
+from colcon_sanitizer_reports.command import main
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    _get_report_selection, MIN_COUNT_ENVIRONMENT_VARIABLE, TOP_K_ENVIRONMENT_VARIABLE
+)
+from colcon_sanitizer_reports.report_selection import (
+    ReportRemainder, ReportSelection, select_report
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import (
+    SanitizerLogParser, SanitizerLogParserOutputPrimaryKey
+)
+import pytest
+
+_COUNT_BY_OUTPUT_PRIMARY_KEY = {
+    SanitizerLogParserOutputPrimaryKey('package1', 'data race', 'key1'): 1,
+    SanitizerLogParserOutputPrimaryKey('package1', 'data race', 'key2'): 5,
+    SanitizerLogParserOutputPrimaryKey('package1', 'lock-order-inversion', 'key3'): 2,
+    SanitizerLogParserOutputPrimaryKey('package2', 'data race', 'key4'): 5,
+    SanitizerLogParserOutputPrimaryKey('package2', 'data race', 'key5'): 3,
+    SanitizerLogParserOutputPrimaryKey('package2', 'data race', 'key6'): 1,
+}
+
+
+def _get_stack_trace_keys(output_primary_keys):
+    return [output_primary_key.stack_trace_key for output_primary_key in output_primary_keys]
+
+
+def test_select_top_k() -> None:
+    report = select_report(_COUNT_BY_OUTPUT_PRIMARY_KEY.items(), ReportSelection(top_k=3))
+
+    # Ties are broken in favor of the first seen, and the selection keeps the original order.
+    assert _get_stack_trace_keys(report.output_primary_keys) == ['key2', 'key4', 'key5']
+    assert report.remainders == [
+        ReportRemainder('package1', '', 2, 3),
+        ReportRemainder('package2', 'data race', 1, 1),
+    ]
+
+
+def test_select_top_k_per_package_and_error_name() -> None:
+    report = select_report(
+        _COUNT_BY_OUTPUT_PRIMARY_KEY.items(),
+        ReportSelection(top_k=1, top_k_per=('package', 'error_name')),
+    )
+    assert _get_stack_trace_keys(report.output_primary_keys) == ['key2', 'key3', 'key4']
+    assert report.remainders == [
+        ReportRemainder('package1', 'data race', 1, 1),
+        ReportRemainder('package2', 'data race', 2, 4),
+    ]
+
+
+def test_select_top_k_per_unknown_field() -> None:
+    with pytest.raises(ValueError, match='stack_trace_key'):
+        select_report(
+            _COUNT_BY_OUTPUT_PRIMARY_KEY.items(),
+            ReportSelection(top_k=1, top_k_per=('stack_trace_key',)),
+        )
+
+
+def test_select_min_count() -> None:
+    report = select_report(_COUNT_BY_OUTPUT_PRIMARY_KEY.items(), ReportSelection(min_count=3))
+    assert _get_stack_trace_keys(report.output_primary_keys) == ['key2', 'key4', 'key5']
+    assert report.remainders == [
+        ReportRemainder('package1', '', 2, 3),
+        ReportRemainder('package2', 'data race', 1, 1),
+    ]
+
+    report = select_report(
+        _COUNT_BY_OUTPUT_PRIMARY_KEY.items(), ReportSelection(top_k=0, min_count=100)
+    )
+    assert report.output_primary_keys == []
+    assert sum(remainder.total_count for remainder in report.remainders) == 17
+
+
+def test_parser_report_has_remainder_line() -> None:
+    log_parser = SanitizerLogParser(report_selection=ReportSelection(top_k=1))
+    log_parser.set_package('data_race_different_keys')
+    with open(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', 'data_race_different_keys',
+        'input.log'
+    ), 'r') as input_log_f_in:
+        for line in input_log_f_in:
+            log_parser.parse_line(line)
+
+    rows = list(DictReader(log_parser.get_csv().splitlines()))
+    assert len(rows) == 2
+    assert rows[0]['stack_trace_key'] != ''
+    assert rows[1]['stack_trace_key'] == ''
+    assert rows[1]['package'] == 'data_race_different_keys'
+    assert rows[1]['sample_stack_trace'].startswith('1 more stack trace keys')
+
+    # Counts are unaffected by the selection, so the findings store still gets every finding.
+    assert len(log_parser.get_count_by_output_primary_key()) == 2
+
+
+@pytest.mark.parametrize('option', ('--top-k', '--min-count'))
+def test_command_rejects_non_positive_selection(tmp_path, option) -> None:
+    with pytest.raises(SystemExit):
+        main(['report', str(tmp_path), option, '0'])
+
+
+def test_environment_variables_ignore_non_positive_selection(monkeypatch) -> None:
+    monkeypatch.setenv(TOP_K_ENVIRONMENT_VARIABLE.name, '0')
+    monkeypatch.setenv(MIN_COUNT_ENVIRONMENT_VARIABLE.name, '-1')
+    assert _get_report_selection() is None
+
+    monkeypatch.setenv(TOP_K_ENVIRONMENT_VARIABLE.name, '2')
+    assert _get_report_selection() == ReportSelection(top_k=2)
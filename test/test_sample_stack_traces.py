@@ -0,0 +1,61 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+import gzip
+from io import StringIO
+
+from colcon_sanitizer_reports.sample_stack_traces import (
+    COMPRESSED_SUFFIX, open_report_output, SampleStackTraceFormat, STACK_TRACE_REFERENCE_PREFIX,
+    StackTraceStore
+)
+
+_LINES = (
+    '    #0 0x55d in rclcpp::Node::get_name() const /ros2/rclcpp/src/node.cpp:10',
+    '    #1 0x55e in rclcpp::spin() /ros2/rclcpp/src/executor.cpp:20',
+    '    #2 0x55f in main /ros2/test/test.cpp:30',
+)
+
+
+def test_max_frames_caps_embedded_stack_traces() -> None:
+    assert SampleStackTraceFormat().get_text(_LINES) == '\n'.join(_LINES)
+    assert SampleStackTraceFormat(max_frames=3).get_text(_LINES) == '\n'.join(_LINES)
+    assert SampleStackTraceFormat(max_frames=1).get_text(_LINES) == \
+        _LINES[0] + '\n    ... 2 more frames'
+
+
+def test_split_mode_stores_each_stack_trace_once() -> None:
+    stack_trace_store = StackTraceStore()
+    sample_stack_trace_format = SampleStackTraceFormat(max_frames=1, store=stack_trace_store)
+
+    reference = sample_stack_trace_format.get_text(_LINES)
+    assert reference.startswith(STACK_TRACE_REFERENCE_PREFIX)
+    assert sample_stack_trace_format.get_text(_LINES) == reference
+    assert sample_stack_trace_format.get_text(_LINES[1:]) != reference
+    assert len(stack_trace_store) == 2
+
+    # The store holds the full stack trace, whatever the cap of embedded stack traces.
+    stack_trace_hash = reference[len(STACK_TRACE_REFERENCE_PREFIX):]
+    assert stack_trace_store.get(stack_trace_hash) == '\n'.join(_LINES)
+    rows = list(DictReader(StringIO(stack_trace_store.get_csv(), newline='')))
+    assert rows[0] == {'stack_trace_hash': stack_trace_hash, 'stack_trace': '\n'.join(_LINES)}
+
+
+def test_open_report_output_compresses(tmp_path) -> None:
+    path = str(tmp_path / 'report.csv')
+    with open_report_output(path, compress=True) as report_f_out:
+        report_f_out.write('a,b\r\n1,2\r\n')
+
+    with gzip.open(path + COMPRESSED_SUFFIX, 'rt', newline='') as report_f_in:
+        assert report_f_in.read() == 'a,b\r\n1,2\r\n'
@@ -0,0 +1,131 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+from typing import List
+
+from colcon_sanitizer_reports.sanitizer_log_files import (
+    add_sanitizer_log_files, count_sanitizer_log_file, find_sanitizer_log_files,
+    parse_sanitizer_log_file, SanitizerLogFilePool
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+import pytest
+
+# Resources whose only logging prefix is the test number added by ctest.
+_RESOURCE_NAMES = (
+    'detected_memory_leaks_multiple_subsections_direct_and_indirect_leaks',
+    'lock_order_inversion_same_key',
+    'segv',
+)
+
+_FIND_CTEST_PREFIX_SUB_REGEX = re.compile(r'^\d+: ')
+
+
+def _read_input_log_lines(resource_name: str) -> List[str]:
+    with open(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', resource_name, 'input.log'
+    ), 'r') as input_log_f_in:
+        return input_log_f_in.readlines()
+
+
+@pytest.fixture
+def log_files_pattern(tmp_path) -> str:
+    # Each resource is written as the log file of one process, as with log_path=.../asan.
+    for pid, resource_name in enumerate(_RESOURCE_NAMES, start=100):
+        (tmp_path / 'build' / 'package1' / 'test').mkdir(parents=True, exist_ok=True)
+        with open(str(tmp_path / 'build' / 'package1' / 'test' / 'asan.{pid}'.format(**locals())),
+                  'w') as log_f_out:
+            for line in _read_input_log_lines(resource_name):
+                log_f_out.write(_FIND_CTEST_PREFIX_SUB_REGEX.sub('', line))
+
+    (tmp_path / 'build' / 'package1' / 'test' / 'asan.txt').touch()
+    return str(tmp_path / 'build' / '{package}' / '**' / 'asan')
+
+
+def test_find_sanitizer_log_files(log_files_pattern) -> None:
+    paths = find_sanitizer_log_files(log_files_pattern, 'package1')
+    assert [os.path.basename(path) for path in paths] == ['asan.100', 'asan.101', 'asan.102']
+    assert find_sanitizer_log_files(log_files_pattern, 'package2') == []
+
+
+def test_parse_sanitizer_log_file(log_files_pattern) -> None:
+    sections = parse_sanitizer_log_file(find_sanitizer_log_files(log_files_pattern, 'package1')[2])
+    assert [section.error_name for section in sections] == ['SEGV on unknown address']
+
+
+@pytest.mark.parametrize('max_workers', (1, 2))
+def test_add_sanitizer_log_files_matches_log_lines(log_files_pattern, max_workers) -> None:
+    log_parser = SanitizerLogParser()
+    with SanitizerLogFilePool(max_workers=max_workers, min_parallel_size=0) as pool:
+        add_sanitizer_log_files(
+            log_parser, 'package1', find_sanitizer_log_files(log_files_pattern, 'package1'),
+            pool=pool,
+        )
+
+    expected_log_parser = SanitizerLogParser()
+    expected_log_parser.set_package('package1')
+    for resource_name in _RESOURCE_NAMES:
+        for line in _read_input_log_lines(resource_name):
+            expected_log_parser.parse_line(line)
+
+    assert log_parser.get_csv() == expected_log_parser.get_csv()
+
+
+def test_count_sanitizer_log_file(log_files_pattern) -> None:
+    assert count_sanitizer_log_file(find_sanitizer_log_files(log_files_pattern, 'package1')[2]) == \
+        ('SEGV on unknown address',)
+
+
+@pytest.mark.parametrize('max_workers', (1, 2))
+def test_add_sanitizer_log_files_only_counts(log_files_pattern, max_workers) -> None:
+    log_parser = SanitizerLogParser(count_only=True)
+    with SanitizerLogFilePool(max_workers=max_workers, min_parallel_size=0) as pool:
+        add_sanitizer_log_files(
+            log_parser, 'package1', find_sanitizer_log_files(log_files_pattern, 'package1'),
+            pool=pool,
+        )
+
+    expected_log_parser = SanitizerLogParser(count_only=True)
+    expected_log_parser.set_package('package1')
+    for resource_name in _RESOURCE_NAMES:
+        for line in _read_input_log_lines(resource_name):
+            expected_log_parser.parse_line(line)
+
+    assert log_parser.get_counted_sections() == expected_log_parser.get_counted_sections()
+    assert log_parser.get_count_by_output_primary_key() == {}
+
+
+def test_sanitizer_log_file_pool_is_started_once(log_files_pattern) -> None:
+    paths = find_sanitizer_log_files(log_files_pattern, 'package1')
+    with SanitizerLogFilePool(max_workers=2, min_parallel_size=0) as pool:
+        add_sanitizer_log_files(SanitizerLogParser(), 'package1', paths, pool=pool)
+        executor = pool._executor
+        assert executor is not None
+
+        add_sanitizer_log_files(SanitizerLogParser(), 'package1', paths, pool=pool)
+        assert pool._executor is executor
+    assert pool._executor is None
+
+
+def test_sanitizer_log_file_pool_parses_small_files_serially(log_files_pattern) -> None:
+    log_parser = SanitizerLogParser()
+    with SanitizerLogFilePool(max_workers=2) as pool:
+        add_sanitizer_log_files(
+            log_parser, 'package1', find_sanitizer_log_files(log_files_pattern, 'package1'),
+            pool=pool,
+        )
+        assert pool._executor is None
+    assert log_parser.get_count_by_package_of_error_name('SEGV on unknown address') == \
+        {'package1': 1}
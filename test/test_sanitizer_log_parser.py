@@ -13,10 +13,13 @@
 # limitations under the License.
 
 from csv import DictReader
+import json
 import os
 from typing import Dict, Optional
 import xml.etree.cElementTree as eTree
 
+from colcon_sanitizer_reports.report_selection import ReportSelection
+from colcon_sanitizer_reports.sample_stack_traces import SampleStackTraceFormat
 from colcon_sanitizer_reports.sanitizer_log_parser import (
     SanitizerLogParser, SanitizerLogParserOutputPrimaryKey
 )
@@ -165,3 +168,134 @@ def test_xml_has_expected_errors(sanitizer_log_parser_fixture) -> None:
 
     if (case_actual is not None) and (case_reported is not None):
         assert len(case_reported.findall('error')) == len(case_actual.findall('error'))
+
+
+def test_report_of_one_package() -> None:
+    parser = SanitizerLogParser()
+    for resource_name in _RESOURCE_NAMES:
+        parser.set_package(resource_name)
+        with open(SanitizerLogParserFixture(resource_name).input_log_path, 'r') as input_log_f_in:
+            for line in input_log_f_in:
+                parser.parse_line(line)
+
+    for resource_name in _RESOURCE_NAMES:
+        expected_count_by_output_primary_key = \
+            SanitizerLogParserFixture(resource_name).sanitizer_log_parser\
+            .get_count_by_output_primary_key()
+        assert parser.get_count_by_output_primary_key(package=resource_name) == \
+            expected_count_by_output_primary_key
+        assert len(list(DictReader(parser.get_csv(package=resource_name).split('\n')))) == \
+            len(expected_count_by_output_primary_key)
+        assert len(eTree.fromstring(parser.get_xml(package=resource_name)).findall('testcase')) == \
+            (1 if expected_count_by_output_primary_key else 0)
+
+    assert parser.get_count_by_output_primary_key(package='unknown') == {}
+
+
+def test_indexes_and_key_csv_aggregate_across_packages() -> None:
+    parser = SanitizerLogParser()
+    for package in ('package_a', 'package_b'):
+        parser.set_package(package)
+        with open(
+                SanitizerLogParserFixture('lock_order_inversion_same_key').input_log_path, 'r'
+        ) as input_log_f_in:
+            for line in input_log_f_in:
+                parser.parse_line(line)
+
+    count_by_output_primary_key = parser.get_count_by_output_primary_key()
+    for output_primary_key, count in count_by_output_primary_key.items():
+        assert parser.get_count_by_package_of_stack_trace_key(
+            output_primary_key.stack_trace_key
+        )[output_primary_key.package] == count
+    assert parser.get_count_by_package_of_error_name('lock-order-inversion') == {
+        'package_a': sum(count_by_output_primary_key.values()) // 2,
+        'package_b': sum(count_by_output_primary_key.values()) // 2,
+    }
+    assert parser.get_count_by_package_of_stack_trace_key('unknown') == {}
+    assert parser.get_count_by_package_of_error_name('unknown') == {}
+
+    rows = list(DictReader(parser.get_key_csv().split('\n')))
+    assert len(rows) == len(count_by_output_primary_key) // 2
+    for row in rows:
+        assert row['package_count'] == '2'
+        assert row['packages'] == 'package_a;package_b'
+        assert int(row['count']) == sum(
+            parser.get_count_by_package_of_stack_trace_key(row['stack_trace_key']).values()
+        )
+    assert [int(row['count']) for row in rows] == \
+        sorted((int(row['count']) for row in rows), reverse=True)
+
+
+def test_ndjson_has_one_record_per_line() -> None:
+    parser = SanitizerLogParser(
+        report_selection=ReportSelection(top_k=1, top_k_per=('package',)),
+        sample_stack_trace_format=SampleStackTraceFormat(max_frames=2),
+    )
+    parser.set_package('data_race_different_keys')
+    with open(
+            SanitizerLogParserFixture('data_race_different_keys').input_log_path, 'r'
+    ) as input_log_f_in:
+        for line in input_log_f_in:
+            parser.parse_line(line)
+
+    ndjson = parser.get_ndjson(run_metadata={'name': 'run_1'})
+    assert ndjson.endswith('\n')
+    records = [json.loads(line) for line in ndjson.splitlines()]
+    assert [record['kind'] for record in records] == ['finding', 'remainder']
+    for record in records:
+        assert record['run'] == {'name': 'run_1'}
+        assert record['package'] == 'data_race_different_keys'
+
+    finding, remainder = records
+    output_primary_key = SanitizerLogParserOutputPrimaryKey(
+        package=finding['package'], error_name=finding['error_name'],
+        stack_trace_key=finding['stack_trace_key'],
+    )
+    assert finding['count'] == parser.get_count_by_output_primary_key()[output_primary_key]
+    assert finding['fingerprint'] == '{:016x}'.format(output_primary_key.fingerprint)
+    assert len(finding['frames']) == 2 < finding['frame_count']
+    assert [frame['index'] for frame in finding['frames']] == [0, 1]
+    assert all(
+        set(frame) == {'index', 'address', 'function', 'location', 'module', 'offset'} and
+        frame['function']
+        for frame in finding['frames']
+    )
+    assert remainder['stack_trace_key'] == '' and remainder['frames'] == []
+    assert remainder['description']
+
+    assert 'run' not in json.loads(parser.get_ndjson().splitlines()[0])
+    assert parser.get_ndjson(package='unknown') == ''
+
+
+def test_reset_package_forgets_its_findings() -> None:
+    parser = SanitizerLogParser()
+    for package in ('package_a', 'package_b'):
+        parser.set_package(package)
+        with open(
+                SanitizerLogParserFixture('lock_order_inversion_same_key').input_log_path, 'r'
+        ) as input_log_f_in:
+            lines = input_log_f_in.readlines()
+        for line in lines:
+            parser.parse_line(line)
+
+    # A partially-gathered section of the reset package is dropped too.
+    for line in lines[:len(lines) // 2]:
+        parser.parse_line(line)
+    count_by_output_primary_key = dict(parser.get_count_by_output_primary_key(package='package_a'))
+
+    parser.reset_package('package_b')
+    assert parser.get_count_by_output_primary_key(package='package_b') == {}
+    assert set(parser.get_count_by_package_of_error_name('lock-order-inversion')) == {'package_a'}
+    for output_primary_key in count_by_output_primary_key:
+        assert set(parser.get_count_by_package_of_stack_trace_key(
+            output_primary_key.stack_trace_key
+        )) == {'package_a'}
+    assert {row['packages'] for row in DictReader(parser.get_key_csv().split('\n'))} == \
+        {'package_a'}
+
+    for line in lines:
+        parser.parse_line(line)
+    assert parser.get_count_by_output_primary_key(package='package_b') == {
+        output_primary_key._replace(package='package_b'): count
+        for output_primary_key, count in count_by_output_primary_key.items()
+    }
@@ -0,0 +1,85 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+import os
+from typing import List, Sequence
+
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+from colcon_sanitizer_reports.stack_trace_clustering import StackTraceClusters
+
+
+def _make_stack_trace_lines(function_names: Sequence[str], address: int) -> List[str]:
+    return [
+        '    #{i} 0x{address:x} in {function_name} /ros2/src/file.cpp:{line} (lib.so+0x{i:x})'
+        .format(i=i, address=address + i, function_name=function_name, line=address % 1000 + i)
+        for i, function_name in enumerate(function_names)
+    ]
+
+
+_FUNCTION_NAMES = ['function{i}'.format(i=i) for i in range(20)]
+_OTHER_FUNCTION_NAMES = ['other_function{i}'.format(i=i) for i in range(20)]
+
+
+def test_same_call_path_is_clustered() -> None:
+    clusters: StackTraceClusters[str] = StackTraceClusters()
+    clusters.add('a', _make_stack_trace_lines(_FUNCTION_NAMES, 0x7f00))
+    clusters.add('b', _make_stack_trace_lines(_FUNCTION_NAMES, 0x5500))
+    assert clusters.get_cluster_id('a') == 'a'
+    assert clusters.get_cluster_id('b') == 'a'
+
+
+def test_similar_call_paths_are_clustered() -> None:
+    clusters: StackTraceClusters[str] = StackTraceClusters()
+    clusters.add('a', _make_stack_trace_lines(_FUNCTION_NAMES, 0x7f00))
+    clusters.add('b', _make_stack_trace_lines(['caller'] + _FUNCTION_NAMES[1:], 0x7f00))
+    clusters.add('c', _make_stack_trace_lines(_OTHER_FUNCTION_NAMES, 0x7f00))
+    assert clusters.get_cluster_id('b') == 'a'
+    assert clusters.get_cluster_id('c') == 'c'
+
+
+def test_merged_clusters_keep_oldest_representative() -> None:
+    clusters: StackTraceClusters[str] = StackTraceClusters()
+    clusters.add('a', _make_stack_trace_lines(_FUNCTION_NAMES[:4], 0x7f00))
+    clusters.add('b', _make_stack_trace_lines(_OTHER_FUNCTION_NAMES[:4], 0x7f00))
+    assert clusters.get_cluster_id('b') == 'b'
+
+    # A stack trace similar to both merges their clusters.
+    clusters.add(
+        'c', _make_stack_trace_lines(_FUNCTION_NAMES[:4] + _OTHER_FUNCTION_NAMES[:4], 0x7f00)
+    )
+    assert clusters.get_cluster_id('b') == 'a'
+    assert clusters.get_cluster_id('c') == 'a'
+
+    # Adding the same item again does not change clusters.
+    clusters.add('b', _make_stack_trace_lines(_OTHER_FUNCTION_NAMES, 0x5500))
+    assert clusters.get_cluster_id('b') == 'a'
+
+
+def test_parser_reports_cluster_id() -> None:
+    parser = SanitizerLogParser(cluster_stack_traces=True)
+    parser.set_package('data_race_different_keys')
+    input_log_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', 'data_race_different_keys',
+        'input.log'
+    )
+    with open(input_log_path, 'r') as input_log_f_in:
+        for line in input_log_f_in:
+            parser.parse_line(line)
+
+    rows = list(DictReader(parser.get_csv().split('\n')))
+    assert len(rows) == 2
+    assert all(len(row['cluster_id']) == 16 for row in rows)
+    assert 'cluster_id' not in SanitizerLogParser().get_csv()
+    assert 'cluster=' in parser.get_xml()
@@ -0,0 +1,95 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from colcon_sanitizer_reports import stack_trace_extractors
+from colcon_sanitizer_reports._sanitizer_section import SanitizerSection
+from colcon_sanitizer_reports.stack_trace_extractors import (
+    get_stack_trace_extractor, StackTraceExtractor
+)
+from mock import patch
+
+_HEAP_USE_AFTER_FREE_LINES = (
+    '==4242==ERROR: AddressSanitizer: heap-use-after-free on address 0x602000000010 at pc 0x5 bp '
+    '0x7ffd sp 0x7ffd',
+    'READ of size 4 at 0x602000000010 thread T0',
+    '    #0 0x55d in rclcpp::Node::get_name() const /ros2/rclcpp/src/node.cpp:10',
+    '    #1 0x55e in main /ros2/test/test.cpp:20',
+    '',
+    '0x602000000010 is located 0 bytes inside of 4-byte region [0x602000000010,0x602000000014)',
+    'freed by thread T0 here:',
+    '    #0 0x7f1 in operator delete(void*) (/usr/lib/x86_64-linux-gnu/libasan.so.4+0xe1b6d)',
+    '    #1 0x55f in rclcpp::Node::~Node() /ros2/rclcpp/src/node.cpp:30',
+    '',
+    'previously allocated by thread T0 here:',
+    '    #0 0x7f2 in operator new(unsigned long) (/usr/lib/x86_64-linux-gnu/libasan.so.4+0xe0d6d)',
+    '    #1 0x560 in rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40',
+    '',
+    'SUMMARY: AddressSanitizer: heap-use-after-free /ros2/rclcpp/src/node.cpp:10 in get_name',
+)
+
+
+def test_heap_use_after_free_access_and_free_are_relevant() -> None:
+    section = SanitizerSection(lines=_HEAP_USE_AFTER_FREE_LINES)
+    assert section.error_name == 'heap-use-after-free on address'
+    assert [
+        stack_trace.key
+        for part in section.parts for stack_trace in part.relevant_stack_traces
+    ] == [
+        'rclcpp::Node::get_name() const /ros2/rclcpp/src/node.cpp:10',
+        'rclcpp::Node::~Node() /ros2/rclcpp/src/node.cpp:30',
+    ]
+
+
+def test_extract_stops_after_one_stack_trace_per_header_pattern() -> None:
+    stack_trace_extractor = StackTraceExtractor('error', ('^Header$', '^Other header$'))
+    assert stack_trace_extractor.extract((
+        'Other header',
+        '    #0 0x1 in a /ros2/a.cpp',
+        'Not a header',
+        '    #0 0x2 in b /ros2/b.cpp',
+        'Header',
+        '    #0 0x3 in c /ros2/c.cpp',
+        '    #1 0x4 in d /ros2/d.cpp',
+        'Header',
+        '    #0 0x5 in e /ros2/e.cpp',
+    )) == [
+        ('    #0 0x1 in a /ros2/a.cpp',),
+        ('    #0 0x3 in c /ros2/c.cpp', '    #1 0x4 in d /ros2/d.cpp'),
+    ]
+
+
+def test_unknown_error_names_use_default_extractor_without_registering() -> None:
+    get_stack_trace_extractor('data race')
+    stack_trace_extractor_by_error_name = (
+        stack_trace_extractors._stack_trace_extractor_by_error_name
+    )
+    assert stack_trace_extractor_by_error_name is not None
+    error_names = set(stack_trace_extractor_by_error_name)
+
+    stack_trace_extractor = get_stack_trace_extractor('unknown error name')
+    assert stack_trace_extractor.header_patterns == (r'^.*$',)
+    assert get_stack_trace_extractor('another unknown error name') is stack_trace_extractor
+    assert set(stack_trace_extractor_by_error_name) == error_names
+
+
+def test_extractors_from_entry_points(monkeypatch) -> None:
+    custom_stack_trace_extractor = StackTraceExtractor('data race', ('^Custom$',))
+    monkeypatch.setattr(stack_trace_extractors, '_stack_trace_extractor_by_error_name', None)
+    with patch(
+        'colcon_sanitizer_reports.stack_trace_extractors.load_extension_points',
+        return_value={'custom': custom_stack_trace_extractor, 'invalid': object()},
+    ):
+        assert get_stack_trace_extractor('data race') is custom_stack_trace_extractor
+        assert get_stack_trace_extractor('detected memory leaks').error_name == \
+            'detected memory leaks'
@@ -0,0 +1,112 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from colcon_sanitizer_reports._sanitizer_section import SanitizerSection
+from colcon_sanitizer_reports.stack_trace_keys import (
+    DEFAULT_STACK_TRACE_KEY_FINDER, parse_stack_trace_frame, StackTraceFrame, StackTraceKeyFinder
+)
+import pytest
+
+_STACK_TRACE_LINES = (
+    '    #0 0x7f1 in operator new(unsigned long) (/usr/lib/x86_64-linux-gnu/libasan.so.4+0xe0d6d)',
+    '    #1 0x55d in Foo::bar() /opt/ws/src/foo/foo.cpp:10',
+    '    #2 0x55e in rclcpp::spin() /ros2/rclcpp/src/executor.cpp:0x20',
+    '    #3 0x55f in main /ros2/test/test.cpp:30',
+)
+
+_THIRD_PARTY_STACK_TRACE_LINES = (
+    '    #0 0x7f1 in eprosima::fastrtps::Participant::run() (/usr/lib/libfastrtps.so+0x1a2b)',
+    '    #1 0x7f2 in start_thread (/lib/x86_64-linux-gnu/libpthread.so.0+0x76db)',
+)
+
+
+def test_default_key_is_first_ros2_frame() -> None:
+    assert DEFAULT_STACK_TRACE_KEY_FINDER.get_key(_STACK_TRACE_LINES) == (
+        'rclcpp::spin() /ros2/rclcpp/src/executor.cpp:0xX'
+    )
+
+
+def test_key_is_first_frame_under_any_own_code_root() -> None:
+    key_finder = StackTraceKeyFinder(own_code_roots=('/ros2', '/opt/ws/src'))
+    assert key_finder.get_key(_STACK_TRACE_LINES) == 'Foo::bar() /opt/ws/src/foo/foo.cpp:10'
+
+
+def test_key_joins_frame_count_own_code_frames() -> None:
+    key_finder = StackTraceKeyFinder(frame_count=2)
+    assert key_finder.get_key(_STACK_TRACE_LINES) == (
+        'rclcpp::spin() /ros2/rclcpp/src/executor.cpp:0xX | main /ros2/test/test.cpp:30'
+    )
+
+    # Stack traces with fewer own code frames have shorter keys.
+    assert StackTraceKeyFinder(frame_count=5).get_key(_STACK_TRACE_LINES[:3]) == (
+        'rclcpp::spin() /ros2/rclcpp/src/executor.cpp:0xX'
+    )
+
+
+@pytest.mark.parametrize('own_code_roots, frame_count', (((), 1), (('',), 1), (('/ros2',), 0)))
+def test_key_finder_rejects_invalid_arguments(own_code_roots, frame_count) -> None:
+    with pytest.raises(ValueError):
+        StackTraceKeyFinder(own_code_roots=own_code_roots, frame_count=frame_count)
+
+
+def test_key_without_own_code_frames_is_top_frame() -> None:
+    assert DEFAULT_STACK_TRACE_KEY_FINDER.get_key(_THIRD_PARTY_STACK_TRACE_LINES) == (
+        'eprosima::fastrtps::Participant::run() (/usr/lib/libfastrtps.so+0xX)'
+    )
+
+
+def test_section_keys_stack_traces_with_key_finder() -> None:
+    section = SanitizerSection(
+        lines=(
+            '==5584==ERROR: LeakSanitizer: detected memory leaks',
+            '',
+            'Direct leak of 64 byte(s) in 1 object(s) allocated from:',
+            *_THIRD_PARTY_STACK_TRACE_LINES,
+            '',
+            'SUMMARY: AddressSanitizer: 64 byte(s) leaked in 1 allocation(s).',
+        ),
+        key_finder=StackTraceKeyFinder(own_code_roots=('/lib/x86_64-linux-gnu/',)),
+    )
+    assert [
+        stack_trace.key
+        for part in section.parts for stack_trace in part.relevant_stack_traces
+    ] == ['start_thread (/lib/x86_64-linux-gnu/libpthread.so.0+0xX)']
+
+
+def test_parse_stack_trace_frame() -> None:
+    assert parse_stack_trace_frame(_STACK_TRACE_LINES[0]) == StackTraceFrame(
+        number=0, address='0x7f1', function='operator new(unsigned long)', location=None,
+        module='/usr/lib/x86_64-linux-gnu/libasan.so.4', offset='0xe0d6d',
+    )
+    assert parse_stack_trace_frame(_STACK_TRACE_LINES[1]) == StackTraceFrame(
+        number=1, address='0x55d', function='Foo::bar()', location='/opt/ws/src/foo/foo.cpp:10',
+        module=None, offset=None,
+    )
+    assert parse_stack_trace_frame(
+        '    #2 __gthread_mutex_lock /usr/include/gthr-default.h:748:5 (libfastrtps.so.1+0x16fe)'
+    ) == StackTraceFrame(
+        number=2, address=None, function='__gthread_mutex_lock',
+        location='/usr/include/gthr-default.h:748:5', module='libfastrtps.so.1', offset='0x16fe',
+    )
+    assert parse_stack_trace_frame('    #3 pthread_create <null> (libtsan.so.0+0x2bcfe)') == \
+        StackTraceFrame(
+            number=3, address=None, function='pthread_create', location=None,
+            module='libtsan.so.0', offset='0x2bcfe',
+        )
+    assert parse_stack_trace_frame('    #4 0x7f2  (/opt/lib/libfoo.so+0x1234) (BuildId: ab12)') == \
+        StackTraceFrame(
+            number=4, address='0x7f2', function=None, location=None, module='/opt/lib/libfoo.so',
+            offset='0x1234',
+        )
+    assert parse_stack_trace_frame('SUMMARY: AddressSanitizer: SEGV') is None
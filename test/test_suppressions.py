@@ -0,0 +1,139 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+import os
+
+from colcon_sanitizer_reports._sanitizer_section_part import SanitizerSectionPart
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    _get_suppressions, SUPPRESSIONS_ENVIRONMENT_VARIABLE
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+from colcon_sanitizer_reports.suppressions import Suppression, Suppressions
+import pytest
+
+_STACK_TRACE_LINES = (
+    '    #0 0x7f619e2555a0 in memcpy (/lib/x86_64-linux-gnu/libc.so.6+0x18e5a0)',
+    '    #1 0x7f619ea6d6e5 in rcutils_logging_get_logger_effective_level '
+    '(/ros2_install/rcutils/lib/librcutils.so+0x146e5)',
+    '    #2 0x5628c0f80cd9 in _start (/ros2_build/rclcpp_action/test_client+0x4acd9)',
+)
+
+_SUPPRESSIONS = Suppressions([
+    '# Known issues',
+    '',
+    'race:libfastrtps.so',
+    'leak:^operator new',
+    '*:rcutils_logging_*_level',
+    'SEGV on unknown address:test_client+0x4acd9)$',
+    'signal:^handler',
+])
+
+
+def _read_input_log_lines(resource_name: str):
+    with open(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', resource_name, 'input.log'
+    ), 'r') as input_log_f_in:
+        return input_log_f_in.readlines()
+
+
+def test_parse_suppressions() -> None:
+    assert len(_SUPPRESSIONS) == 6
+    with pytest.raises(ValueError, match='line 2: no type'):
+        Suppressions(['# comment', 'no type'])
+    with pytest.raises(ValueError, match='line 1'):
+        Suppressions(['race: '])
+    for line in ('race_top:rclcpp', 'called_from_lib:libfastrtps.so', 'mutex:rclcpp', ':rclcpp'):
+        with pytest.raises(ValueError, match='line 1'):
+            Suppressions([line])
+
+
+@pytest.mark.parametrize('error_name,stack_trace_lines,expected_suppression', (
+    ('data race', _STACK_TRACE_LINES, Suppression('*', 'rcutils_logging_*_level')),
+    ('SEGV on unknown address', _STACK_TRACE_LINES[2:],
+     Suppression('SEGV on unknown address', 'test_client+0x4acd9)$')),
+    ('SEGV on unknown address', _STACK_TRACE_LINES[:1], None),
+    ('detected memory leaks', ('    #0 0x7f in operator new(unsigned long) (libasan.so)',),
+     Suppression('detected memory leaks', '^operator new')),
+    ('detected memory leaks', ('    #0 0x7f in foo() operator new (libasan.so)',), None),
+    ('signal handler spoils errno', ('    #0 handler(int) /ros2/x.cpp:5 (test+0x4a)',),
+     Suppression('signal handler spoils errno', '^handler')),
+))
+def test_match(error_name, stack_trace_lines, expected_suppression) -> None:
+    assert _SUPPRESSIONS.match(error_name, stack_trace_lines) == expected_suppression
+
+
+def test_suppressed_stack_traces_are_not_materialized() -> None:
+    # The stack trace has no ros2 frame, so a SanitizerSectionPartStackTrace could not be created.
+    part = SanitizerSectionPart(error_name='detected memory leaks', lines=(
+        'Direct leak of 1 byte(s) in 1 object(s) allocated from:',
+        '    #0 0x7f in operator new(unsigned long) (/usr/lib/x86_64-linux-gnu/libasan.so)',
+        '    #1 0x7f in main (/opt/third_party/test)',
+    ), suppressions=_SUPPRESSIONS)
+    assert part.relevant_stack_traces == ()
+    assert part.matched_suppressions == (Suppression('detected memory leaks', '^operator new'),)
+
+
+def test_match_in_any_stack_trace_suppresses_section_part() -> None:
+    # The write is in own code, but the previous write is in a suppressed library.
+    part = SanitizerSectionPart(error_name='data race', lines=(
+        'WARNING: ThreadSanitizer: data race (pid=26543)',
+        '  Write of size 8 at 0x7b0c00001234 by thread T1:',
+        '    #0 rclcpp::Node::spin() /ros2/rclcpp/src/node.cpp:40 (librclcpp.so+0x1a2b)',
+        '',
+        '  Previous write of size 8 at 0x7b0c00001234 by main thread:',
+        '    #0 eprosima::fastrtps::Participant::run() (libfastrtps.so+0x1a2b)',
+        '',
+        '  Thread T1 (tid=26545, running) created by main thread at:',
+        '    #0 pthread_create <null> (libtsan.so.0+0x2bcfe)',
+    ), suppressions=_SUPPRESSIONS)
+    assert part.relevant_stack_traces == ()
+    assert part.matched_suppressions == (Suppression('data race', 'libfastrtps.so'),) * 2
+
+    # Header lines are not frames, so they do not match suppressions.
+    part = SanitizerSectionPart(error_name='data race', lines=(
+        'WARNING: ThreadSanitizer: data race (pid=26543)',
+        '  Write of size 8 at 0x7b0c00001234 by thread T1 in libfastrtps.so:',
+        '    #0 rclcpp::Node::spin() /ros2/rclcpp/src/node.cpp:40 (librclcpp.so+0x1a2b)',
+    ), suppressions=_SUPPRESSIONS)
+    assert len(part.relevant_stack_traces) == 1
+    assert part.matched_suppressions == ()
+
+
+def test_parser_reports_suppression_counts() -> None:
+    log_parser = SanitizerLogParser(suppressions=_SUPPRESSIONS)
+    for resource_name in ('data_race_different_keys', 'segv'):
+        log_parser.set_package(resource_name)
+        for line in _read_input_log_lines(resource_name):
+            log_parser.parse_line(line)
+
+    assert log_parser.get_count_by_output_primary_key() == {}
+    assert list(DictReader(log_parser.get_suppressions_csv().splitlines())) == [
+        {'package': 'data_race_different_keys', 'error_name': 'data race',
+         'pattern': 'libfastrtps.so', 'count': '2'},
+        {'package': 'segv', 'error_name': '*', 'pattern': 'rcutils_logging_*_level',
+         'count': '1'},
+    ]
+    assert len(list(DictReader(log_parser.get_suppressions_csv(package='segv').splitlines()))) \
+        == 1
+
+
+def test_event_handler_ignores_invalid_suppressions_file(tmp_path, monkeypatch) -> None:
+    (tmp_path / 'suppressions.txt').write_text('race:rclcpp\nno type\n')
+    monkeypatch.setenv(SUPPRESSIONS_ENVIRONMENT_VARIABLE.name, str(tmp_path / 'suppressions.txt'))
+    assert _get_suppressions() is None
+
+    (tmp_path / 'suppressions.txt').write_text('race:rclcpp\n')
+    suppressions = _get_suppressions()
+    assert suppressions is not None and len(suppressions) == 1
@@ -0,0 +1,308 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from csv import DictReader
+import os
+import struct
+import sys
+
+from colcon_core.event.job import JobEnded
+from colcon_core.event_reactor import EventReactorShutdown
+from colcon_output.event_handler.log import STDOUT_STDERR_LOG_FILENAME
+from colcon_sanitizer_reports.event_handlers.sanitizer_report import (
+    REPORT_CSV_FILENAME, SanitizerReportEventHandler, SHARD_CSV_FILENAME,
+    SYMBOL_CACHE_ENVIRONMENT_VARIABLE, SYMBOLIZER_ENVIRONMENT_VARIABLE
+)
+from colcon_sanitizer_reports.sanitizer_log_files import (
+    add_sanitizer_log_files, SanitizerLogFilePool
+)
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+from colcon_sanitizer_reports.stack_trace_keys import parse_stack_trace_frame, StackTraceFrame
+from colcon_sanitizer_reports.symbolization import (
+    get_build_id, LlvmSymbolizer, ModuleOffset, StaticSymbolizer, SymbolCache,
+    symbolize_stack_traces, Symbolizer
+)
+from mock import patch
+import pytest
+
+_BUILD_ID = 'a1b2c3d4'
+
+_LEAK_LINES = (
+    '==5584==ERROR: LeakSanitizer: detected memory leaks',
+    '',
+    'Direct leak of 64 byte(s) in 1 object(s) allocated from:',
+    '    #0 0x7f1 in operator new(unsigned long) (/usr/lib/x86_64-linux-gnu/libasan.so.4+0xe0d6d)',
+    '    #1 0x7f2 (/ros2/install/lib/librclcpp.so+0x1a2b)',
+    '    #2 0x7f3 (/ros2/install/lib/librclcpp.so+0x3c4d) (BuildId: {})'.format(_BUILD_ID),
+    '',
+    'SUMMARY: AddressSanitizer: 64 byte(s) leaked in 1 allocation(s).',
+)
+
+_RACE_LINES = (
+    'WARNING: ThreadSanitizer: data race (pid=26543)',
+    '  Write of size 8 at 0x7b0c00001234 by thread T1:',
+    '    #0 <null> <null> (/ros2/install/lib/librclcpp.so+0x1a2b)',
+    '    #1 <null> <null> (/opt/lib/libunknown.so+0x10)',
+    '',
+    'SUMMARY: ThreadSanitizer: data race (/ros2/install/lib/librclcpp.so+0x1a2b)',
+)
+
+_SYMBOL_BY_MODULE_OFFSET = {
+    ModuleOffset('/ros2/install/lib/librclcpp.so', 0x1a2b):
+        'rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40:3',
+    ModuleOffset('/ros2/install/lib/librclcpp.so', 0x3c4d):
+        'main /ros2/test/test.cpp:20:3',
+}
+
+
+# Key of the stack traces whose first own code frame is symbolized to the Node constructor. Like
+# the frames the sanitizers symbolize, it holds the masked module offset.
+_NODE_STACK_TRACE_KEY = \
+    'rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40:3 (/ros2/install/lib/librclcpp.so+0xX)'
+
+
+def _write_elf_with_build_id(path: str, build_id: str) -> None:
+    # A little endian ELF64 header, one PT_NOTE program header, and the GNU build id note.
+    description = bytes.fromhex(build_id)
+    note = struct.pack('<III', 4, len(description), 3) + b'GNU\0' + description
+    header = b'\x7fELF\x02\x01\x01' + b'\0' * 9 + struct.pack(
+        '<HHIQQQIHHHHHH', 3, 62, 1, 0, 64, 0, 0, 64, 56, 1, 0, 0, 0
+    )
+    program_header = struct.pack('<IIQQQQQQ', 4, 4, 120, 0, 0, len(note), len(note), 4)
+    with open(path, 'wb') as module_f_out:
+        module_f_out.write(header + program_header + note)
+
+
+def test_get_build_id(tmp_path) -> None:
+    _write_elf_with_build_id(str(tmp_path / 'libfoo.so'), _BUILD_ID)
+    assert get_build_id(str(tmp_path / 'libfoo.so')) == _BUILD_ID
+
+    (tmp_path / 'not_elf.so').write_text('not an ELF module')
+    assert get_build_id(str(tmp_path / 'not_elf.so')) is None
+    assert get_build_id(str(tmp_path / 'missing.so')) is None
+
+
+def test_symbolize_stack_traces_in_one_batch() -> None:
+    symbolizer = StaticSymbolizer(_SYMBOL_BY_MODULE_OFFSET)
+    leak_lines, race_lines = symbolize_stack_traces((_LEAK_LINES, _RACE_LINES), symbolizer)
+
+    # Module offsets shared by sections are symbolized once.
+    assert symbolizer.batches == [(
+        ModuleOffset('/ros2/install/lib/librclcpp.so', 0x1a2b),
+        ModuleOffset('/ros2/install/lib/librclcpp.so', 0x3c4d),
+        ModuleOffset('/opt/lib/libunknown.so', 0x10),
+    )]
+    assert leak_lines[3:6] == (
+        _LEAK_LINES[3],
+        '    #1 0x7f2 in rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40:3 '
+        '(/ros2/install/lib/librclcpp.so+0x1a2b)',
+        '    #2 0x7f3 in main /ros2/test/test.cpp:20:3 (/ros2/install/lib/librclcpp.so+0x3c4d) '
+        '(BuildId: {})'.format(_BUILD_ID),
+    )
+    assert parse_stack_trace_frame(leak_lines[4]) == StackTraceFrame(
+        number=1, address='0x7f2', function='rclcpp::Node::Node()',
+        location='/ros2/rclcpp/src/node.cpp:40:3', module='/ros2/install/lib/librclcpp.so',
+        offset='0x1a2b',
+    )
+    assert race_lines[2:4] == (
+        '    #0 rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40:3 '
+        '(/ros2/install/lib/librclcpp.so+0x1a2b)',
+        _RACE_LINES[3],
+    )
+
+
+def test_symbolizer_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        Symbolizer()  # type: ignore
+
+
+def test_symbol_cache_is_keyed_by_build_id(tmp_path) -> None:
+    with SymbolCache(str(tmp_path / 'symbols.db')) as symbol_cache:
+        symbolize_stack_traces(
+            (_LEAK_LINES,), StaticSymbolizer(_SYMBOL_BY_MODULE_OFFSET), cache=symbol_cache
+        )
+        # The build id of one frame of a module applies to every frame of the module.
+        assert symbol_cache.get_symbols(_BUILD_ID, [0x1a2b, 0x3c4d, 0x10]) == {
+            0x1a2b: 'rclcpp::Node::Node() /ros2/rclcpp/src/node.cpp:40:3',
+            0x3c4d: 'main /ros2/test/test.cpp:20:3',
+        }
+
+    # The cached symbol is used in later runs without the symbolizer, wherever the module is.
+    symbolizer = StaticSymbolizer({})
+    with SymbolCache(str(tmp_path / 'symbols.db')) as symbol_cache:
+        lines, = symbolize_stack_traces(
+            (('    #0 0x7f3 (/other/librclcpp.so+0x3c4d) (BuildId: {})'.format(_BUILD_ID),),),
+            symbolizer, cache=symbol_cache,
+        )
+    assert lines == (
+        '    #0 0x7f3 in main /ros2/test/test.cpp:20:3 (/other/librclcpp.so+0x3c4d) '
+        '(BuildId: {})'.format(_BUILD_ID),
+    )
+    assert symbolizer.batches == []
+
+
+def _write_fake_llvm_symbolizer(path, *, max_answers: int) -> None:
+    # A stand-in for llvm-symbolizer that knows every offset of librclcpp.so and nothing else, and
+    # exits after answering max_answers queries.
+    path.write_text(
+        '#!{}\n'
+        'import sys\n'
+        'for i, line in enumerate(sys.stdin):\n'
+        '    if i == {}:\n'
+        '        sys.exit(1)\n'
+        '    module, offset = line.split()\n'
+        "    if module.endswith('librclcpp.so'):\n"
+        "        print('function_' + offset + '\\n/ros2/rclcpp/src/node.cpp:1:0\\n', flush=True)\n"
+        '    else:\n'
+        "        print('??\\n??:0:0\\n', flush=True)\n".format(sys.executable, max_answers)
+    )
+    os.chmod(str(path), 0o755)
+
+
+def test_llvm_symbolizer_process(tmp_path) -> None:
+    executable_path = tmp_path / 'llvm-symbolizer'
+    _write_fake_llvm_symbolizer(executable_path, max_answers=-1)
+
+    # The batch is larger than a pipe buffer, so the queries must be written while reading answers.
+    module_offsets = [
+        ModuleOffset('/ros2/install/lib/librclcpp.so', offset) for offset in range(20000)
+    ]
+    symbolizer = LlvmSymbolizer(str(executable_path))
+    try:
+        symbols = symbolizer.symbolize(module_offsets)
+        assert len(symbols) == len(module_offsets)
+        assert symbols[0x1a2b] == 'function_0x1a2b /ros2/rclcpp/src/node.cpp:1:0'
+
+        # The same process serves later batches.
+        assert symbolizer.symbolize([ModuleOffset('/opt/lib/libunknown.so', 0x10)]) == [None]
+    finally:
+        symbolizer.close()
+
+
+def test_log_parser_defers_unsymbolized_sections() -> None:
+    log_parser = SanitizerLogParser(defer_unsymbolized=True)
+    log_parser.set_package('rclcpp')
+    for line in _LEAK_LINES:
+        log_parser.parse_line(line)
+
+    # The section is not in the report until it is symbolized.
+    assert log_parser.get_count_by_package_of_error_name('detected memory leaks') == {}
+
+    log_parser.symbolize(StaticSymbolizer(_SYMBOL_BY_MODULE_OFFSET))
+    assert log_parser.get_count_by_package_of_error_name('detected memory leaks') == {'rclcpp': 1}
+    assert log_parser.get_count_by_package_of_stack_trace_key(_NODE_STACK_TRACE_KEY) == \
+        {'rclcpp': 1}
+
+
+def test_symbolizer_that_exits_early_is_not_cached(tmp_path) -> None:
+    executable_path = tmp_path / 'llvm-symbolizer'
+    _write_fake_llvm_symbolizer(executable_path, max_answers=1)
+    symbolizer = LlvmSymbolizer(str(executable_path))
+    try:
+        with SymbolCache(str(tmp_path / 'symbols.db')) as symbol_cache:
+            with pytest.raises(OSError):
+                symbolize_stack_traces((_LEAK_LINES,), symbolizer, cache=symbol_cache)
+            assert symbol_cache.get_symbols(_BUILD_ID, [0x1a2b, 0x3c4d]) == {}
+    finally:
+        symbolizer.close()
+
+
+def test_log_parser_keeps_sections_if_symbolizer_fails() -> None:
+    log_parser = SanitizerLogParser(defer_unsymbolized=True)
+    log_parser.set_package('rclcpp')
+    for line in _LEAK_LINES:
+        log_parser.parse_line(line)
+
+    with pytest.raises(OSError):
+        log_parser.symbolize(LlvmSymbolizer('/nonexistent/llvm-symbolizer'))
+    log_parser.symbolize(StaticSymbolizer({}))
+    assert log_parser.get_count_by_package_of_error_name('detected memory leaks') == {'rclcpp': 1}
+
+
+def test_event_handler_reports_sections_without_symbolizer(tmp_path, monkeypatch) -> None:
+    (tmp_path / 'log' / 'rclcpp').mkdir(parents=True)
+    (tmp_path / 'log' / 'rclcpp' / STDOUT_STDERR_LOG_FILENAME).write_text(
+        '\n'.join(_LEAK_LINES) + '\n'
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(SYMBOLIZER_ENVIRONMENT_VARIABLE.name, '/nonexistent/llvm-symbolizer')
+    monkeypatch.setenv(SYMBOL_CACHE_ENVIRONMENT_VARIABLE.name, str(tmp_path / 'symbols.db'))
+
+    extension = SanitizerReportEventHandler()
+    with patch(
+        'colcon_sanitizer_reports.event_handlers.sanitizer_report.get_log_path',
+        return_value=tmp_path / 'log',
+    ):
+        event = JobEnded('rclcpp', 0)
+        extension((event, event))
+        extension((EventReactorShutdown(), None))
+
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    assert [(row['package'], row['error_name']) for row in rows] == \
+        [('rclcpp', 'detected memory leaks')]
+
+
+def test_event_handler_symbolizes_all_packages_in_one_batch(tmp_path, monkeypatch) -> None:
+    for package, lines in (('rclcpp', _LEAK_LINES), ('rcl', _RACE_LINES)):
+        (tmp_path / 'log' / package).mkdir(parents=True)
+        (tmp_path / 'log' / package / STDOUT_STDERR_LOG_FILENAME).write_text(
+            '\n'.join(lines) + '\n'
+        )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(SYMBOLIZER_ENVIRONMENT_VARIABLE.name, 'llvm-symbolizer')
+
+    symbolizer = StaticSymbolizer(_SYMBOL_BY_MODULE_OFFSET)
+    extension = SanitizerReportEventHandler()
+    with patch(
+        'colcon_sanitizer_reports.event_handlers.sanitizer_report.get_log_path',
+        return_value=tmp_path / 'log',
+    ), patch('colcon_sanitizer_reports.symbolization.LlvmSymbolizer', return_value=symbolizer):
+        for package in ('rclcpp', 'rcl'):
+            event = JobEnded(package, 0)
+            extension((event, event))
+        assert symbolizer.batches == []
+        extension((EventReactorShutdown(), None))
+    assert len(symbolizer.batches) == 1
+
+    # The shards of the packages are rewritten with their symbolized sections.
+    for package, error_name in (('rclcpp', 'detected memory leaks'), ('rcl', 'data race')):
+        with open(str(tmp_path / 'log' / package / SHARD_CSV_FILENAME)) as shard_csv_f_in:
+            rows = list(DictReader(shard_csv_f_in))
+        assert [(row['error_name'], row['stack_trace_key']) for row in rows] == \
+            [(error_name, _NODE_STACK_TRACE_KEY)]
+
+    with open(str(tmp_path / REPORT_CSV_FILENAME)) as report_csv_f_in:
+        rows = list(DictReader(report_csv_f_in))
+    assert [row['package'] for row in rows] == ['rclcpp', 'rcl']
+
+
+@pytest.mark.parametrize('max_workers', (1, 2))
+def test_sanitizer_log_file_sections_are_deferred(tmp_path, max_workers) -> None:
+    for pid in (100, 101):
+        (tmp_path / 'asan.{pid}'.format(**locals())).write_text('\n'.join(_LEAK_LINES) + '\n')
+
+    log_parser = SanitizerLogParser(defer_unsymbolized=True)
+    with SanitizerLogFilePool(max_workers=max_workers, min_parallel_size=0) as pool:
+        add_sanitizer_log_files(
+            log_parser, 'rclcpp', [str(tmp_path / 'asan.100'), str(tmp_path / 'asan.101')],
+            pool=pool,
+        )
+    assert log_parser.get_count_by_package_of_error_name('detected memory leaks') == {}
+
+    symbolizer = StaticSymbolizer(_SYMBOL_BY_MODULE_OFFSET)
+    log_parser.symbolize(symbolizer)
+    assert len(symbolizer.batches) == 1
+    assert log_parser.get_count_by_package_of_stack_trace_key(_NODE_STACK_TRACE_KEY) == \
+        {'rclcpp': 2}
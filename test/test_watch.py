@@ -0,0 +1,135 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from colcon_output.event_handler.log import STDOUT_STDERR_LOG_FILENAME
+from colcon_sanitizer_reports import watch
+from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParser
+from colcon_sanitizer_reports.watch import LogDirectoryTailer, make_report_server, ReportSnapshots
+import pytest
+
+_RESOURCE_NAMES = ('data_race_different_keys', 'segv')
+
+
+def _read_input_log(resource_name: str) -> bytes:
+    with open(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'resources', resource_name, 'input.log'
+    ), 'rb') as input_log_f_in:
+        return input_log_f_in.read()
+
+
+def _get_expected_count_by_output_primary_key():
+    log_parser = SanitizerLogParser()
+    for resource_name in _RESOURCE_NAMES:
+        log_parser.set_package(resource_name)
+        for line in _read_input_log(resource_name).decode().splitlines():
+            log_parser.parse_line(line)
+
+    return log_parser.get_count_by_output_primary_key()
+
+
+def test_tailer_parses_appended_lines_once(tmp_path) -> None:
+    log_parser = SanitizerLogParser()
+    tailer = LogDirectoryTailer(log_parser, str(tmp_path))
+    assert not tailer.poll()
+
+    # Logs grow in chunks that end in the middle of a line, and the logs of packages interleave.
+    for resource_name in _RESOURCE_NAMES:
+        (tmp_path / resource_name).mkdir()
+    for part in range(3):
+        for resource_name in _RESOURCE_NAMES:
+            input_log = _read_input_log(resource_name)
+            with open(str(tmp_path / resource_name / STDOUT_STDERR_LOG_FILENAME), 'ab') as f_out:
+                f_out.write(input_log[part * len(input_log) // 3:(part + 1) * len(input_log) // 3])
+        assert tailer.poll()
+
+    assert not tailer.poll()
+    assert log_parser.get_count_by_output_primary_key() == \
+        _get_expected_count_by_output_primary_key()
+
+
+def test_tailer_replaces_findings_of_rewritten_logs(tmp_path, monkeypatch) -> None:
+    # Chunks smaller than a line are joined until the line is complete.
+    monkeypatch.setattr(watch, '_READ_SIZE', 7)
+    log_parser = SanitizerLogParser()
+    tailer = LogDirectoryTailer(log_parser, str(tmp_path))
+    for resource_name in _RESOURCE_NAMES:
+        (tmp_path / resource_name).mkdir()
+        (tmp_path / resource_name / STDOUT_STDERR_LOG_FILENAME).write_bytes(
+            _read_input_log(resource_name)
+        )
+    assert tailer.poll()
+    assert log_parser.get_count_by_output_primary_key() == \
+        _get_expected_count_by_output_primary_key()
+
+    # The rewritten log is cut in the middle of a section, which is completed by the next poll.
+    input_log = _read_input_log('data_race_different_keys')
+    log_path = tmp_path / 'data_race_different_keys' / STDOUT_STDERR_LOG_FILENAME
+    log_path.write_bytes(input_log[:len(input_log) * 2 // 3])
+    assert tailer.poll()
+    with open(str(log_path), 'ab') as f_out:
+        f_out.write(input_log[len(input_log) * 2 // 3:])
+    assert tailer.poll()
+
+    assert log_parser.get_count_by_output_primary_key() == \
+        _get_expected_count_by_output_primary_key()
+
+
+def test_snapshots_are_regenerated_when_parser_changes() -> None:
+    log_parser = SanitizerLogParser()
+    report_snapshots = ReportSnapshots(log_parser)
+    csv_snapshot = report_snapshots.get('csv')
+    report_snapshots.update()
+    assert report_snapshots.get('csv') is csv_snapshot
+    assert json.loads(report_snapshots.get('json').decode()) == \
+        {'findings': [], 'remainders': [], 'counted_sections': []}
+
+    # The previous snapshot is served until the snapshots are updated.
+    log_parser.set_package('segv')
+    for line in _read_input_log('segv').decode().splitlines():
+        log_parser.parse_line(line)
+    assert report_snapshots.get('csv') is csv_snapshot
+
+    report_snapshots.update()
+    assert report_snapshots.get('csv') == log_parser.get_csv().encode()
+
+
+def test_server_serves_snapshots() -> None:
+    log_parser = SanitizerLogParser()
+    log_parser.set_package('segv')
+    for line in _read_input_log('segv').decode().splitlines():
+        log_parser.parse_line(line)
+
+    server = make_report_server(ReportSnapshots(log_parser), ('127.0.0.1', 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{server.server_port}'.format(**locals())
+    try:
+        with urlopen(url + '/report.json') as response:
+            assert response.headers['Content-Type'] == 'application/json'
+            findings = json.loads(response.read().decode())['findings']
+        assert [finding['error_name'] for finding in findings] == ['SEGV on unknown address']
+
+        with urlopen(url + '/report.xml') as response:
+            assert response.read() == log_parser.get_xml().encode()
+
+        with pytest.raises(HTTPError):
+            urlopen(url + '/other')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import xml.etree.cElementTree as eTree
+
 from colcon_sanitizer_reports._sanitizer_section_part_stack_trace import (
     SanitizerSectionPartStackTrace
 )
+from colcon_sanitizer_reports.report_selection import ReportRemainder
 from colcon_sanitizer_reports.sanitizer_log_parser import SanitizerLogParserOutputPrimaryKey
 from colcon_sanitizer_reports.xml_output_generator import XmlOutputGenerator
 
@@ -74,3 +77,42 @@ def test_xml_tree_structure():
 def test_xml_string_encoding():
     string = XmlOutputGenerator(_ERROR_MAP, _STACK_TRACE_MAP).xml_string
     assert isinstance(string, str)
+
+
+def test_combine():
+    string = XmlOutputGenerator.combine([
+        XmlOutputGenerator(_ERROR_MAP, _STACK_TRACE_MAP).xml_string,
+        XmlOutputGenerator(_EMPTY_MAP, _STACK_TRACE_MAP).xml_string,
+        XmlOutputGenerator(
+            {SanitizerLogParserOutputPrimaryKey('package4', 'data-race', 'key1',): 1},
+            {SanitizerLogParserOutputPrimaryKey('package4', 'data-race', 'key1',):
+                SanitizerSectionPartStackTrace(('  #1 0x7f in key1 /ros2',))},
+        ).xml_string,
+    ])
+    tree = eTree.fromstring(string)
+    assert tree.get('tests') == '4'
+    assert sorted(case.get('name') for case in tree.findall('testcase')) == \
+        ['package1', 'package2', 'package3', 'package4']
+    assert string == XmlOutputGenerator.combine([string])
+
+
+def test_remainders_are_skipped_elements():
+    tree = XmlOutputGenerator(_ERROR_MAP, _STACK_TRACE_MAP, None, [
+        ReportRemainder('package1', 'data-race', 2, 5),
+        ReportRemainder('package1', 'lock-order-inversion', 1, 1),
+        ReportRemainder('package4', '', 3, 3),
+    ]).xml_tree
+    assert tree.get('tests') == '4'
+
+    skipped_message_by_package = {
+        testcase.get('name'): [skipped.get('message') for skipped in testcase.findall('skipped')]
+        for testcase in tree.findall('testcase')
+    }
+    assert skipped_message_by_package == {
+        'package1': [ReportRemainder('package1', '', 3, 6).description],
+        'package2': [],
+        'package3': [],
+        'package4': [ReportRemainder('package4', '', 3, 3).description],
+    }
+    assert skipped_message_by_package['package1'] == \
+        ['3 more stack trace keys with a total count of 6 were omitted from the report']